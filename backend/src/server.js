@@ -6,6 +6,7 @@ import dotenv from 'dotenv';
 import multer from 'multer';
 import path from 'path';
 import fs from 'fs';
+import crypto from 'crypto';
 import jwt from 'jsonwebtoken';
 import { createServer } from 'http';
 import { Server as SocketIOServer } from 'socket.io';
@@ -21,6 +22,8 @@ const UPLOAD_DIR = process.env.UPLOAD_DIR || 'uploads';
 const JWT_SECRET = process.env.JWT_SECRET || 'dev_secret';
 const ALLOWED_ORIGINS = (process.env.ALLOWED_ORIGINS || '').split(',').filter(Boolean);
 const DATA_DIR = process.env.DATA_DIR || 'data';
+// Image format desktop clients are asked to upload screenshots in (they fall back to jpeg if unsupported)
+const SCREENSHOT_FORMAT = ['webp', 'jpeg'].includes(process.env.SCREENSHOT_FORMAT) ? process.env.SCREENSHOT_FORMAT : 'webp';
 
 // Ensure upload directory exists (relative to current working dir)
 const uploadPath = path.resolve(process.cwd(), UPLOAD_DIR);
@@ -37,11 +40,13 @@ const orgFile = path.join(dataPath, 'organization.json');
 const usersFile = path.join(dataPath, 'users.json');
 const intervalsFile = path.join(dataPath, 'intervals.json');
 const sessionsFile = path.join(dataPath, 'work_sessions.json');
+const workEventsFile = path.join(dataPath, 'work_events.jsonl');
 const auditFile = path.join(dataPath, 'audit_logs.json');
 if (!fs.existsSync(orgFile)) fs.writeFileSync(orgFile, JSON.stringify({ name: '', createdAt: null }, null, 2));
 if (!fs.existsSync(usersFile)) fs.writeFileSync(usersFile, '[]');
 if (!fs.existsSync(intervalsFile)) fs.writeFileSync(intervalsFile, '{}');
 if (!fs.existsSync(sessionsFile)) fs.writeFileSync(sessionsFile, '[]');
+if (!fs.existsSync(workEventsFile)) fs.writeFileSync(workEventsFile, '');
 if (!fs.existsSync(auditFile)) fs.writeFileSync(auditFile, '[]');
 
 // Users/team helpers
@@ -150,6 +155,21 @@ app.post('/api/auth/login', (req, res) => {
   }
 });
 
+// Token refresh for long-running desktop sessions: a still-valid token is exchanged for a fresh one, so
+// the client never has to ask for the password again mid-shift. Claims are re-read from the user record,
+// so deleted users cannot refresh and role changes take effect.
+app.post('/api/auth/refresh', requireRole(), (req, res) => {
+  try {
+    const user = getUserByEmail(req.user?.email || req.user?.sub);
+    if (!user) return res.status(401).json({ error: 'Unknown user' });
+    const token = jwt.sign({ sub: user.email, email: user.email, role: user.role, uid: user.id }, JWT_SECRET, { expiresIn: '8h' });
+    res.json({ token });
+  } catch (e) {
+    console.error('[auth:refresh] error:', e);
+    res.status(500).json({ error: 'Refresh failed' });
+  }
+});
+
 // Simple auth middleware
 function requireRole(roles = []) {
   return (req, res, next) => {
@@ -406,8 +426,8 @@ app.get('/api/capture-interval', requireRole(['employee', 'manager', 'super_admi
       if (!teamEmails.includes(targetId)) return res.status(403).json({ error: 'Forbidden: not your team' });
     }
     const secs = intervals[targetId];
-    if (!secs) return res.json({ assigned: false, intervalSeconds: null });
-    res.json({ assigned: true, intervalSeconds: secs });
+    if (!secs) return res.json({ assigned: false, intervalSeconds: null, screenshotFormat: SCREENSHOT_FORMAT });
+    res.json({ assigned: true, intervalSeconds: secs, screenshotFormat: SCREENSHOT_FORMAT });
   } catch (e) {
     console.error('[interval:get] error:', e);
     res.status(500).json({ error: 'Failed to read interval' });
@@ -452,19 +472,116 @@ function writeSessions(arr){
 }
 function todayStr(){ return new Date().toISOString().slice(0,10); }
 
+// Processed work event ids. The log is append-only JSON lines; replays are caught by an in-memory index
+// of recent ids per employee (id -> receive time, oldest first), rebuilt from the log at startup. Both
+// forget ids after WORK_EVENT_RETENTION_DAYS, longer than a client keeps an unacknowledged batch, and the
+// index holds at most WORK_EVENT_DEDUP_MAX ids per employee, so a batch costs O(batch) however long the
+// history.
+const WORK_EVENT_RETENTION_MS = Number(process.env.WORK_EVENT_RETENTION_DAYS || 7) * 24 * 60 * 60 * 1000;
+const WORK_EVENT_DEDUP_MAX = Number(process.env.WORK_EVENT_DEDUP_MAX || 20000);
+const workEventIds = new Map(); // employeeId -> Map(id -> receivedAt ms)
+function rememberWorkEvent(employeeId, id, receivedAt){
+  let ids = workEventIds.get(employeeId);
+  if (!ids) workEventIds.set(employeeId, ids = new Map());
+  ids.set(id, receivedAt);
+  if (ids.size > WORK_EVENT_DEDUP_MAX) ids.delete(ids.keys().next().value);
+}
+function appendWorkEvents(entries){
+  fs.appendFileSync(workEventsFile, entries.map(e => JSON.stringify(e) + '\n').join(''));
+}
+function pruneWorkEvents(){
+  // Expire old ids from the index and rewrite the log without them
+  const cutoff = Date.now() - WORK_EVENT_RETENTION_MS;
+  for (const [employeeId, ids] of workEventIds) {
+    for (const [id, receivedAt] of ids) {
+      if (receivedAt >= cutoff) break;
+      ids.delete(id);
+    }
+    if (!ids.size) workEventIds.delete(employeeId);
+  }
+  try {
+    const lines = fs.readFileSync(workEventsFile, 'utf-8').split('\n').filter(Boolean);
+    const keep = lines.filter(line => {
+      try { return Date.parse(JSON.parse(line).receivedAt) >= cutoff; } catch { return false; }
+    });
+    if (keep.length === lines.length) return;
+    const tmp = `${workEventsFile}.tmp`;
+    fs.writeFileSync(tmp, keep.map(line => line + '\n').join(''));
+    fs.renameSync(tmp, workEventsFile);
+  } catch (e) {
+    console.error('[work:events] prune error:', e);
+  }
+}
+function loadWorkEventIds(){
+  const cutoff = Date.now() - WORK_EVENT_RETENTION_MS;
+  let lines = [];
+  try { lines = fs.readFileSync(workEventsFile, 'utf-8').split('\n'); } catch {}
+  for (const line of lines) {
+    let entry;
+    try { entry = JSON.parse(line); } catch { continue; }
+    const receivedAt = Date.parse(entry.receivedAt);
+    if (entry.id && receivedAt >= cutoff) rememberWorkEvent(entry.employeeId, entry.id, receivedAt);
+  }
+}
+loadWorkEventIds();
+pruneWorkEvents();
+setInterval(pruneWorkEvents, 6 * 60 * 60 * 1000).unref();
+
+// Apply one start/heartbeat/stop event at its own timestamp (clamped to now).
+// Shared by the single-event routes and the journal bulk ingest.
+function applyWorkEvent(sessions, employeeId, event){
+  const at = captureTs(event.at);
+  const active = sessions.find(s => s.employeeId === employeeId && s.isActive);
+  if (event.type === 'start') {
+    // If an active session exists, return it
+    if (active) return { status: 200, session: active };
+    const record = { id: `${employeeId}-${new Date(at).getTime()}`, employeeId, startedAt: at, endedAt: null, isActive: true, idleSeconds: 0, lastHeartbeatAt: at, date: at.slice(0,10) };
+    sessions.push(record);
+    return { status: 201, session: record };
+  }
+  if (event.type !== 'heartbeat' && event.type !== 'stop') return { status: 400, error: 'Unknown event type' };
+  if (!active) return { status: 404, error: 'No active session' };
+  if (event.type === 'heartbeat') {
+    const delta = Math.max(0, Number(event.idleDeltaSeconds) || 0);
+    active.idleSeconds = (active.idleSeconds || 0) + delta;
+    if (at > active.lastHeartbeatAt) active.lastHeartbeatAt = at;
+    mergeActivity(active, event.activity);
+    return { status: 200, session: active };
+  }
+  active.endedAt = at;
+  active.isActive = false;
+  return { status: 200, session: active };
+}
+
+// Per-minute input activity from the desktop sampler: { minute: epoch minute, bits: 15 hex digits },
+// one bit per second with input (most significant = second 0). Stored on the session as minute -> bits.
+function mergeActivity(session, activity){
+  if (!Array.isArray(activity)) return;
+  for (const a of activity) {
+    const minute = Number(a?.minute);
+    const bits = String(a?.bits || '');
+    if (!Number.isInteger(minute) || !/^[0-9a-f]{1,15}$/i.test(bits)) continue;
+    if (!session.activity) session.activity = {};
+    const prev = session.activity[minute];
+    session.activity[minute] = prev ? (BigInt(`0x${prev}`) | BigInt(`0x${bits}`)).toString(16) : bits.toLowerCase();
+  }
+}
+
+function endLiveStreams(employeeId){
+  // Terminate any ongoing live streams for this employee
+  try {
+    liveStreamOn.set(employeeId, false);
+    io.to(viewersRoom(employeeId)).emit('live_view:terminate', { by: employeeId, reason: 'work_stop' });
+  } catch {}
+}
+
 // Employee starts a work session
 app.post('/api/work/start', requireRole(['employee']), (req, res) => {
   try {
-    const employeeId = req.user?.sub;
     const sessions = readSessions();
-    // If an active session exists, return it
-    const active = sessions.find(s => s.employeeId === employeeId && s.isActive);
-    if (active) return res.json({ ok: true, session: active });
-    const now = new Date().toISOString();
-    const record = { id: `${employeeId}-${Date.now()}`, employeeId, startedAt: now, endedAt: null, isActive: true, idleSeconds: 0, lastHeartbeatAt: now, date: todayStr() };
-    sessions.push(record);
-    writeSessions(sessions);
-    res.status(201).json({ ok: true, session: record });
+    const result = applyWorkEvent(sessions, req.user?.sub, { type: 'start' });
+    if (result.status === 201) writeSessions(sessions);
+    res.status(result.status).json({ ok: true, session: result.session });
   } catch (e) {
     console.error('[work:start] error:', e);
     res.status(500).json({ error: 'Failed to start work session' });
@@ -474,16 +591,11 @@ app.post('/api/work/start', requireRole(['employee']), (req, res) => {
 // Employee heartbeat with idle delta seconds
 app.post('/api/work/heartbeat', requireRole(['employee']), (req, res) => {
   try {
-    const employeeId = req.user?.sub;
-    const { idleDeltaSeconds = 0 } = req.body || {};
     const sessions = readSessions();
-    const active = sessions.find(s => s.employeeId === employeeId && s.isActive);
-    if (!active) return res.status(404).json({ error: 'No active session' });
-    const delta = Math.max(0, Number(idleDeltaSeconds) || 0);
-    active.idleSeconds = (active.idleSeconds || 0) + delta;
-    active.lastHeartbeatAt = new Date().toISOString();
+    const result = applyWorkEvent(sessions, req.user?.sub, { type: 'heartbeat', idleDeltaSeconds: req.body?.idleDeltaSeconds });
+    if (result.error) return res.status(result.status).json({ error: result.error });
     writeSessions(sessions);
-    res.json({ ok: true, idleSeconds: active.idleSeconds });
+    res.json({ ok: true, idleSeconds: result.session.idleSeconds });
   } catch (e) {
     console.error('[work:heartbeat] error:', e);
     res.status(500).json({ error: 'Heartbeat failed' });
@@ -495,23 +607,64 @@ app.post('/api/work/stop', requireRole(['employee']), (req, res) => {
   try {
     const employeeId = req.user?.sub;
     const sessions = readSessions();
-    const active = sessions.find(s => s.employeeId === employeeId && s.isActive);
-    if (!active) return res.status(404).json({ error: 'No active session' });
-    active.endedAt = new Date().toISOString();
-    active.isActive = false;
+    const result = applyWorkEvent(sessions, employeeId, { type: 'stop' });
+    if (result.error) return res.status(result.status).json({ error: result.error });
     writeSessions(sessions);
-    // Terminate any ongoing live streams for this employee
-    try {
-      liveStreamOn.set(employeeId, false);
-      io.to(viewersRoom(employeeId)).emit('live_view:terminate', { by: employeeId, reason: 'work_stop' });
-    } catch {}
-    res.json({ ok: true, session: active });
+    endLiveStreams(employeeId);
+    res.json({ ok: true, session: result.session });
   } catch (e) {
     console.error('[work:stop] error:', e);
     res.status(500).json({ error: 'Failed to stop work session' });
   }
 });
 
+// Bulk ingest of the desktop client's work journal (start/heartbeat/stop recorded while offline or
+// batched). Events are applied in the order sent, at their own timestamps; each carries a client id
+// so a batch replayed after a lost response is applied only once. Connected clients send the same
+// batches over the socket (`work:events`); this route is their fallback.
+function ingestWorkEvents(employeeId, events){
+  const seen = workEventIds.get(employeeId);
+  const sessions = readSessions();
+  const entries = [];
+  const batchIds = new Set();
+  const accepted = [];
+  const duplicates = [];
+  let lastApplied = null;
+  const now = Date.now();
+  const receivedAt = new Date(now).toISOString();
+  for (const event of events) {
+    const id = String(event?.id || '');
+    if (!id) continue;
+    if (seen?.has(id) || batchIds.has(id)) { duplicates.push(id); continue; }
+    batchIds.add(id);
+    const result = applyWorkEvent(sessions, employeeId, event);
+    entries.push({ id, employeeId, type: event.type, at: captureTs(event.at), mono: event.mono, status: result.status, receivedAt });
+    accepted.push(id);
+    if (!result.error) lastApplied = event.type;
+  }
+  if (accepted.length) {
+    writeSessions(sessions);
+    appendWorkEvents(entries);
+    for (const id of accepted) rememberWorkEvent(employeeId, id, now);
+  }
+  if (lastApplied === 'stop') endLiveStreams(employeeId);
+  return { accepted, duplicates };
+}
+
+app.post('/api/work/events', requireRole(['employee']), (req, res) => {
+  try {
+    const employeeId = req.user?.sub;
+    const events = Array.isArray(req.body?.events) ? req.body.events : [];
+    if (events.length > 500) return res.status(413).json({ error: 'At most 500 events per request' });
+    const result = ingestWorkEvents(employeeId, events);
+    notePresence(employeeId);
+    res.json({ ok: true, ...result });
+  } catch (e) {
+    console.error('[work:events] error:', e);
+    res.status(500).json({ error: 'Failed to ingest work events' });
+  }
+});
+
 // Manager summary: today per employee
 app.get('/api/work/summary/today', requireRole(['manager', 'super_admin']), (req, res) => {
   try {
@@ -589,20 +742,76 @@ app.get('/api/work/sessions/today', requireRole(['manager', 'super_admin']), (re
   }
 });
 
+// Capture time reported by the desktop client (spooled uploads may arrive late); never in the future
+function captureTs(value){
+  const t = value ? new Date(value).getTime() : NaN;
+  const now = Date.now();
+  return new Date(Number.isFinite(t) && t <= now ? t : now).toISOString();
+}
+// Window capture mode: the foreground window (title, app, bounds; JSON text in multipart forms) and a
+// small full-desktop JPEG for context (base64). Thumbnails go to uploads/context, out of the listing.
+const contextPath = path.join(uploadPath, 'context');
+fs.mkdirSync(contextPath, { recursive: true });
+function applyWindowMeta(record, window, context){
+  let w = window;
+  if (typeof w === 'string') {
+    try { w = w ? JSON.parse(w) : null; } catch { w = null; }
+  }
+  if (w && typeof w === 'object') {
+    record.window = { title: String(w.title || '').slice(0, 512), app: String(w.app || '').slice(0, 128) };
+    for (const k of ['left', 'top', 'width', 'height']) {
+      if (Number.isFinite(w[k])) record.window[k] = w[k];
+    }
+  }
+  const thumb = context ? Buffer.from(String(context), 'base64') : null;
+  if (thumb && thumb.length) {
+    const abs = path.join(contextPath, path.basename(record.file).replace(/\.[^.]+$/, '') + '.jpg');
+    try {
+      fs.writeFileSync(abs, thumb);
+      record.context = path.relative(process.cwd(), abs).replace(/\\/g, '/');
+    } catch (e) {
+      console.warn('[upload] context thumbnail write failed:', e?.message || e);
+    }
+  }
+  return record;
+}
+// Latest stored file per screenshot hash and employee, kept alongside the index writes so "same as"
+// references resolve without re-reading uploads/index.json
+const uploadHashes = new Map(); // employeeId -> Map(hash -> file)
+function indexUploadHashes(records){
+  for (const r of records) {
+    if (!r.hash || !r.employeeId) continue;
+    let hashes = uploadHashes.get(r.employeeId);
+    if (!hashes) uploadHashes.set(r.employeeId, hashes = new Map());
+    hashes.set(r.hash, r.file);
+  }
+}
+function rebuildUploadHashes(records){
+  uploadHashes.clear();
+  indexUploadHashes(records);
+}
+try { rebuildUploadHashes(JSON.parse(fs.readFileSync(metaFile, 'utf-8'))); } catch {}
+function appendUploadMeta(records){
+  // Append metadata to uploads/index.json (simple dev store)
+  try {
+    const arr = JSON.parse(fs.readFileSync(metaFile, 'utf-8'));
+    arr.push(...records);
+    fs.writeFileSync(metaFile, JSON.stringify(arr, null, 2));
+    indexUploadHashes(records);
+  } catch (e) {
+    console.error('[meta] write failed:', e);
+  }
+}
+
 // Screenshot upload
 app.post('/api/uploads/screenshot', requireRole(['employee']), upload.single('screenshot'), async (req, res) => {
   try {
     const fileRelPath = path.relative(process.cwd(), req.file.path);
     const employeeId = (req.body && (req.body.employeeId || req.body.email)) || 'unknown';
-    const record = { file: fileRelPath.replace(/\\/g, '/'), employeeId, ts: new Date().toISOString() };
-    // Append metadata to uploads/index.json (simple dev store)
-    try {
-      const arr = JSON.parse(fs.readFileSync(metaFile, 'utf-8'));
-      arr.push(record);
-      fs.writeFileSync(metaFile, JSON.stringify(arr, null, 2));
-    } catch (e) {
-      console.error('[meta] write failed:', e);
-    }
+    const record = { file: fileRelPath.replace(/\\/g, '/'), employeeId, ts: captureTs(req.body?.capturedAt) };
+    if (req.body?.hash) record.hash = String(req.body.hash);
+    applyWindowMeta(record, req.body?.window, req.body?.context);
+    appendUploadMeta([record]);
     try { io.emit('uploads:new', { employeeId, file: record.file, ts: record.ts }); } catch {}
 
     // Mark employee as online upon receiving a screenshot (helps Live View selection)
@@ -616,7 +825,7 @@ app.post('/api/uploads/screenshot', requireRole(['employee']), upload.single('sc
       const absFile = path.resolve(req.file.path);
       const frameBase64 = fs.readFileSync(absFile, { encoding: 'base64' });
       if (liveStreamOn.get(employeeId)) {
-        io.to(viewersRoom(employeeId)).emit('live_view:frame', { employeeId, frameBase64, ts: record.ts });
+        io.to(viewersRoom(employeeId)).emit('live_view:frame', { employeeId, frameBase64, mime: req.file.mimetype, ts: record.ts });
       }
     } catch (e) {
       console.warn('[live_view] relay failed:', e?.message || e);
@@ -629,6 +838,229 @@ app.post('/api/uploads/screenshot', requireRole(['employee']), upload.single('sc
   }
 });
 
+// Bulk replay of screenshots the desktop client spooled while the backend was unreachable.
+// Files and capturedAt fields are matched by position.
+app.post('/api/uploads/screenshots/batch', requireRole(['employee']), upload.array('screenshots', 50), async (req, res) => {
+  try {
+    const files = req.files || [];
+    if (!files.length) return res.status(400).json({ error: 'No screenshots' });
+    const employeeId = (req.body && (req.body.employeeId || req.body.email)) || 'unknown';
+    const capturedAt = [].concat(req.body?.capturedAt || []);
+    const hashes = [].concat(req.body?.hash || []);
+    const windows = [].concat(req.body?.window || []);
+    const contexts = [].concat(req.body?.context || []);
+    const records = files.map((f, i) => applyWindowMeta({
+      file: path.relative(process.cwd(), f.path).replace(/\\/g, '/'),
+      employeeId,
+      ts: captureTs(capturedAt[i]),
+      ...(hashes[i] ? { hash: String(hashes[i]) } : {}),
+    }, windows[i], contexts[i]));
+    appendUploadMeta(records);
+    for (const r of records) {
+      try { io.emit('uploads:new', { employeeId, file: r.file, ts: r.ts }); } catch {}
+    }
+    if (employeeId && employeeId !== 'unknown') {
+      onlineEmployees.add(employeeId);
+      io.emit('presence:online', { userId: employeeId });
+    }
+    res.status(201).json({ files: records.map(r => r.file) });
+  } catch (err) {
+    console.error('[upload:batch] error:', err);
+    res.status(500).json({ error: 'Batch upload failed' });
+  }
+});
+
+// "Same as" records from desktop clients whose screen did not change since their last upload:
+// each ref names the hash of an earlier screenshot and is recorded against that file.
+app.post('/api/uploads/screenshot/ref', requireRole(['employee']), (req, res) => {
+  try {
+    const employeeId = (req.body && (req.body.employeeId || req.body.email)) || 'unknown';
+    const refs = Array.isArray(req.body?.refs) ? req.body.refs : [req.body || {}];
+    const latest = uploadHashes.get(employeeId) || new Map();
+    const records = [];
+    const missing = [];
+    for (const ref of refs) {
+      const hash = String(ref?.hash || '');
+      const file = latest.get(hash);
+      if (!file || !fs.existsSync(path.join(uploadPath, path.basename(file)))) {
+        missing.push(hash);
+        continue;
+      }
+      records.push(applyWindowMeta({ file, employeeId, ts: captureTs(ref.capturedAt), hash, ref: true }, ref.window));
+    }
+    if (!records.length) return res.status(409).json({ error: 'Unknown screenshot hash', missing });
+    appendUploadMeta(records);
+    for (const r of records) {
+      try { io.emit('uploads:new', { employeeId, file: r.file, ts: r.ts, ref: true }); } catch {}
+    }
+    if (employeeId && employeeId !== 'unknown') {
+      onlineEmployees.add(employeeId);
+      io.emit('presence:online', { userId: employeeId });
+    }
+    res.status(201).json({ files: records.map(r => r.file), missing });
+  } catch (err) {
+    console.error('[upload:ref] error:', err);
+    res.status(500).json({ error: 'Reference upload failed' });
+  }
+});
+
+// Chunked, resumable screenshot upload for large captures on weak links. The client opens (or resumes)
+// a session with the size and sha256 of the file, PUTs raw parts at the offset the server acknowledged
+// last, then completes; the checksum is verified before the file joins the regular uploads. Sessions
+// live under uploads/.partial (not served statically), so they survive a backend restart.
+const CHUNK_MAX_BYTES = Number(process.env.UPLOAD_CHUNK_MAX_BYTES || 4 * 1024 * 1024);
+const CHUNK_SESSION_TTL_MS = 24 * 60 * 60 * 1000;
+const partialPath = path.join(uploadPath, '.partial');
+fs.mkdirSync(partialPath, { recursive: true });
+
+function chunkPaths(id){
+  return { meta: path.join(partialPath, `${id}.json`), data: path.join(partialPath, `${id}.part`) };
+}
+function validChunkId(id){
+  return /^[A-Za-z0-9_-]{16,64}$/.test(String(id || ''));
+}
+function readChunkSession(id, owner){
+  // -> { paths, session, offset } for an upload session owned by this user, or null
+  const paths = chunkPaths(id);
+  let session = null;
+  try { session = JSON.parse(fs.readFileSync(paths.meta, 'utf-8')); } catch {}
+  if (!session || session.owner !== owner) return null;
+  let offset = session.file ? session.size : 0;
+  if (!session.file) {
+    try { offset = fs.statSync(paths.data).size; } catch {}
+  }
+  return { paths, session, offset };
+}
+function sweepChunkSessions(){
+  // Drop sessions (finished or abandoned) untouched for CHUNK_SESSION_TTL_MS
+  const cutoff = Date.now() - CHUNK_SESSION_TTL_MS;
+  for (const f of fs.readdirSync(partialPath)) {
+    if (!f.endsWith('.json')) continue;
+    const paths = chunkPaths(path.basename(f, '.json'));
+    const mtime = (p) => { try { return fs.statSync(p).mtimeMs; } catch { return 0; } };
+    if (Math.max(mtime(paths.meta), mtime(paths.data)) >= cutoff) continue;
+    for (const p of [paths.data, paths.meta]) {
+      try { fs.unlinkSync(p); } catch {}
+    }
+  }
+}
+function sha256File(file){
+  return new Promise((resolve, reject) => {
+    const hash = crypto.createHash('sha256');
+    fs.createReadStream(file)
+      .on('data', (chunk) => hash.update(chunk))
+      .on('end', () => resolve(hash.digest('hex')))
+      .on('error', reject);
+  });
+}
+
+// Open or resume: the same uploadId with the same size/sha256 returns the acknowledged offset
+app.post('/api/uploads/chunked', requireRole(['employee']), (req, res) => {
+  try {
+    const { uploadId, size, sha256, format, capturedAt, hash } = req.body || {};
+    if (!validChunkId(uploadId)) return res.status(400).json({ error: 'Invalid uploadId' });
+    if (!Number.isInteger(size) || size <= 0 || !/^[0-9a-f]{64}$/.test(String(sha256 || ''))) {
+      return res.status(400).json({ error: 'size and sha256 are required' });
+    }
+    sweepChunkSessions();
+    const owner = req.user?.sub;
+    const paths = chunkPaths(uploadId);
+    let existing = null;
+    try { existing = JSON.parse(fs.readFileSync(paths.meta, 'utf-8')); } catch {}
+    if (existing && existing.owner !== owner) return res.status(409).json({ error: 'uploadId in use' });
+    let current = existing && existing.size === size && existing.sha256 === sha256 ? readChunkSession(uploadId, owner) : null;
+    if (!current) {
+      // New upload, or the client's file changed since it opened this session: start over
+      const session = {
+        owner,
+        employeeId: req.body.employeeId || req.body.email || 'unknown',
+        size,
+        sha256,
+        format: format === 'webp' ? 'webp' : 'jpeg',
+        capturedAt: capturedAt || null,
+        hash: hash ? String(hash) : null,
+        window: req.body.window || null,
+        context: req.body.context || null,
+        createdAt: new Date().toISOString(),
+      };
+      fs.writeFileSync(paths.data, '');
+      fs.writeFileSync(paths.meta, JSON.stringify(session));
+      current = { paths, session, offset: 0 };
+    }
+    res.status(existing ? 200 : 201).json({ uploadId, offset: current.offset, size, partSize: CHUNK_MAX_BYTES, file: current.session.file });
+  } catch (err) {
+    console.error('[upload:chunked] error:', err);
+    res.status(500).json({ error: 'Upload init failed' });
+  }
+});
+
+app.get('/api/uploads/chunked/:id', requireRole(['employee']), (req, res) => {
+  if (!validChunkId(req.params.id)) return res.status(400).json({ error: 'Invalid uploadId' });
+  const current = readChunkSession(req.params.id, req.user?.sub);
+  if (!current) return res.status(404).json({ error: 'Unknown upload' });
+  res.json({ uploadId: req.params.id, offset: current.offset, size: current.session.size, file: current.session.file });
+});
+
+// One raw part at ?offset=; a part for any other offset gets 409 with the offset the server holds
+app.put('/api/uploads/chunked/:id', requireRole(['employee']), express.raw({ type: () => true, limit: CHUNK_MAX_BYTES }), (req, res) => {
+  try {
+    if (!validChunkId(req.params.id)) return res.status(400).json({ error: 'Invalid uploadId' });
+    const current = readChunkSession(req.params.id, req.user?.sub);
+    if (!current) return res.status(404).json({ error: 'Unknown upload' });
+    const body = Buffer.isBuffer(req.body) ? req.body : Buffer.alloc(0);
+    if (Number(req.query.offset) !== current.offset) {
+      return res.status(409).json({ error: 'Offset mismatch', offset: current.offset });
+    }
+    if (!body.length || current.offset + body.length > current.session.size) {
+      return res.status(400).json({ error: 'Part outside the declared size', offset: current.offset });
+    }
+    fs.appendFileSync(current.paths.data, body);
+    res.json({ offset: current.offset + body.length, size: current.session.size });
+  } catch (err) {
+    console.error('[upload:chunked] part error:', err);
+    res.status(500).json({ error: 'Part upload failed' });
+  }
+});
+
+app.post('/api/uploads/chunked/:id/complete', requireRole(['employee']), async (req, res) => {
+  try {
+    if (!validChunkId(req.params.id)) return res.status(400).json({ error: 'Invalid uploadId' });
+    const current = readChunkSession(req.params.id, req.user?.sub);
+    if (!current) return res.status(404).json({ error: 'Unknown upload' });
+    const { paths, session } = current;
+    // Completing twice (the first response was lost) returns the stored file again
+    if (session.file) return res.status(200).json({ file: session.file });
+    if (current.offset !== session.size) {
+      return res.status(409).json({ error: 'Upload incomplete', offset: current.offset });
+    }
+    const digest = await sha256File(paths.data);
+    if (digest !== session.sha256) {
+      try { fs.unlinkSync(paths.data); } catch {}
+      try { fs.unlinkSync(paths.meta); } catch {}
+      return res.status(422).json({ error: 'Checksum mismatch' });
+    }
+    const ts = new Date().toISOString().replace(/[:.]/g, '-');
+    const ext = session.format === 'webp' ? '.webp' : '.jpg';
+    const abs = path.join(uploadPath, `${ts}-${req.params.id.slice(0, 8)}-screenshot${ext}`);
+    fs.renameSync(paths.data, abs);
+    const employeeId = session.employeeId;
+    const record = { file: path.relative(process.cwd(), abs).replace(/\\/g, '/'), employeeId, ts: captureTs(session.capturedAt) };
+    if (session.hash) record.hash = session.hash;
+    applyWindowMeta(record, session.window, session.context);
+    appendUploadMeta([record]);
+    fs.writeFileSync(paths.meta, JSON.stringify({ ...session, context: null, file: record.file }));
+    try { io.emit('uploads:new', { employeeId, file: record.file, ts: record.ts }); } catch {}
+    if (employeeId && employeeId !== 'unknown') {
+      onlineEmployees.add(employeeId);
+      io.emit('presence:online', { userId: employeeId });
+    }
+    res.status(201).json({ file: record.file });
+  } catch (err) {
+    console.error('[upload:chunked] complete error:', err);
+    res.status(500).json({ error: 'Upload completion failed' });
+  }
+});
+
 app.post('/api/uploads/cleanup', requireRole(['super_admin']), (req, res) => {
   try {
     const { from, to } = req.body || {};
@@ -657,19 +1089,29 @@ app.post('/api/uploads/cleanup', requireRole(['super_admin']), (req, res) => {
       return true;
     };
     const targets = meta.filter(m => m.ts && inRange(m.ts));
+    const keep = meta.filter(m => !(m.ts && inRange(m.ts)));
+    // Deduplicated screenshots share a file; keep it while any remaining record points at it
+    const keptFiles = new Set(keep.map(m => m.file));
     let removed = 0;
     let bytesFreed = 0;
     for (const m of targets) {
       try {
+        removed += 1;
+        if (keptFiles.has(m.file)) continue;
         const fname = path.basename(String(m.file || ''));
         const abs = path.join(uploadPath, fname);
         try { bytesFreed += fs.statSync(abs).size; } catch {}
         if (fs.existsSync(abs)) fs.unlinkSync(abs);
-        removed += 1;
+        if (m.context) {
+          const ctx = path.join(contextPath, path.basename(String(m.context)));
+          try { bytesFreed += fs.statSync(ctx).size; fs.unlinkSync(ctx); } catch {}
+        }
       } catch {}
     }
-    const keep = meta.filter(m => !(m.ts && inRange(m.ts)));
-    try { fs.writeFileSync(metaFile, JSON.stringify(keep, null, 2)); } catch {}
+    try {
+      fs.writeFileSync(metaFile, JSON.stringify(keep, null, 2));
+      rebuildUploadHashes(keep);
+    } catch {}
     try { io.emit('uploads:cleanup_done', { removed, bytesFreed, from: fromIso, to: toIso }); } catch {}
     res.json({ ok: true, removed, bytesFreed });
   } catch (err) {
@@ -681,7 +1123,7 @@ app.post('/api/uploads/cleanup', requireRole(['super_admin']), (req, res) => {
 // List uploaded screenshots (development helper)
 app.get('/api/uploads/list', requireRole(['manager', 'super_admin']), async (req, res) => {
   try {
-    const files = fs.readdirSync(uploadPath).filter(f => /\.(jpg|jpeg|png)$/i.test(f)).sort();
+    const files = fs.readdirSync(uploadPath).filter(f => /\.(jpg|jpeg|png|webp)$/i.test(f)).sort();
     let meta = [];
     try { meta = JSON.parse(fs.readFileSync(metaFile, 'utf-8')); } catch {}
     let items = files.map(f => {
@@ -691,7 +1133,7 @@ app.get('/api/uploads/list', requireRole(['manager', 'super_admin']), async (req
       if (!ts) {
         try { ts = fs.statSync(path.join(uploadPath, f)).mtime.toISOString(); } catch {}
       }
-      return { file: rel, ts, employeeId: m?.employeeId };
+      return { file: rel, ts, employeeId: m?.employeeId, window: m?.window, context: m?.context };
     });
     if (req.user?.role === 'manager') {
       const teamEmails = getTeamEmailsForManager(req.user?.uid || req.user?.sub);
@@ -815,6 +1257,34 @@ app.get('/api/activity/recent', requireRole(['manager', 'super_admin']), (req, r
 const userRoom = (userId) => `user:${userId}`;
 const viewersRoom = (employeeId) => `live:viewers:${employeeId}`;
 const onlineEmployees = new Set();
+// Latest status each employee reported on its heartbeat stream (socket `presence:status` or work events)
+const presenceStatus = new Map(); // employeeId -> { lastSeenAt, tracking, idleSeconds, ... }
+// Status updates reach super_admins (presenceAllRoom) and the managers whose team the employee is in
+// (one room per employee, joined for each team member when the manager connects)
+const presenceAllRoom = 'presence:watchers';
+const presenceRoom = (employeeId) => `presence:watchers:${employeeId}`;
+function notePresence(employeeId, status = {}){
+  if (!employeeId) return;
+  const entry = { ...(presenceStatus.get(employeeId) || {}), ...status, lastSeenAt: new Date().toISOString() };
+  presenceStatus.set(employeeId, entry);
+  if (!onlineEmployees.has(employeeId)) {
+    onlineEmployees.add(employeeId);
+    io.emit('presence:online', { userId: employeeId });
+  }
+  io.to(presenceAllRoom).to(presenceRoom(employeeId)).emit('presence:status', { userId: employeeId, ...entry });
+}
+function pickStatus(raw = {}){
+  const num = (v) => (Number.isFinite(Number(v)) ? Math.max(0, Number(v)) : undefined);
+  const status = {
+    tracking: typeof raw.tracking === 'boolean' ? raw.tracking : undefined,
+    live: typeof raw.live === 'boolean' ? raw.live : undefined,
+    idleSeconds: num(raw.idleSeconds),
+    totalIdleSeconds: num(raw.totalIdleSeconds),
+    queued: num(raw.queued),
+    lastUploadAt: raw.lastUploadAt ? captureTs(raw.lastUploadAt) : undefined,
+  };
+  return Object.fromEntries(Object.entries(status).filter(([, v]) => v !== undefined));
+}
 // Track live streaming enablement per employee; frames are relayed only when true
 const liveStreamOn = new Map(); // employeeId -> boolean
 
@@ -863,10 +1333,52 @@ io.on('connection', (socket) => {
     if (role === 'manager') {
       const teamEmails = getTeamEmailsForManager(managerUid || socket.data.uid || socket.data.userId || userId);
       users = users.filter(u => teamEmails.includes(u));
+      socket.join(teamEmails.map(presenceRoom));
+    } else {
+      socket.join(presenceAllRoom);
     }
     socket.emit('presence:list', { users });
   }
 
+  // Employee heartbeat stream: compact status updates feed presence; work events (start/heartbeat/stop)
+  // use the same idempotent ingest as POST /api/work/events and are acked with its result.
+  // Only identities from a verified token are accepted here.
+  socket.on('presence:status', (status = {}) => {
+    if (role !== 'employee' || !socket.data.userId) return;
+    notePresence(socket.data.userId, pickStatus(status));
+  });
+  socket.on('work:events', (payload = {}, ack) => {
+    const reply = typeof ack === 'function' ? ack : () => {};
+    if (role !== 'employee' || !socket.data.userId) return reply({ ok: false, error: 'Forbidden' });
+    const events = Array.isArray(payload.events) ? payload.events : [];
+    if (events.length > 500) return reply({ ok: false, error: 'At most 500 events per request' });
+    try {
+      const result = ingestWorkEvents(socket.data.userId, events);
+      notePresence(socket.data.userId);
+      reply({ ok: true, ...result });
+    } catch (e) {
+      console.error('[work:events] socket error:', e);
+      reply({ ok: false, error: 'Failed to ingest work events' });
+    }
+  });
+
+  // Desktop (re)connect: the client re-announces tracking, live view and interval instead of logging in
+  // again. Managers still in the viewer room (or who asked while the employee was offline) keep or get the
+  // stream; the reply carries the viewer count and the assigned interval.
+  socket.on('session:resume', (state = {}, ack) => {
+    const reply = typeof ack === 'function' ? ack : () => {};
+    if (role !== 'employee' || !socket.data.userId) return reply({ ok: false, error: 'Forbidden' });
+    const employeeId = socket.data.userId;
+    notePresence(employeeId, pickStatus({ tracking: state.tracking, live: state.liveView }));
+    const viewers = io.sockets.adapter.rooms.get(viewersRoom(employeeId))?.size || 0;
+    if (viewers) liveStreamOn.set(employeeId, true);
+    let intervalSeconds = null;
+    try {
+      intervalSeconds = JSON.parse(fs.readFileSync(intervalsFile, 'utf-8'))[employeeId] || null;
+    } catch {}
+    reply({ ok: true, viewers, intervalSeconds });
+  });
+
   // Manager can start live view: join the viewer room and signal employee
   socket.on('live_view:start', ({ employeeId }) => {
     // Only allow verified manager/super_admin via JWT
@@ -901,14 +1413,23 @@ io.on('connection', (socket) => {
     io.to(viewersRoom(employeeId)).emit('live_view:terminate', { by: userId, reason: 'employee_terminate' });
   });
 
-// Employee streams frames; server always relays to viewers of that employee
-socket.on('live_view:frame', ({ employeeId, frameBase64, ts }) => {
-  io.to(viewersRoom(employeeId)).emit('live_view:frame', { employeeId, frameBase64, ts });
+// Employee streams frames; server always relays to viewers of that employee.
+// Payloads are keyframes ({ kind: 'key' }) or changed tiles ({ kind: 'delta', tiles }). JPEGs arrive as
+// binary attachments in `frame` (header carries seq and the client's monotonic `mono` ms) or, from older
+// clients, as `frameBase64` with an ISO `ts`. Binary parts are relayed untouched.
+// The ack lets the client measure round-trip time and adapt its frame rate and quality.
+socket.on('live_view:frame', (payload = {}, ack) => {
+  const { employeeId } = payload;
+  if (!payload.ts) payload.ts = new Date().toISOString();
+  io.to(viewersRoom(employeeId)).emit('live_view:frame', payload);
+  if (typeof ack === 'function') ack({ ok: true });
 });
 
   socket.on('disconnect', () => {
     // If an employee disconnects, proactively terminate any viewer sessions
     if (role === 'employee' && userId) {
+      // A client that reconnected before the old socket timed out here is still online
+      if (io.sockets.adapter.rooms.get(userRoom(userId))?.size) return;
       onlineEmployees.delete(userId);
       io.emit('presence:offline', { userId });
       liveStreamOn.set(userId, false);
@@ -1037,7 +1558,8 @@ app.get('/api/presence/online', requireRole(['manager', 'super_admin']), (req, r
       const teamEmails = getTeamEmailsForManager(req.user?.uid || req.user?.sub);
       users = users.filter(u => teamEmails.includes(u));
     }
-    res.json({ users });
+    const status = Object.fromEntries(users.filter(u => presenceStatus.has(u)).map(u => [u, presenceStatus.get(u)]));
+    res.json({ users, status });
   } catch (e) {
     console.error('[presence:online] error:', e);
     res.status(500).json({ error: 'Failed to read presence' });
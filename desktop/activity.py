@@ -0,0 +1,217 @@
+import os
+import sys
+import glob
+import time
+import select
+import ctypes
+import ctypes.util
+import threading
+
+
+class WindowsIdleSource:
+    # GetLastInputInfo: milliseconds since the last keyboard/mouse input in this session
+    name = 'windows'
+
+    def __init__(self):
+        class LASTINPUTINFO(ctypes.Structure):
+            _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+        self._user32 = ctypes.windll.user32
+        self._kernel32 = ctypes.windll.kernel32
+        self._lii = LASTINPUTINFO()
+        self._lii.cbSize = ctypes.sizeof(LASTINPUTINFO)
+
+    def idle_seconds(self):
+        if not self._user32.GetLastInputInfo(ctypes.byref(self._lii)):
+            return None
+        # Both are 32-bit tick counts; subtract modulo 2**32 so the 49.7-day wrap doesn't matter
+        now = self._kernel32.GetTickCount() & 0xFFFFFFFF
+        return ((now - self._lii.dwTime) & 0xFFFFFFFF) / 1000.0
+
+    def close(self):
+        pass
+
+
+class XScreenSaverInfo(ctypes.Structure):
+    _fields_ = [
+        ("window", ctypes.c_ulong),
+        ("state", ctypes.c_int),
+        ("kind", ctypes.c_int),
+        ("til_or_since", ctypes.c_ulong),
+        ("idle", ctypes.c_ulong),
+        ("eventMask", ctypes.c_ulong),
+    ]
+
+
+class X11IdleSource:
+    # XScreenSaverQueryInfo via libXss: server-side idle time, no input devices need to be readable.
+    # Xlib handles are not thread-safe, so create and use this on one thread.
+    name = 'x11'
+
+    def __init__(self):
+        if not os.environ.get('DISPLAY'):
+            raise OSError('DISPLAY not set')
+        x11_path = ctypes.util.find_library('X11')
+        xss_path = ctypes.util.find_library('Xss')
+        if not x11_path or not xss_path:
+            raise OSError('libX11/libXss not found')
+        self._x11 = ctypes.CDLL(x11_path)
+        self._xss = ctypes.CDLL(xss_path)
+        self._x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self._x11.XOpenDisplay.restype = ctypes.c_void_p
+        self._x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        self._x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        self._x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        self._x11.XFree.argtypes = [ctypes.c_void_p]
+        self._xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(XScreenSaverInfo)
+        self._xss.XScreenSaverQueryInfo.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XScreenSaverInfo)]
+        self._display = self._x11.XOpenDisplay(None)
+        if not self._display:
+            raise OSError('cannot open X display')
+        self._root = self._x11.XDefaultRootWindow(self._display)
+        self._info = self._xss.XScreenSaverAllocInfo()
+
+    def idle_seconds(self):
+        if not self._xss.XScreenSaverQueryInfo(self._display, self._root, self._info):
+            return None
+        return self._info.contents.idle / 1000.0
+
+    def close(self):
+        try:
+            self._x11.XFree(self._info)
+            self._x11.XCloseDisplay(self._display)
+        except Exception:
+            pass
+
+
+class DevInputIdleSource:
+    # Fallback for Wayland/console sessions: any event from a keyboard or mouse device counts as input.
+    # Needs read access to /dev/input (root or the 'input' group). Only kbd/mouse devices are opened so
+    # sensors and switches don't register as activity.
+    name = 'evdev'
+
+    def __init__(self, paths=None):
+        if paths is None:
+            paths = set()
+            for pattern in ('/dev/input/by-id/*-event-kbd', '/dev/input/by-id/*-event-mouse',
+                            '/dev/input/by-path/*-event-kbd', '/dev/input/by-path/*-event-mouse'):
+                paths.update(os.path.realpath(p) for p in glob.glob(pattern))
+        self._fds = []
+        for path in sorted(paths):
+            try:
+                self._fds.append(os.open(path, os.O_RDONLY | os.O_NONBLOCK))
+            except OSError:
+                pass
+        if not self._fds:
+            raise OSError('no readable keyboard/mouse devices in /dev/input')
+        self._last_input = time.monotonic()
+
+    def idle_seconds(self):
+        readable, _, _ = select.select(self._fds, [], [], 0)
+        for fd in readable:
+            try:
+                while os.read(fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+            except OSError:
+                continue
+            self._last_input = time.monotonic()
+        return time.monotonic() - self._last_input
+
+    def close(self):
+        for fd in self._fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds = []
+
+
+def open_idle_source():
+    # Best available source for this platform, or None if idle time can't be read here
+    candidates = [WindowsIdleSource] if sys.platform == 'win32' else [X11IdleSource, DevInputIdleSource]
+    for cls in candidates:
+        try:
+            return cls()
+        except Exception as e:
+            print(f'[activity] {cls.name} source unavailable:', e)
+    return None
+
+
+class ActivitySampler:
+    # Reads seconds-since-last-input every sample_interval on its own thread. Idle time beyond
+    # idle_threshold is accumulated at sample resolution, and each wall-clock second with input is
+    # set in a per-minute 60-bit bitmap (most significant bit = second 0). take() hands both over,
+    # once per heartbeat. Where no source is available everything reads as active, as before.
+    def __init__(self, idle_threshold=180, sample_interval=1.0, max_minutes=24 * 60):
+        self.idle_threshold = idle_threshold
+        self.sample_interval = sample_interval
+        self.max_minutes = max_minutes
+        self.source_name = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._idle = 0.0
+        self._idle_accum = 0.0
+        self._minutes = {}  # epoch minute -> bitmap of active seconds
+
+    def start(self):
+        # Each run gets its own stop event, so a restart never waits for the previous thread to exit
+        if self._thread and self._thread.is_alive() and not self._stop_event.is_set():
+            return
+        with self._lock:
+            self._idle = 0.0
+            self._idle_accum = 0.0
+            self._minutes = {}
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop_event,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def idle_seconds(self) -> float:
+        with self._lock:
+            return self._idle
+
+    def take(self):
+        # (whole idle seconds accrued since the last take, [{'minute', 'bits'}] for completed minutes)
+        current = int(time.time() // 60)
+        with self._lock:
+            whole = int(self._idle_accum)
+            self._idle_accum -= whole
+            done = sorted(m for m in self._minutes if m < current)
+            bitmaps = [{'minute': m, 'bits': format(self._minutes.pop(m), '015x')} for m in done]
+        return whole, bitmaps
+
+    def _run(self, stop_event):
+        # The source is opened here: Xlib wants one thread per display connection
+        source = open_idle_source()
+        self.source_name = source.name if source else None
+        if source is None:
+            return
+        last = time.monotonic()
+        try:
+            while not stop_event.wait(self.sample_interval):
+                idle = source.idle_seconds()
+                now = time.monotonic()
+                dt, last = now - last, now
+                if idle is None:
+                    continue
+                self._sample(idle, dt, time.time())
+        finally:
+            source.close()
+
+    def _sample(self, idle, dt, wall):
+        minute, second = int(wall // 60), int(wall % 60)
+        with self._lock:
+            self._idle = idle
+            if idle >= self.idle_threshold:
+                # only the part of this interval past the threshold counts
+                self._idle_accum += min(dt, idle - self.idle_threshold)
+            bits = self._minutes.get(minute, 0)
+            if idle < dt:
+                bits |= 1 << (59 - second)
+            self._minutes[minute] = bits
+            if len(self._minutes) > self.max_minutes:
+                del self._minutes[min(self._minutes)]
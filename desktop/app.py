@@ -1,35 +1,2363 @@
+import time
+STARTED_AT = time.perf_counter()  # startup timings are measured from here
 import os
 import io
-import time
+import sys
+import json
+import queue
 import base64
+import random
+import signal
+import getpass
+import argparse
+import tempfile
 import threading
-import requests
-import socketio
+import importlib
+import importlib.util
+import zlib
+import uuid
+import hashlib
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
 from datetime import datetime
 
-try:
-    import tkinter as tk
-    from tkinter import ttk, messagebox
-    from tkinter import font as tkfont
-except Exception:
-    raise RuntimeError('Tkinter is required to run the desktop client.')
+from activity import ActivitySampler
+from foreground import open_foreground_source
+from metrics import METRICS, serve_metrics
+
+try:
+    import tkinter as tk
+    from tkinter import ttk, messagebox
+    from tkinter import font as tkfont
+except Exception:
+    tk = None  # only the window needs Tk; --headless runs without it
+
+if importlib.util.find_spec('mss') is None or importlib.util.find_spec('PIL') is None:
+    raise RuntimeError('Install dependencies from requirements.txt (mss, Pillow).')
+
+
+class LazyModule:
+    # Stands in for a module and imports it on first attribute access, so the window is not kept waiting
+    # on the capture and network stacks. Each import is timed as the 'import_<module>' metrics stage.
+    _lock = threading.Lock()
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            with LazyModule._lock:
+                if self._module is None:
+                    with METRICS.timer('import_' + self._name):
+                        self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        # Only reached on a miss; cache the attribute so later lookups cost a plain instance lookup
+        value = getattr(self.load(), attr)
+        setattr(self, attr, value)
+        return value
+
+
+# Heavy imports are deferred: the event loop starts with the core, socket.io and aiohttp at login,
+# and mss/Pillow with the first capture
+asyncio = LazyModule('asyncio')
+aiohttp = LazyModule('aiohttp')
+socketio = LazyModule('socketio')
+mss = LazyModule('mss')
+Image = LazyModule('PIL.Image')
+features = LazyModule('PIL.features')
+
+
+def process_age() -> float:
+    # Seconds since the OS created this process, so interpreter start-up and compiling app.py count too.
+    # Falls back to the time since app.py began loading where the creation time is not available.
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            from ctypes import wintypes
+            kernel32 = ctypes.windll.kernel32
+            kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+            created, exited, kernel, user, now = (wintypes.FILETIME() for _ in range(5))
+            if kernel32.GetProcessTimes(wintypes.HANDLE(kernel32.GetCurrentProcess()), ctypes.byref(created),
+                                        ctypes.byref(exited), ctypes.byref(kernel), ctypes.byref(user)):
+                kernel32.GetSystemTimeAsFileTime(ctypes.byref(now))
+                ticks = lambda ft: (ft.dwHighDateTime << 32) | ft.dwLowDateTime  # 100 ns units
+                return (ticks(now) - ticks(created)) / 1e7
+        elif sys.platform.startswith('linux'):
+            with open('/proc/self/stat') as f:
+                start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])  # field 22, starttime
+            with open('/proc/uptime') as f:
+                uptime = float(f.read().split()[0])
+            return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except Exception:
+        pass
+    return time.perf_counter() - STARTED_AT
+
+
+_startup_phases = {}  # phase -> ms from launch, in the order reached
+
+
+def mark_startup(phase):
+    # Record when a startup phase completed; also exported as the startup_<phase>_ms gauge
+    ms = round(process_age() * 1000)
+    _startup_phases[phase] = ms
+    METRICS.gauge(f'startup_{phase}_ms', lambda: ms)
+    return ms
+
+
+def report_startup(budget_phase):
+    # One line (and a metrics log record) with every phase; flagged if budget_phase took over the budget
+    phases = dict(_startup_phases)
+    METRICS.log('startup', budget_ms=STARTUP_BUDGET_MS, **phases)
+    line = ', '.join(f'{phase} {ms} ms' for phase, ms in phases.items())
+    if phases.get(budget_phase, 0) > STARTUP_BUDGET_MS:
+        line += f' (over the {STARTUP_BUDGET_MS} ms {budget_phase} budget)'
+    print('[startup]', line)
+
+
+BACKEND_URL = os.environ.get('BACKEND_URL', 'http://mail.vughy.com:10002')
+LOCAL_BACKEND_URLS = ['http://127.0.0.1:4000', 'http://localhost:4000', 'http://127.0.0.1:4011', 'http://localhost:4011']
+BACKEND_CACHE_TTL_SECONDS = int(os.environ.get('BACKEND_CACHE_TTL_SECONDS', str(24 * 3600)))  # reuse last good URL
+STATE_DIR = os.environ.get('TRACKER_STATE_DIR', os.path.join(os.path.expanduser('~'), '.time_tracker'))
+SCREENSHOT_INTERVAL_SECONDS = int(os.environ.get('SCREENSHOT_INTERVAL_SECONDS', '180'))  # default 3 minutes
+LIVE_VIEW_INTERVAL_SECONDS = int(os.environ.get('LIVE_VIEW_INTERVAL_SECONDS', '5'))  # faster live frames
+HEARTBEAT_INTERVAL_SECONDS = int(os.environ.get('HEARTBEAT_INTERVAL_SECONDS', '60'))  # send idle heartbeat every 60s
+IDLE_THRESHOLD_SECONDS = int(os.environ.get('IDLE_THRESHOLD_SECONDS', '180'))  # no input for this long counts as idle
+ACTIVITY_SAMPLE_SECONDS = float(os.environ.get('ACTIVITY_SAMPLE_SECONDS', '1'))  # input sampling period
+# Spread clients over the capture interval (stable per-employee slot); set to 0 to capture right at start
+CAPTURE_JITTER = os.environ.get('CAPTURE_JITTER', '1') != '0'
+UI_REFRESH_MS = 250  # single UI ticker period; all background state is rendered at this rate
+STARTUP_BUDGET_MS = int(os.environ.get('STARTUP_BUDGET_MS', '300'))  # launch-to-window target, reported at startup
+CAPTURE_MONITOR_INDEX = int(os.environ.get('CAPTURE_MONITOR_INDEX', '1'))  # mss monitor index (1 = primary)
+# Monitors to capture: 'primary' (CAPTURE_MONITOR_INDEX), 'all', or a list of mss indexes such as '1,3'.
+# Several monitors are composited into one image laid out as on the desktop.
+CAPTURE_MONITORS = os.environ.get('CAPTURE_MONITORS', 'primary')
+# 'window' grabs only the foreground window (Windows or X11) at full resolution, records its title and app,
+# and attaches a small full-desktop thumbnail for context. Without a usable window it captures CAPTURE_MONITORS.
+CAPTURE_REGION = os.environ.get('CAPTURE_REGION', 'screen').lower()
+CAPTURE_CONTEXT_INTERVAL_SECONDS = float(os.environ.get('CAPTURE_CONTEXT_INTERVAL_SECONDS', '30'))  # thumbnail reuse
+CONTEXT_THUMBNAIL_SIZE = (480, 270)
+CONTEXT_THUMBNAIL_QUALITY = 50
+WINDOW_MIN_SIZE = 64  # smaller (or mostly off-screen) foreground windows fall back to the monitors
+CAPTURE_TIMEOUT_SECONDS = float(os.environ.get('CAPTURE_TIMEOUT_SECONDS', '10'))
+LIVE_FRAME_MAX_AGE_SECONDS = 1.0  # live loop reuses a frame the tracker grabbed this recently
+LIVE_TILE_SIZE = int(os.environ.get('LIVE_TILE_SIZE', '64'))  # px; multiple of 16 keeps JPEG blocks aligned
+LIVE_KEYFRAME_INTERVAL_SECONDS = int(os.environ.get('LIVE_KEYFRAME_INTERVAL_SECONDS', '60'))  # forced full frame
+LIVE_MAX_DIRTY_RATIO = 0.5  # above this share of changed tiles a keyframe is cheaper than tiles
+# Send live JPEGs as socket.io binary attachments; set to 0 for the legacy base64 JSON payload
+LIVE_VIEW_BINARY = os.environ.get('LIVE_VIEW_BINARY', '1') != '0'
+# Bounds for the adaptive live-view controller; it moves within them based on frame ack latency
+LIVE_MIN_INTERVAL_SECONDS = float(os.environ.get('LIVE_MIN_INTERVAL_SECONDS', '1'))
+LIVE_MAX_INTERVAL_SECONDS = float(os.environ.get('LIVE_MAX_INTERVAL_SECONDS', '15'))
+LIVE_MIN_QUALITY = int(os.environ.get('LIVE_MIN_QUALITY', '35'))
+LIVE_MAX_QUALITY = int(os.environ.get('LIVE_MAX_QUALITY', '75'))
+LIVE_SIZES = [(480, 270), (640, 360), (960, 540), (1280, 720)]  # live resolution ladder
+LIVE_TARGET_RTT_SECONDS = float(os.environ.get('LIVE_TARGET_RTT_SECONDS', '0.5'))
+LIVE_ACK_TIMEOUT_SECONDS = 10  # unacked frame after this counts as congestion
+SPOOL_DIR = os.environ.get('SPOOL_DIR', os.path.join(STATE_DIR, 'spool'))
+SPOOL_MAX_BYTES = int(os.environ.get('SPOOL_MAX_BYTES', str(500 * 1024 * 1024)))  # oldest evicted beyond this
+SPOOL_MAX_AGE_SECONDS = int(os.environ.get('SPOOL_MAX_AGE_SECONDS', str(7 * 24 * 3600)))
+SPOOL_BATCH_SIZE = int(os.environ.get('SPOOL_BATCH_SIZE', '10'))  # screenshots per bulk replay request
+# Screenshots of at least CHUNKED_UPLOAD_MIN_BYTES go through the resumable chunked route in UPLOAD_CHUNK_BYTES
+# parts, so a dropped connection only costs the part in flight; CHUNKED_UPLOAD=0 always uses multipart
+CHUNKED_UPLOAD = os.environ.get('CHUNKED_UPLOAD', '1') != '0'
+CHUNKED_UPLOAD_MIN_BYTES = int(os.environ.get('CHUNKED_UPLOAD_MIN_BYTES', str(1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.environ.get('UPLOAD_CHUNK_BYTES', str(256 * 1024)))
+# Work events (start/heartbeat/stop) are journaled locally and flushed in batches; start/stop flush at once
+JOURNAL_DIR = os.environ.get('JOURNAL_DIR', os.path.join(STATE_DIR, 'journal'))
+WORK_FLUSH_INTERVAL_SECONDS = int(os.environ.get('WORK_FLUSH_INTERVAL_SECONDS', '900'))
+WORK_BATCH_SIZE = 200  # events per /api/work/events request
+SOCKET_ACK_TIMEOUT_SECONDS = 10  # socket work:events ack wait before falling back to HTTP
+# The socket reconnects for as long as the session lasts, waiting a decorrelated-jitter delay between
+# SOCKET_RECONNECT_BASE_SECONDS and SOCKET_RECONNECT_MAX_SECONDS, so clients come back spread out after
+# a backend restart instead of in lockstep
+SOCKET_RECONNECT_BASE_SECONDS = float(os.environ.get('SOCKET_RECONNECT_BASE_SECONDS', '1'))
+SOCKET_RECONNECT_MAX_SECONDS = float(os.environ.get('SOCKET_RECONNECT_MAX_SECONDS', '60'))
+SOCKET_CONNECT_TIMEOUT_SECONDS = 12
+# The login token is exchanged for a fresh one this long before it expires
+TOKEN_REFRESH_MARGIN_SECONDS = int(os.environ.get('TOKEN_REFRESH_MARGIN_SECONDS', '900'))
+TOKEN_CHECK_MAX_SECONDS = 300  # monotonic sleeps stop during suspend; re-read the wall clock this often
+JOURNAL_COMPACT_BYTES = 1024 * 1024  # truncate the journal once fully acknowledged and this large
+UPLOAD_RETRY_BASE_SECONDS = 2
+UPLOAD_RETRY_MAX_SECONDS = 300
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '8'))  # keep-alive connections per backend host
+UPLOAD_CONCURRENCY = int(os.environ.get('UPLOAD_CONCURRENCY', '2'))  # spooled batches in flight at once
+EXECUTOR_WORKERS = int(os.environ.get('EXECUTOR_WORKERS', '2'))  # threads for grabs, encoding and disk writes
+STOP_FLUSH_TIMEOUT_SECONDS = 3  # stop event delivery wait on stop/exit; otherwise replayed at next login
+SHUTDOWN_TIMEOUT_SECONDS = 5  # upper bound for shutdown() however the network behaves
+# Pipeline metrics: local scrape endpoint on 127.0.0.1 (0 = off) and a rotating JSON-lines log
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
+METRICS_LOG = os.environ.get('METRICS_LOG', '1') != '0'
+METRICS_LOG_DIR = os.environ.get('METRICS_LOG_DIR', os.path.join(STATE_DIR, 'logs'))
+METRICS_LOG_INTERVAL_SECONDS = int(os.environ.get('METRICS_LOG_INTERVAL_SECONDS', '60'))
+
+# Per-endpoint (timeout seconds, retries on connection errors/5xx). Non-idempotent calls and calls
+# with their own retry loop (heartbeat, spool uploads) are not retried here. Chunked upload calls are
+# safe to repeat: parts are checked against the server's offset.
+ENDPOINT_POLICIES = {
+    'default': (10, 0),
+    'health': (2, 0),
+    'login': (10, 1),
+    'token_refresh': (10, 1),
+    'capture_interval': (10, 2),
+    'work': (10, 2),
+    'heartbeat': (10, 0),
+    'upload': (30, 0),
+    'upload_chunk': (30, 2),
+}
+RETRY_STATUSES = (502, 503, 504)
+
+# Upload image format: 'auto' takes the backend's choice from /api/capture-interval, else 'jpeg' or 'webp'
+CAPTURE_FORMAT = os.environ.get('CAPTURE_FORMAT', 'auto').lower()
+JPEG_ENCODER = os.environ.get('JPEG_ENCODER', 'auto').lower()  # 'pillow' to skip libjpeg-turbo
+IMAGE_FORMATS = {  # format -> (mime type, file extension)
+    'jpeg': ('image/jpeg', '.jpg'),
+    'webp': ('image/webp', '.webp'),
+}
+
+# Skip uploading screenshots whose perceptual hash is within DEDUP_MAX_DISTANCE bits of the last
+# uploaded one; a "same as" reference is recorded against that file instead
+SCREENSHOT_DEDUP = os.environ.get('SCREENSHOT_DEDUP', '1') != '0'
+DEDUP_HASH_SIZE = 16  # dHash grid; 16 gives a 256-bit hash
+DEDUP_MAX_DISTANCE = int(os.environ.get('DEDUP_MAX_DISTANCE', '4'))
+
+# Encoded renditions a consumer can ask a captured frame for: (max size or None for native, JPEG quality).
+# Consumers may also pass such a tuple directly (the live-view rate controller does).
+CAPTURE_RENDITIONS = {
+    'full': (None, 70),
+    'live': ((960, 540), 60),
+}
+
+
+class PillowEncoder:
+    # Baseline encoder for every format Pillow was built with. Each thread keeps one output buffer that
+    # is rewound rather than reallocated, so it stops growing once it has seen the largest frame.
+    name = 'pillow'
+
+    def __init__(self, fmt='jpeg'):
+        self.format = fmt
+        self._local = threading.local()
+
+    def encode(self, img, quality) -> bytes:
+        buf = getattr(self._local, 'buf', None)
+        if buf is None:
+            buf = self._local.buf = io.BytesIO()
+        buf.seek(0)
+        img.save(buf, format=self.format.upper(), quality=quality)
+        size = buf.tell()
+        with buf.getbuffer() as view:
+            return bytes(view[:size])
+
+
+class TurboJpegEncoder:
+    # libjpeg-turbo via PyTurboJPEG; can also encode straight from the grabbed BGRX buffer
+    name = 'turbojpeg'
+    format = 'jpeg'
+
+    def __init__(self):
+        # Optional dependency (PyTurboJPEG + numpy); imported here because numpy alone is ~100 ms of startup
+        import numpy
+        import turbojpeg
+        self._np = numpy
+        self._tj = turbojpeg.TurboJPEG()
+        self._rgb = turbojpeg.TJPF_RGB
+        self._bgrx = turbojpeg.TJPF_BGRX
+
+    def encode(self, img, quality) -> bytes:
+        return self._tj.encode(self._np.asarray(img), quality=quality, pixel_format=self._rgb)
+
+    def encode_bgrx(self, bgrx, size, quality) -> bytes:
+        w, h = size
+        arr = self._np.frombuffer(bgrx, dtype=self._np.uint8).reshape(h, w, 4)
+        return self._tj.encode(arr, quality=quality, pixel_format=self._bgrx)
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(fmt='jpeg'):
+    # Fastest available encoder for fmt, created once and shared by all frames
+    with _encoders_lock:
+        enc = _encoders.get(fmt)
+        if enc is None:
+            if fmt == 'jpeg' and JPEG_ENCODER != 'pillow':
+                try:
+                    enc = TurboJpegEncoder()
+                except ImportError:
+                    pass  # PyTurboJPEG not installed
+                except Exception as e:
+                    print('[encode] libjpeg-turbo unavailable, using Pillow:', e)
+            if enc is None:
+                enc = PillowEncoder(fmt)
+            _encoders[fmt] = enc
+        return enc
+
+
+def supported_formats():
+    fmts = ['jpeg']
+    try:
+        if features.check('webp'):
+            fmts.append('webp')
+    except Exception:
+        pass
+    return fmts
+
+
+class ImagePool:
+    # Recycles full-resolution RGB images between captures so steady-state capturing allocates no new
+    # frame-sized buffers. Frames hand their image back once the last reference to them is dropped.
+    def __init__(self, keep=2):
+        self.keep = keep
+        self._size = None
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self, size):
+        with self._lock:
+            if size == self._size and self._free:
+                return self._free.pop()
+        return Image.new('RGB', size)
+
+    def release(self, img):
+        with self._lock:
+            if img.size != self._size:
+                # resolution changed; images of the old size are no longer useful
+                self._size = img.size
+                self._free = []
+            if len(self._free) < self.keep:
+                self._free.append(img)
+
+
+def fit_size(size, max_size):
+    # Largest size within max_size keeping the aspect ratio; never upscales (like Image.thumbnail)
+    w, h = size
+    scale = min(max_size[0] / w, max_size[1] / h, 1.0)
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def scale_bgrx(bgra, size, target):
+    # Box filtering treats channels independently, so resize the BGRX bytes (mapped, not copied) as if
+    # they were RGBX and swap red/blue on the small result
+    raw = Image.frombuffer('RGBX', size, bgra, 'raw', 'RGBX', 0, 1)
+    b, g, r, _ = raw.resize(target, Image.Resampling.BOX).split()
+    return Image.merge('RGB', (r, g, b))
+
+
+def hash_distance(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+class CapturedFrame:
+    # One grabbed screen image; renditions are encoded on first request and cached for other consumers.
+    # Downscaled renditions are box-filtered straight from the grabbed BGRX buffer (mapped, not copied);
+    # the native-size RGB image is only built when a consumer needs it, into a pooled image.
+    def __init__(self, seq, size, bgra, ts, pool=None):
+        self.seq = seq
+        self.size = size
+        self.ts = ts  # time.monotonic() at grab
+        self.window = None  # window capture mode: {'title', 'app', 'left', 'top', 'width', 'height'}
+        self.context = None  # window capture mode: JPEG thumbnail of the whole desktop
+        self._bgra = bgra
+        self._pool = pool
+        self._rgb = None
+        self._images = {}
+        self._renditions = {}
+        self._dhash = None
+        self._lock = threading.Lock()
+
+    def _native(self):
+        if self._rgb is None:
+            if self._pool is not None:
+                rgb = self._pool.acquire(self.size)
+                weakref.finalize(self, self._pool.release, rgb)
+            else:
+                rgb = Image.new('RGB', self.size)
+            with METRICS.timer('convert'):
+                rgb.frombytes(self._bgra, 'raw', 'BGRX')
+            self._rgb = rgb
+        return self._rgb
+
+    def _image(self, max_size):
+        # Images returned here (the native one especially) are only valid while the frame is referenced
+        img = self._images.get(max_size)
+        if img is None:
+            if not max_size:
+                img = self._native()
+            else:
+                with METRICS.timer('downscale'):
+                    if self._rgb is not None:
+                        img = self._rgb.resize(fit_size(self.size, max_size), Image.Resampling.BOX)
+                    else:
+                        img = scale_bgrx(self._bgra, self.size, fit_size(self.size, max_size))
+            self._images[max_size] = img
+        return img
+
+    def image(self, rendition='full'):
+        max_size, _ = CAPTURE_RENDITIONS.get(rendition, rendition)
+        with self._lock:
+            return self._image(max_size)
+
+    def encode(self, rendition='full', fmt='jpeg') -> bytes:
+        spec = CAPTURE_RENDITIONS.get(rendition, rendition)
+        with self._lock:
+            data = self._renditions.get((spec, fmt))
+            if data is None:
+                max_size, quality = spec
+                enc = get_encoder(fmt)
+                stage = f'encode_{fmt}'
+                if max_size is None and self._rgb is None and self._bgra is not None and hasattr(enc, 'encode_bgrx'):
+                    with METRICS.timer(stage):
+                        data = enc.encode_bgrx(self._bgra, self.size, quality)
+                else:
+                    img = self._image(max_size)
+                    with METRICS.timer(stage):
+                        data = enc.encode(img, quality)
+                METRICS.size(stage, len(data))
+                self._renditions[(spec, fmt)] = data
+            return data
+
+    def jpeg(self, rendition='full') -> bytes:
+        return self.encode(rendition, 'jpeg')
+
+    def dhash(self, size=DEDUP_HASH_SIZE) -> str:
+        # Difference hash (hex): one bit per horizontal brightness gradient of a (size+1) x size box
+        # thumbnail. Red/blue stay swapped as mapped; that is consistent between frames so it doesn't matter.
+        with self._lock:
+            if self._dhash is None:
+                with METRICS.timer('hash'):
+                    px = list(self._hash_image((size + 1, size)).convert('L').getdata())
+                bits = 0
+                for y in range(size):
+                    row = y * (size + 1)
+                    for x in range(size):
+                        bits = (bits << 1) | (px[row + x] < px[row + x + 1])
+                self._dhash = format(bits, f'0{size * size // 4}x')
+            return self._dhash
+
+    def _hash_image(self, size):
+        raw = Image.frombuffer('RGBX', self.size, self._bgra, 'raw', 'RGBX', 0, 1)
+        return raw.resize(size, Image.Resampling.BOX)
+
+
+class MonitorPart:
+    # One monitor's grab within a composite frame. A monitor whose pixels did not change since the
+    # previous grab keeps its part object, so its downscaled images are reused instead of recomputed.
+    def __init__(self, origin, size, bgra, digest):
+        self.origin = origin  # (left, top) in desktop coordinates
+        self.size = size
+        self.digest = digest
+        self._bgra = bgra
+        self._scaled = {}
+        self._lock = threading.Lock()
+
+    def same_as(self, origin, size, digest):
+        return self.origin == origin and self.size == size and self.digest == digest
+
+    def native(self):
+        return Image.frombytes('RGB', self.size, self._bgra, 'raw', 'BGRX')
+
+    def scaled(self, target):
+        with self._lock:
+            img = self._scaled.get(target)
+            if img is None:
+                # keep only the latest size; the live ladder moves between a few sizes at most
+                self._scaled = {target: scale_bgrx(self._bgra, self.size, target)}
+                img = self._scaled[target]
+            return img
+
+
+class CompositeFrame(CapturedFrame):
+    # Several monitors in one frame, laid out on their desktop bounding box (gaps are black). Each
+    # monitor is downscaled on its own and pasted into the smaller canvas, never the reverse.
+    def __init__(self, seq, parts, ts, pool=None):
+        left = min(p.origin[0] for p in parts)
+        top = min(p.origin[1] for p in parts)
+        right = max(p.origin[0] + p.size[0] for p in parts)
+        bottom = max(p.origin[1] + p.size[1] for p in parts)
+        super().__init__(seq, (right - left, bottom - top), None, ts, pool)
+        self.parts = parts
+        self._offsets = [(p.origin[0] - left, p.origin[1] - top) for p in parts]
+
+    def inherit(self, prev):
+        # Same parts as the previous frame: its encodings and hash are still valid. Images are not
+        # shared, since the native one belongs to the previous frame's pool lease.
+        with prev._lock:
+            self._renditions = dict(prev._renditions)
+            self._dhash = prev._dhash
+
+    def _native(self):
+        if self._rgb is None:
+            if self._pool is not None:
+                rgb = self._pool.acquire(self.size)
+                weakref.finalize(self, self._pool.release, rgb)
+            else:
+                rgb = Image.new('RGB', self.size)
+            with METRICS.timer('convert'):
+                if sum(p.size[0] * p.size[1] for p in self.parts) < self.size[0] * self.size[1]:
+                    rgb.paste((0, 0, 0), (0, 0) + self.size)
+                for part, offset in zip(self.parts, self._offsets):
+                    rgb.paste(part.native(), offset)
+            self._rgb = rgb
+        return self._rgb
+
+    def _image(self, max_size):
+        img = self._images.get(max_size)
+        if img is None:
+            if not max_size:
+                img = self._native()
+            else:
+                target = fit_size(self.size, max_size)
+                sx, sy = target[0] / self.size[0], target[1] / self.size[1]
+                with METRICS.timer('downscale'):
+                    img = Image.new('RGB', target)
+                    for part, (x, y) in zip(self.parts, self._offsets):
+                        box = (round(x * sx), round(y * sy), round((x + part.size[0]) * sx), round((y + part.size[1]) * sy))
+                        size = (max(1, box[2] - box[0]), max(1, box[3] - box[1]))
+                        img.paste(part.scaled(size), box[:2])
+            self._images[max_size] = img
+        return img
+
+    def _hash_image(self, size):
+        return self._image((256, 256)).resize(size, Image.Resampling.BOX)
+
+
+class LiveFrameDiffer:
+    # Splits live frames into tiles and compares per-tile CRCs with the previous frame so that only
+    # keyframes and changed tiles go over live_view:frame; unchanged frames produce nothing.
+    def __init__(self, tile_size=LIVE_TILE_SIZE, keyframe_interval=LIVE_KEYFRAME_INTERVAL_SECONDS):
+        self.tile_size = tile_size
+        self.keyframe_interval = keyframe_interval
+        self._lock = threading.Lock()
+        self._size = None
+        self._hashes = None
+        self._last_key_ts = 0.0
+        self._seq = 0
+
+    def reset(self):
+        # Next frame goes out as a keyframe (new viewer joined, stream restarted)
+        with self._lock:
+            self._hashes = None
+
+    def _tile_hashes(self, img):
+        w, h = img.size
+        t = self.tile_size
+        stride = w * 3
+        buf = memoryview(img.tobytes())
+        cols = (w + t - 1) // t
+        hashes = []
+        for ty in range(0, h, t):
+            row = [0] * cols
+            for y in range(ty, min(ty + t, h)):
+                line = y * stride
+                for c in range(cols):
+                    x0 = c * t * 3
+                    row[c] = zlib.crc32(buf[line + x0:line + min(x0 + t * 3, stride)], row[c])
+            hashes.extend(row)
+        return hashes
+
+    def diff(self, frame: CapturedFrame, rendition='live'):
+        # Returns ('key', seq, jpeg_bytes), ('delta', seq, [(x, y, w, h, jpeg_bytes), ...]) or None if unchanged
+        img = frame.image(rendition)
+        hashes = self._tile_hashes(img)
+        now = time.monotonic()
+        with self._lock:
+            prev = self._hashes
+            key = prev is None or self._size != img.size or now - self._last_key_ts >= self.keyframe_interval
+            dirty = []
+            if not key:
+                dirty = [i for i, h in enumerate(hashes) if h != prev[i]]
+                if not dirty:
+                    return None
+                key = len(dirty) > LIVE_MAX_DIRTY_RATIO * len(hashes)
+            self._hashes = hashes
+            self._size = img.size
+            self._seq += 1
+            if key:
+                self._last_key_ts = now
+                return 'key', self._seq, frame.jpeg(rendition)
+        _, quality = CAPTURE_RENDITIONS.get(rendition, rendition)
+        w, h = img.size
+        t = self.tile_size
+        cols = (w + t - 1) // t
+        tiles = []
+        for i in dirty:
+            x, y = (i % cols) * t, (i // cols) * t
+            box = (x, y, min(x + t, w), min(y + t, h))
+            buf = io.BytesIO()
+            img.crop(box).save(buf, format='JPEG', quality=quality)
+            tiles.append((x, y, box[2] - x, box[3] - y, buf.getvalue()))
+        return 'delta', self._seq, tiles
+
+
+class LiveRateController:
+    # Adapts live-view interval, resolution and JPEG quality to the link. Each frame is emitted with an
+    # ack; while one is unacked new frames are dropped rather than queued behind it. Slow acks back off
+    # multiplicatively, fast acks recover frame rate first, then quality, then resolution.
+    def __init__(self, interval=LIVE_VIEW_INTERVAL_SECONDS):
+        self._lock = threading.Lock()
+        self.interval = min(LIVE_MAX_INTERVAL_SECONDS, max(LIVE_MIN_INTERVAL_SECONDS, float(interval)))
+        _, self.quality = CAPTURE_RENDITIONS['live']
+        self.level = LIVE_SIZES.index(CAPTURE_RENDITIONS['live'][0])
+        self.rtt = None  # EWMA of ack round-trip seconds
+        self.dropped = 0
+        self._inflight = None  # (seq, sent monotonic, bytes)
+
+    def rendition(self):
+        with self._lock:
+            return LIVE_SIZES[self.level], self.quality
+
+    def ready(self) -> bool:
+        # False while the previous frame is still unacked: drop this one instead of queueing it
+        with self._lock:
+            if self._inflight is None:
+                return True
+            if time.monotonic() - self._inflight[1] < LIVE_ACK_TIMEOUT_SECONDS:
+                self.dropped += 1
+                return False
+            self._inflight = None
+            self._congested()
+            return True
+
+    def sent(self, seq, nbytes):
+        with self._lock:
+            self._inflight = (seq, time.monotonic(), nbytes)
+
+    def acked(self, seq):
+        with self._lock:
+            if self._inflight is None or self._inflight[0] != seq:
+                return
+            _, sent_ts, nbytes = self._inflight
+            self._inflight = None
+            rtt = time.monotonic() - sent_ts
+            METRICS.observe('live_ack', rtt)
+            self.rtt = rtt if self.rtt is None else 0.7 * self.rtt + 0.3 * rtt
+            if self.rtt > 2 * LIVE_TARGET_RTT_SECONDS:
+                self._congested()
+            elif self.rtt < LIVE_TARGET_RTT_SECONDS:
+                self._improve(nbytes)
+
+    def cancel(self):
+        with self._lock:
+            self._inflight = None
+
+    def _congested(self):
+        self.interval = min(LIVE_MAX_INTERVAL_SECONDS, self.interval * 1.5)
+        if self.quality > LIVE_MIN_QUALITY:
+            self.quality = max(LIVE_MIN_QUALITY, self.quality - 10)
+        elif self.level > 0:
+            self.level -= 1
+            self.quality = CAPTURE_RENDITIONS['live'][1]
+
+    def _improve(self, nbytes):
+        # Never send faster than the link drains a frame of this size
+        floor = max(LIVE_MIN_INTERVAL_SECONDS, 2 * (self.rtt or 0))
+        if self.interval > floor:
+            self.interval = max(floor, self.interval * 0.8)
+        elif self.quality < LIVE_MAX_QUALITY:
+            self.quality = min(LIVE_MAX_QUALITY, self.quality + 5)
+        elif self.level < len(LIVE_SIZES) - 1:
+            self.level += 1
+            self.quality = CAPTURE_RENDITIONS['live'][1]
+
+
+def capture_slot(key=None) -> float:
+    # Stable fraction of the capture interval a client is offset by, so a fleet doesn't capture in step
+    if not key:
+        return random.random()
+    return (zlib.crc32(str(key).encode('utf-8')) % 10000) / 10000.0
+
+
+class CaptureScheduler:
+    # Monotonic deadlines for periodic captures. Each deadline is the previous one plus the interval,
+    # so time spent capturing/uploading never shifts the cadence; missed slots are skipped rather than
+    # replayed in a burst. wait() runs on the core's event loop and returns early on stop() or
+    # set_interval(), which must be called from that loop too. The wake event is made by the first
+    # wait(), so it belongs to that loop whichever thread built the scheduler.
+    def __init__(self, interval, slot_key=None, jitter=CAPTURE_JITTER):
+        self._changed = None
+        self.interval = max(1, interval)
+        self._stopped = False
+        self._last_due = None
+        # Fraction of the interval this client is offset by, stable across restarts for the same key
+        self._slot = capture_slot(slot_key) if jitter else 0.0
+        self._next = time.monotonic() + self._slot * self.interval
+
+    def set_interval(self, interval):
+        # New interval counts from the last capture, so a shorter one can be due right away
+        self.interval = max(1, interval)
+        if self._last_due is not None:
+            self._next = self._last_due + self.interval
+        else:
+            self._next = time.monotonic() + self._slot * self.interval
+        self._wake()
+
+    def stop(self):
+        self._stopped = True
+        self._wake()
+
+    def _wake(self):
+        if self._changed is not None:
+            self._changed.set()
+
+    def next_in(self) -> float:
+        return max(0.0, self._next - time.monotonic())
+
+    async def wait(self) -> bool:
+        # True when a capture is due, False once stopped
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        while not self._stopped:
+            now = time.monotonic()
+            if now >= self._next:
+                self._last_due = self._next
+                missed = int((now - self._next) // self.interval)
+                self._next += (missed + 1) * self.interval
+                return True
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), self._next - now)
+            except asyncio.TimeoutError:
+                pass
+        return False
+
+
+class CaptureEngine:
+    # Owns a single long-lived mss handle on a dedicated thread (mss handles are per-thread on Windows)
+    # and publishes the latest frame; concurrent requests are coalesced into one grab.
+    def __init__(self, monitor_index=CAPTURE_MONITOR_INDEX, monitors=CAPTURE_MONITORS, region=CAPTURE_REGION):
+        self.monitor_index = monitor_index
+        self.monitors = monitors
+        self.region = region
+        self._parts = {}  # mss index -> MonitorPart from the last multi-monitor grab
+        self._foreground = None  # window mode: foreground window source, owned by the capture thread
+        self._context = None  # window mode: (monotonic ts, JPEG) of the last desktop thumbnail
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._requested = False
+        self._busy = False  # a grab is in flight; late requesters share its result
+        self._latest = None
+        self._error = None
+        self._gen = 0  # bumped after every grab attempt
+        self._seq = 0
+        self._pool = ImagePool()
+
+    def start(self):
+        with self._cond:
+            if self._running and self._thread and self._thread.is_alive():
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._latest = None
+            self._cond.notify_all()
+
+    def latest(self, max_age=0.0, timeout=CAPTURE_TIMEOUT_SECONDS) -> CapturedFrame:
+        # Reuse the published frame if it is at most max_age seconds old, otherwise wait for a fresh grab
+        with self._cond:
+            frame = self._latest
+            if frame is not None and time.monotonic() - frame.ts <= max_age:
+                return frame
+            self.start()
+            gen = self._gen
+            if not self._busy:
+                self._requested = True
+                self._cond.notify_all()
+            deadline = time.monotonic() + timeout
+            while self._gen == gen:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError('screen capture timed out')
+                if not self._running:
+                    raise RuntimeError('capture engine stopped')
+                self._cond.wait(remaining)
+            if self._error is not None:
+                raise self._error
+            return self._latest
+
+    def _run(self):
+        me = threading.current_thread()
+        try:
+            with mss.mss() as sct:
+                # Opened after mss, on this thread: Xlib wants one thread per display connection, and on
+                # Windows mss has made the thread DPI aware so window bounds are in physical pixels
+                self._foreground = open_foreground_source() if self.region == 'window' else None
+                try:
+                    while True:
+                        with self._cond:
+                            while self._running and self._thread is me and not self._requested:
+                                self._cond.wait()
+                            if not self._running or self._thread is not me:
+                                return
+                            self._requested = False
+                            self._busy = True
+                        frame, error = None, None
+                        try:
+                            with METRICS.timer('grab'):
+                                frame = self._grab(sct)
+                            METRICS.size('grab', frame.size[0] * frame.size[1] * 4)
+                        except Exception as e:
+                            error = e
+                            METRICS.error('grab', e)
+                        with self._cond:
+                            if frame is not None:
+                                self._seq = frame.seq
+                                self._latest = frame
+                            self._error = error
+                            self._busy = False
+                            self._gen += 1
+                            self._cond.notify_all()
+                finally:
+                    if self._foreground is not None:
+                        self._foreground.close()
+                        self._foreground = None
+        except Exception as e:
+            print('[capture] engine error:', e)
+            with self._cond:
+                if self._thread is not me:
+                    return
+                self._error = e
+                self._running = False
+                self._busy = False
+                self._gen += 1
+                self._cond.notify_all()
+
+    def _monitor_indexes(self, count):
+        # mss lists the virtual desktop at 0 and physical monitors from 1
+        primary = self.monitor_index if 0 < self.monitor_index < count else 1
+        selection = str(self.monitors or 'primary').strip().lower()
+        if selection == 'primary':
+            return [primary]
+        if selection == 'all':
+            return list(range(1, count)) or [0]
+        try:
+            indexes = [int(v) for v in selection.split(',') if v.strip()]
+        except ValueError:
+            print('[capture] bad CAPTURE_MONITORS, using primary:', self.monitors)
+            return [primary]
+        return [i for i in indexes if 0 < i < count] or [primary]
+
+    def _grab(self, sct):
+        if self._foreground is not None:
+            frame = self._grab_window(sct)
+            if frame is not None:
+                return frame
+        monitors = sct.monitors
+        indexes = self._monitor_indexes(len(monitors))
+        if len(indexes) == 1:
+            shot = sct.grab(monitors[indexes[0]])
+            return CapturedFrame(self._seq + 1, shot.size, shot.raw, time.monotonic(), self._pool)
+        parts = []
+        for i in indexes:
+            mon = monitors[i]
+            shot = sct.grab(mon)
+            origin = (mon['left'], mon['top'])
+            digest = zlib.crc32(shot.raw)
+            prev = self._parts.get(i)
+            parts.append(prev if prev is not None and prev.same_as(origin, shot.size, digest)
+                         else MonitorPart(origin, shot.size, shot.raw, digest))
+        self._parts = dict(zip(indexes, parts))
+        frame = CompositeFrame(self._seq + 1, parts, time.monotonic(), self._pool)
+        prev_frame = self._latest
+        if isinstance(prev_frame, CompositeFrame) and len(prev_frame.parts) == len(parts) \
+                and all(a is b for a, b in zip(prev_frame.parts, parts)):
+            frame.inherit(prev_frame)
+        return frame
+
+    def _grab_window(self, sct):
+        # The foreground window clipped to the desktop, or None to capture the monitors instead
+        try:
+            win = self._foreground.foreground()
+        except Exception as e:
+            METRICS.error('foreground', e)
+            return None
+        if not win:
+            return None
+        desk = sct.monitors[0]
+        left, top = max(win['left'], desk['left']), max(win['top'], desk['top'])
+        right = min(win['left'] + win['width'], desk['left'] + desk['width'])
+        bottom = min(win['top'] + win['height'], desk['top'] + desk['height'])
+        if right - left < WINDOW_MIN_SIZE or bottom - top < WINDOW_MIN_SIZE:
+            return None
+        shot = sct.grab({'left': left, 'top': top, 'width': right - left, 'height': bottom - top})
+        frame = CapturedFrame(self._seq + 1, shot.size, shot.raw, time.monotonic(), self._pool)
+        frame.window = {'title': win['title'], 'app': win['app'], 'left': left, 'top': top,
+                        'width': shot.size[0], 'height': shot.size[1]}
+        frame.context = self._context_thumbnail(sct, desk)
+        return frame
+
+    def _context_thumbnail(self, sct, desk):
+        # Full desktop box-filtered straight from the grab to a small JPEG. Reused for
+        # CAPTURE_CONTEXT_INTERVAL_SECONDS, so live view's frequent grabs stay window-sized.
+        now = time.monotonic()
+        if self._context is None or now - self._context[0] >= CAPTURE_CONTEXT_INTERVAL_SECONDS:
+            with METRICS.timer('context'):
+                shot = sct.grab(desk)
+                img = scale_bgrx(shot.raw, shot.size, fit_size(shot.size, CONTEXT_THUMBNAIL_SIZE))
+                data = get_encoder('jpeg').encode(img, CONTEXT_THUMBNAIL_QUALITY)
+            METRICS.size('context', len(data))
+            self._context = (now, data)
+        return self._context[1]
+
+
+def build_live_frame_payload(employee_id, kind, seq, data, size, mono_ts, binary=LIVE_VIEW_BINARY):
+    # Binary form: compact header (employee, seq, monotonic ms) with raw JPEG bytes in 'frame'.
+    # Legacy form: base64 'frameBase64' plus an ISO wall-clock 'ts'.
+    def part(jpeg):
+        return {'frame': jpeg} if binary else {'frameBase64': base64.b64encode(jpeg).decode('ascii')}
+
+    payload = {'employeeId': employee_id, 'kind': kind, 'seq': seq, 'width': size[0], 'height': size[1]}
+    if binary:
+        payload['mono'] = int(mono_ts * 1000)
+    else:
+        payload['ts'] = datetime.utcnow().isoformat()
+    if kind == 'key':
+        payload.update(part(data))
+    else:
+        payload['tiles'] = [dict(part(jpeg), x=x, y=y, w=w, h=h) for x, y, w, h, jpeg in data]
+    return payload
+
+
+def socket_connect_args(base_url, email, token):
+    # socket.io URL and auth: the JWT goes in the auth payload, userId in the query for context
+    return f"{base_url}?{urlencode({'userId': email})}", {'token': token}
+
+
+def new_work_event(kind, **fields) -> dict:
+    # Work event as journaled and sent: the id makes replays idempotent, 'mono' orders events across
+    # wall-clock changes
+    return dict(fields, id=uuid.uuid4().hex, type=kind,
+                at=datetime.utcnow().isoformat() + 'Z', mono=round(time.monotonic(), 3))
+
+
+def presence_status(tracking, live, total_idle_seconds, queued, idle_seconds=None, last_upload_at=None) -> dict:
+    # Compact presence:status message sent over the socket every heartbeat
+    status = {
+        'tracking': tracking,
+        'live': live,
+        'totalIdleSeconds': total_idle_seconds or 0,
+        'queued': queued,
+    }
+    if idle_seconds is not None:
+        status['idleSeconds'] = idle_seconds
+    if last_upload_at:
+        status['lastUploadAt'] = last_upload_at
+    return status
+
+
+def screenshot_upload_form(employee_id, shots):
+    # shots: [(name, meta, content)] oldest first -> (path, form fields, files) for the single or batch
+    # upload route. Batch fields are matched to files by position. Window capture metadata (JSON) and the
+    # context thumbnail (base64) are only sent when some shot has them.
+    data = { 'employeeId': employee_id }
+    windowed = any(meta.get('window') for _, meta, _ in shots)
+    if len(shots) == 1:
+        _, meta, content = shots[0]
+        mime, ext = IMAGE_FORMATS.get(meta.get('format'), IMAGE_FORMATS['jpeg'])
+        data.update(capturedAt=meta.get('capturedAt'), hash=meta.get('hash') or '')
+        if windowed:
+            data.update(window=json.dumps(meta['window']), context=meta.get('context') or '')
+        return '/api/uploads/screenshot', data, [('screenshot', ('screenshot' + ext, content, mime))]
+    files = []
+    for name, meta, content in shots:
+        mime, ext = IMAGE_FORMATS.get(meta.get('format'), IMAGE_FORMATS['jpeg'])
+        files.append(('screenshots', (name + ext, content, mime)))
+    data.update(capturedAt=[meta.get('capturedAt') for _, meta, _ in shots],
+                hash=[meta.get('hash') or '' for _, meta, _ in shots])
+    if windowed:
+        data.update(window=[json.dumps(meta['window']) if meta.get('window') else '' for _, meta, _ in shots],
+                    context=[meta.get('context') or '' for _, meta, _ in shots])
+    return '/api/uploads/screenshots/batch', data, files
+
+
+def parse_jwt(token: str) -> dict:
+    # Claims of a JWT without verifying it (the backend does); {} if malformed
+    try:
+        parts = (token or '').split('.')
+        if len(parts) < 2:
+            return {}
+        b64 = parts[1].replace('-', '+').replace('_', '/')
+        # Add padding if necessary
+        pad = '=' * (-len(b64) % 4)
+        decoded = base64.b64decode(b64 + pad)
+        return json.loads(decoded.decode('utf-8'))
+    except Exception:
+        return {}
+
+
+def token_expires_in(token):
+    # Seconds until the JWT's exp claim (negative once expired), or None if it has none
+    exp = parse_jwt(token).get('exp')
+    if not isinstance(exp, (int, float)):
+        return None
+    return exp - time.time()
+
+
+def decorrelated_jitter(previous, base, cap):
+    # Next reconnect delay: random between base and three times the previous one, capped. Spreads a
+    # crowd of clients out quickly while still backing off on repeated failures.
+    return min(cap, random.uniform(base, max(base, previous) * 3))
+
+
+class BackendError(Exception):
+    pass
+
+
+class BackendResponse:
+    # Status and body of a finished request; the body is read before the connection goes back to the pool
+    def __init__(self, status_code, body: bytes):
+        self.status_code = status_code
+        self.body = body
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise BackendError(f'HTTP {self.status_code}')
+
+
+class BackendClient:
+    # One aiohttp keep-alive pool shared by every task on the core's event loop. Injects the bearer
+    # token and applies the per-endpoint timeout and retry policy. The session is created on first use,
+    # inside the loop.
+    def __init__(self, base_url, pool_size=HTTP_POOL_SIZE):
+        self.base_url = base_url
+        self.token = None
+        self.pool_size = pool_size
+        self.session = None
+
+    def _session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    async def request(self, method, path, endpoint='default', auth=True, base_url=None, **kwargs):
+        timeout, retries = ENDPOINT_POLICIES.get(endpoint, ENDPOINT_POLICIES['default'])
+        kwargs['timeout'] = aiohttp.ClientTimeout(total=kwargs.get('timeout') or timeout)
+        headers = dict(kwargs.pop('headers', None) or {})
+        token = self.token
+        if auth and token:
+            headers['Authorization'] = f'Bearer {token}'
+        files = kwargs.pop('files', None)
+        if files is not None:
+            kwargs['data'] = self._form(kwargs.pop('data', None) or {}, files)
+        url = f'{base_url or self.base_url}{path}'
+        with METRICS.timer(f'http_{endpoint}'):
+            try:
+                return await self._send(method, url, headers, retries, **kwargs)
+            except Exception as e:
+                METRICS.error(f'http_{endpoint}', e)
+                raise
+
+    async def _send(self, method, url, headers, retries, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                async with self._session().request(method, url, headers=headers, **kwargs) as resp:
+                    body = await resp.read()
+                if resp.status not in RETRY_STATUSES or attempt >= retries:
+                    return BackendResponse(resp.status, body)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= retries:
+                    raise
+            attempt += 1
+            await asyncio.sleep(min(2.0, 0.25 * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+    @staticmethod
+    def _form(data, files):
+        # requests-style fields and [(field, (filename, bytes, mime))] as multipart; list values repeat
+        form = aiohttp.FormData()
+        for key, value in data.items():
+            for item in (value if isinstance(value, list) else [value]):
+                form.add_field(key, '' if item is None else str(item))
+        for field, (filename, content, mime) in files:
+            form.add_field(field, content, filename=filename, content_type=mime)
+        return form
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request('PUT', path, **kwargs)
+
+    async def close(self):
+        if self.session is not None:
+            try:
+                await self.session.close()
+            except Exception:
+                pass
+
+
+class UploadSpool:
+    # Crash-safe on-disk queue of captured screenshots awaiting upload. Each entry is <name>.img (bytes in
+    # the format named by the metadata) plus <name>.json metadata, written to temp files and renamed into
+    # place (image last) so a crash never exposes a partial entry. Names sort oldest-first; past the
+    # byte/age caps the oldest are evicted.
+    # The metadata records the sha256 of the bytes, which the chunked upload route verifies end to end.
+    # Window captures add <name>.ctx, the desktop thumbnail, written before the metadata.
+    def __init__(self, directory=SPOOL_DIR, max_bytes=SPOOL_MAX_BYTES, max_age=SPOOL_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = {}  # name -> (size, meta)
+        self._held = set()  # names being uploaded; never evicted from under the reader
+        self._bytes = 0
+        self._seq = 0
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def _path(self, name, ext):
+        return os.path.join(self.directory, name + ext)
+
+    def _recover(self):
+        names = set()
+        for fname in os.listdir(self.directory):
+            base, ext = os.path.splitext(fname)
+            if ext == '.tmp':
+                self._unlink(os.path.join(self.directory, fname))
+            elif ext == '.jpg':
+                # spooled by an older client, always JPEG
+                os.replace(os.path.join(self.directory, fname), self._path(base, '.img'))
+                names.add(base)
+            elif ext == '.img':
+                names.add(base)
+        for fname in os.listdir(self.directory):
+            base, ext = os.path.splitext(fname)
+            if ext in ('.json', '.ctx') and base not in names:
+                self._unlink(os.path.join(self.directory, fname))
+        for name in sorted(names):
+            try:
+                with open(self._path(name, '.json'), 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                size = os.path.getsize(self._path(name, '.img'))
+            except Exception:
+                self._discard(name)
+                continue
+            self._entries[name] = (size, meta)
+            self._bytes += size
+        self._evict()
+
+    def _unlink(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print('[spool] remove error:', e)
+
+    def _discard(self, name):
+        self._unlink(self._path(name, '.img'))
+        self._unlink(self._path(name, '.json'))
+        self._unlink(self._path(name, '.ctx'))
+
+    def _write(self, path, data: bytes):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def append(self, data: bytes, meta: dict, context: bytes = None) -> str:
+        with self._lock:
+            self._seq += 1
+            name = f'{int(time.time() * 1000):013d}-{self._seq:06d}'
+            meta = dict(meta, spooledAt=time.time())
+            if data:
+                meta['sha256'] = hashlib.sha256(data).hexdigest()
+            if context:
+                self._write(self._path(name, '.ctx'), context)
+            self._write(self._path(name, '.json'), json.dumps(meta).encode('utf-8'))
+            self._write(self._path(name, '.img'), data)
+            self._entries[name] = (len(data), meta)
+            self._bytes += len(data)
+            self._evict()
+            return name
+
+    def _evict(self):
+        cutoff = time.time() - self.max_age
+        for name in sorted(self._entries):
+            size, meta = self._entries[name]
+            if self._bytes <= self.max_bytes and (meta.get('spooledAt') or 0) >= cutoff:
+                break
+            if name in self._held:
+                continue
+            print('[spool] evicting', name)
+            self._discard(name)
+            del self._entries[name]
+            self._bytes -= size
+
+    def pending(self, employee_id, limit=SPOOL_BATCH_SIZE, skip=()):
+        # Oldest-first entries captured for this employee, minus those in skip (already being uploaded);
+        # other accounts' captures wait for their login
+        with self._lock:
+            names = [n for n in sorted(self._entries)
+                     if n not in skip and self._entries[n][1].get('employeeId') == employee_id]
+            return [(n, self._entries[n][1]) for n in names[:limit]]
+
+    def hold(self, names):
+        # Keep entries out of eviction while an upload reads them; remove() or release() ends the hold
+        with self._lock:
+            self._held.update(names)
+
+    def release(self, names):
+        with self._lock:
+            self._held.difference_update(names)
+
+    def read(self, name) -> bytes:
+        with open(self._path(name, '.img'), 'rb') as f:
+            return f.read()
+
+    def read_context(self, name):
+        try:
+            with open(self._path(name, '.ctx'), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def read_part(self, name, offset, length) -> bytes:
+        with open(self._path(name, '.img'), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def checksum(self, name) -> str:
+        # sha256 of an entry spooled before checksums were recorded
+        digest = hashlib.sha256()
+        with open(self._path(name, '.img'), 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def size(self, name) -> int:
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry[0] if entry else 0
+
+    def remove(self, name):
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            if entry is not None:
+                self._bytes -= entry[0]
+            self._held.discard(name)
+            self._discard(name)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class WorkJournal:
+    # Append-only JSONL log of one employee's work events with wall-clock and monotonic timestamps.
+    # A sidecar cursor holds the byte offset the backend has acknowledged; events past it survive
+    # restarts and are replayed in order. Event ids let the backend apply a replayed batch only once.
+    def __init__(self, employee_id, directory=JOURNAL_DIR):
+        os.makedirs(directory, exist_ok=True)
+        key = hashlib.sha1(employee_id.strip().lower().encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(directory, key + '.jsonl')
+        self._cursor_path = self.path + '.cursor'
+        self._lock = threading.Lock()
+        self._pending = []  # [(event, end offset in the journal)]
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self._cursor_path, 'r', encoding='utf-8') as f:
+                offset = int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            offset = 0
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b''
+        if offset > len(data):
+            offset = 0  # compacted after the cursor was reset; the backend drops the duplicates
+        pos = offset
+        for line in data[offset:].splitlines(keepends=True):
+            if not line.endswith(b'\n'):
+                # torn final write; cut it so the next append starts on a fresh line
+                os.truncate(self.path, pos)
+                break
+            pos += len(line)
+            try:
+                self._pending.append((json.loads(line), pos))
+            except ValueError:
+                print('[journal] skipping corrupt line at', pos)
+
+    def _write_cursor(self, offset):
+        tmp = self._cursor_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(str(offset))
+        os.replace(tmp, self._cursor_path)
+
+    def record(self, kind, **fields) -> dict:
+        event = new_work_event(kind, **fields)
+        line = (json.dumps(event) + '\n').encode('utf-8')
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+                end = f.tell()
+            self._pending.append((event, end))
+        return event
+
+    def pending(self, limit=WORK_BATCH_SIZE):
+        with self._lock:
+            return [event for event, _ in self._pending[:limit]]
+
+    def ack(self, count):
+        # The first count pending events were accepted; move the cursor past them
+        with self._lock:
+            if count <= 0:
+                return
+            _, end = self._pending[count - 1]
+            del self._pending[:count]
+            if not self._pending and end >= JOURNAL_COMPACT_BYTES:
+                self._write_cursor(0)
+                open(self.path, 'wb').close()
+            else:
+                self._write_cursor(end)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+
+class LoginError(Exception):
+    pass
+
+
+async def wait_event(event, timeout=None) -> bool:
+    # Event.wait() with a timeout that returns instead of raising: True if the event was set
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+class TrackerCore:
+    # UI-free tracking engine: login, capture, spooled uploads, heartbeat, socket and live view.
+    # Networking and timers run as cancellable tasks on one asyncio loop in a background thread;
+    # screen grabs, encoding and disk writes go to a small executor so they never stall it. The public
+    # methods (login, start/stop_tracking, logout, shutdown) may be called from any other thread and
+    # block until the loop has done the work. State changes are published as (kind, data) tuples on
+    # self.events for whichever front end is attached (the Tk window or the headless daemon).
+    def __init__(self, events=None):
+        self.events = events if events is not None else queue.Queue(maxsize=1000)
+        # All REST calls share this pooled client; backend_url and token below delegate to it
+        self.http = BackendClient(BACKEND_URL)
+        self.token = None
+        self.email = ''
+        self.role = None
+        self.tracking = False
+        self.live_view_active = False
+        self.sio = None
+        self.scheduler = None
+        self.capture_interval_seconds = SCREENSHOT_INTERVAL_SECONDS
+        self.upload_format = self._pick_upload_format(None)
+        self._last_upload_hash = None  # dHash of the last screenshot spooled as an image
+        self._chunked_upload = CHUNKED_UPLOAD  # cleared if the backend has no chunked upload route
+        self.session_start_ts = None
+        self.total_idle_seconds = 0
+        # Samples input activity while tracking; heartbeats carry its idle time and per-minute bitmaps
+        self.activity = ActivitySampler(IDLE_THRESHOLD_SECONDS, ACTIVITY_SAMPLE_SECONDS)
+        # Shared by the tracking and live-view loops so the screen is grabbed once per tick
+        self.capture = CaptureEngine()
+        self.live_differ = LiveFrameDiffer()
+        self.live_rate = LiveRateController()
+        # Captures are spooled to disk and drained by the upload task
+        try:
+            self.spool = UploadSpool()
+        except Exception as e:
+            print('[spool] falling back to temp dir:', e)
+            self.spool = UploadSpool(os.path.join(tempfile.gettempdir(), 'time_tracker_spool'))
+        # Work events go through a per-employee on-disk journal, opened at login
+        self.journal = None
+        self.last_upload_at = None  # wall-clock ISO time of the last acknowledged upload
+        # Stage timings/sizes/errors: local /metrics endpoint (METRICS_PORT) and a rotating JSON log
+        self.metrics_server = self._start_metrics()
+
+        # The event loop and its helpers. asyncio.to_thread() runs on self._executor.
+        self._executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix='tracker-worker')
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(self._executor)
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name='tracker-loop', daemon=True)
+        self._loop_thread.start()
+        self._tasks = {}  # name -> long-running task: tracking, heartbeat, live, upload, journal, socket, token, ...
+        self._call(self._init_loop_state())
+        # Backend discovery waits for start_discovery(), so building the core touches neither the
+        # network nor aiohttp
+        self.backend_url = BACKEND_URL or 'http://localhost:4000'
+        self._discovery_started = False
+
+    @property
+    def backend_url(self):
+        return self.http.base_url
+
+    @backend_url.setter
+    def backend_url(self, url):
+        self.http.base_url = url
+
+    @property
+    def token(self):
+        return self.http.token
+
+    @token.setter
+    def token(self, value):
+        self.http.token = value
+
+    def _emit(self, kind, **data):
+        try:
+            self.events.put_nowait((kind, data))
+        except queue.Full:
+            pass
+
+    # ----- event loop plumbing -----
+
+    async def _init_loop_state(self):
+        # Events and locks are made on the loop that awaits them; before Python 3.10 they bind to the
+        # loop current at construction, which on the Tk thread is not this one.
+        self._upload_wake = asyncio.Event()
+        self._journal_wake = asyncio.Event()
+        self._socket_down = asyncio.Event()  # set by the socket's disconnect handler
+        self._journal_lock = asyncio.Lock()
+        self._live_lock = asyncio.Lock()  # one live frame at a time, so seq order is emit order
+        self._discovered = asyncio.Event()
+
+    def _call(self, coro, timeout=None):
+        # Run a coroutine on the loop from another thread and wait for its result
+        if threading.current_thread() is self._loop_thread:
+            coro.close()
+            raise RuntimeError('blocking TrackerCore call made from its own event loop')
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def _call_soon(self, fn, *args):
+        self._loop.call_soon_threadsafe(fn, *args)
+
+    def _spawn(self, name, factory):
+        # Start a named long-running task unless one is still running (loop thread only)
+        task = self._tasks.get(name)
+        if task is not None and not task.done():
+            return task
+        task = self._tasks[name] = self._loop.create_task(factory())
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            print('[core] task failed:', repr(task.exception()))
+
+    async def _cancel(self, *names):
+        # Cancel named tasks and wait until they have unwound
+        current = asyncio.current_task()
+        tasks = [self._tasks.pop(name, None) for name in names]
+        tasks = [t for t in tasks if t is not None and t is not current and not t.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ----- public API (any thread but the loop's) -----
+
+    def start_discovery(self):
+        self._call_soon(self._start_discovery)
+
+    def login(self, email, password) -> str:
+        return self._call(self._login(email, password))
+
+    def start_tracking(self):
+        self._call(self._start_tracking())
+
+    def stop_tracking(self):
+        self._call(self._stop_tracking())
+
+    def disable_live_view(self):
+        self._call(self._disable_live_view())
+
+    def logout(self):
+        self._call(self._logout())
+
+    def shutdown(self):
+        # Bounded: a hung request can hold exit up for at most SHUTDOWN_TIMEOUT_SECONDS
+        try:
+            self._call(self._shutdown(), SHUTDOWN_TIMEOUT_SECONDS)
+        except Exception as e:
+            print('[core] shutdown incomplete:', repr(e))
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join(1)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.activity.stop()
+        self.capture.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        METRICS.log('snapshot', **METRICS.snapshot())
+        METRICS.disable_log()
+
+    # ----- session -----
+
+    async def _login(self, email, password) -> str:
+        email = (email or '').strip()
+        password = (password or '').strip()
+        if not email or not password:
+            raise LoginError('Email and password are required.')
+        # Ensure backend is reachable before attempting login
+        if not await self._ensure_server():
+            raise LoginError(f'Server not reachable at {self.backend_url}. Ensure backend is running on port 4000.')
+        try:
+            resp = await self.http.post('/api/auth/login', endpoint='login', auth=False, json={'email': email, 'password': password})
+            resp.raise_for_status()
+            data = resp.json()
+            self.token = data.get('token') if isinstance(data, dict) else None
+            if not self.token:
+                raise ValueError('No token received')
+        except BackendError as e:
+            raise LoginError(f'HTTP error: {e}')
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise LoginError(f'Connection error: {e!r}')
+        except ValueError as e:
+            # no token or a body that is not JSON (json.JSONDecodeError is a ValueError)
+            raise LoginError(f'Unexpected login response: {e}')
+
+        self.email = email
+        self._emit('status', text=f'Logged in as {email}')
+        # Determine role; desktop tracking is only for employees
+        role = parse_jwt(self.token).get('role') or 'employee'
+        self.role = role
+        if role != 'employee':
+            return role
+
+        # Drain screenshots spooled by earlier sessions and capture uploads from now on
+        self._start_upload_loop()
+        # Replay work events journaled while offline and record new ones
+        await self._open_journal(email)
+        # Connect Socket.IO for live view signaling (UI hidden for employees). The socket task keeps it
+        # up for the rest of the session and the token task keeps the token fresh.
+        await self._connect_socket()
+        self._spawn('socket', self._socket_loop)
+        self._spawn('token', self._token_loop)
+        # Fetch capture interval and auto-start tracking
+        await self._fetch_capture_interval()
+        try:
+            if not self.tracking:
+                await self._start_tracking()
+        except Exception as e:
+            print('[tracking] auto-start error:', e)
+        # Immediately start live view streaming on successful login
+        try:
+            self.live_differ.reset()
+            self.live_view_active = True
+            self._emit('live', active=True)
+            self._start_live_loop()
+        except Exception as e:
+            print('[live] auto-start error:', e)
+        return role
+
+    async def _logout(self):
+        if self.tracking:
+            try:
+                await self._stop_tracking()
+            except Exception:
+                pass
+        await self._disable_live_view()
+        await self._cancel('upload', 'journal', 'socket', 'token', 'resume')
+        try:
+            if self.sio:
+                await self.sio.disconnect()
+        except Exception:
+            pass
+        self.capture.stop()
+        self.token = None
+        self.role = None
+        self._emit('status', text='Not logged in')
+
+    async def _shutdown(self):
+        if self.tracking:
+            try:
+                await self._stop_tracking()
+            except Exception:
+                pass
+        elif self.token:
+            try:
+                await self._record_work('stop')
+                await asyncio.wait_for(self._flush_journal(), STOP_FLUSH_TIMEOUT_SECONDS)
+            except Exception:
+                pass  # still journaled; replayed at the next login
+        await self._disable_live_view()
+        await self._cancel(*list(self._tasks))
+        try:
+            if self.sio:
+                await self.sio.disconnect()
+        except Exception:
+            pass
+        await self.http.close()
+
+    async def _connect_socket(self) -> bool:
+        # One connection attempt with the current token; reconnects are left to _socket_loop
+        self._socket_down.clear()
+        try:
+            self.sio = socketio.AsyncClient(reconnection=False)
+            # Register event handlers
+            self.sio.on('live_view:initiate', self._on_live_view_start)
+            self.sio.on('live_view:terminate', self._on_live_view_stop)
+            self.sio.on('live_view:frame', lambda data: None)  # managers receive frames; employee ignores
+            # Interval assignment push from backend
+            self.sio.on('interval:assigned', self._on_interval_assigned)
+            # Backend reachable again: replay spooled screenshots and journaled work events right away
+            self.sio.on('connect', self._on_socket_connect)
+            self.sio.on('disconnect', self._on_socket_disconnect)
+            # Connect with JWT via auth and include userId in query for context
+            url, auth = socket_connect_args(self.backend_url, self.email, self.token)
+            await self.sio.connect(
+                url,
+                auth=auth,
+                socketio_path='socket.io',
+                wait=True,
+                wait_timeout=SOCKET_CONNECT_TIMEOUT_SECONDS,
+            )
+            return True
+        except Exception as e:
+            print('[socket] connection error:', repr(e))
+            METRICS.error('socket_connect', e)
+            return False
+
+    async def _socket_loop(self):
+        # Keeps the socket up for the whole session: reconnects never give up, each after a
+        # decorrelated-jitter delay, so a backend restart sees its clients return spread out. The token is
+        # refreshed first if it is about to expire; session state is re-announced by _on_socket_connect.
+        delay = SOCKET_RECONNECT_BASE_SECONDS
+        while True:
+            if self._socket_connected():
+                delay = SOCKET_RECONNECT_BASE_SECONDS
+                await self._socket_down.wait()
+            delay = decorrelated_jitter(delay, SOCKET_RECONNECT_BASE_SECONDS, SOCKET_RECONNECT_MAX_SECONDS)
+            print(f'[socket] reconnecting in {delay:.1f}s')
+            await asyncio.sleep(delay)
+            remaining = token_expires_in(self.token)
+            if remaining is not None and remaining <= TOKEN_REFRESH_MARGIN_SECONDS:
+                if not await self._refresh_token() and remaining <= 0:
+                    await self._expire_session()
+                    return
+            await self._connect_socket()
+
+    def _socket_connected(self) -> bool:
+        sio = self.sio
+        return bool(sio is not None and sio.connected)
+
+    async def _on_socket_connect(self):
+        self._upload_wake.set()
+        self._journal_wake.set()
+        await self._send_status()
+        # Not awaited here: the ack cannot arrive while this handler holds up the socket's receive loop
+        self._spawn('resume', self._resume_session)
+
+    def _on_socket_disconnect(self, reason=None):
+        print('[socket] disconnected:', reason)
+        self._socket_down.set()
+
+    async def _resume_session(self):
+        # Re-announce tracking, live view and interval on every (re)connect instead of logging in again.
+        # The backend answers with how many managers are watching and the assigned interval.
+        try:
+            reply = await self.sio.call('session:resume', {
+                'tracking': self.tracking,
+                'liveView': self.live_view_active,
+                'intervalSeconds': self.capture_interval_seconds,
+            }, timeout=SOCKET_ACK_TIMEOUT_SECONDS)
+        except Exception as e:
+            print('[socket] resume error:', repr(e))  # older backends have no session:resume
+            return
+        if not isinstance(reply, dict) or not reply.get('ok'):
+            return
+        if reply.get('viewers'):
+            # Someone is watching (or asked while we were offline): their stream restarts from a keyframe
+            self._on_live_view_start()
+        secs = reply.get('intervalSeconds')
+        if isinstance(secs, int) and secs > 0 and secs != self.capture_interval_seconds:
+            self._set_capture_interval(secs)
+            self._emit('interval', seconds=secs, enabled=True)
+
+    async def _token_loop(self):
+        # Exchange the token for a fresh one TOKEN_REFRESH_MARGIN_SECONDS before it expires, so HTTP calls
+        # and socket reconnects keep working all shift without the password
+        delay = SOCKET_RECONNECT_BASE_SECONDS
+        while True:
+            remaining = token_expires_in(self.token)
+            if remaining is None:
+                return
+            if remaining > TOKEN_REFRESH_MARGIN_SECONDS:
+                delay = SOCKET_RECONNECT_BASE_SECONDS
+                await asyncio.sleep(min(remaining - TOKEN_REFRESH_MARGIN_SECONDS, TOKEN_CHECK_MAX_SECONDS))
+                continue
+            if await self._refresh_token():
+                # a token without exp needs no refresh (the next round returns)
+                remaining = token_expires_in(self.token)
+                if remaining is None or remaining > TOKEN_REFRESH_MARGIN_SECONDS:
+                    continue
+            elif remaining <= 0:
+                await self._expire_session()
+                return
+            delay = decorrelated_jitter(delay, SOCKET_RECONNECT_BASE_SECONDS, SOCKET_RECONNECT_MAX_SECONDS)
+            await asyncio.sleep(delay)
+
+    async def _expire_session(self):
+        # The token expired and could not be refreshed: log out (which stops the socket and token tasks)
+        # and send the user back to login instead of reconnecting with a dead token
+        print('[auth] session expired')
+        await self._logout()
+        self._emit('session_expired', text='Session expired, please log in again')
+
+    async def _refresh_token(self) -> bool:
+        try:
+            resp = await self.http.post('/api/auth/refresh', endpoint='token_refresh')
+            resp.raise_for_status()
+            token = (resp.json() or {}).get('token')
+        except Exception as e:
+            print('[auth] token refresh error:', repr(e))
+            METRICS.error('token_refresh', e)
+            return False
+        if not token:
+            return False
+        self.token = token
+        return True
+
+    async def _send_status(self, idle_seconds=None):
+        # Compact presence update over the socket. Nothing is sent while it is down: the journal still
+        # carries work events over HTTP, and presence resumes on reconnect.
+        if not self._socket_connected():
+            return
+        status = presence_status(self.tracking, self.live_view_active, self.total_idle_seconds, len(self.spool),
+                                 idle_seconds, self.last_upload_at)
+        try:
+            await self.sio.emit('presence:status', status)
+        except Exception as e:
+            print('[socket] status error:', e)
+
+    async def _fetch_capture_interval(self):
+        try:
+            resp = await self.http.get('/api/capture-interval', endpoint='capture_interval')
+            data = resp.json() or {}
+            secs = int(data.get('intervalSeconds') or 0)
+            if data.get('assigned') and secs > 0:
+                self._set_capture_interval(secs)
+            self.upload_format = self._pick_upload_format(data.get('screenshotFormat'))
+            # Always enable tracking; fall back to default interval if not assigned
+            self._emit('interval', seconds=self.capture_interval_seconds, enabled=True)
+        except Exception as e:
+            print('[interval] fetch error:', e)
+            self._emit('interval', seconds=self.capture_interval_seconds, enabled=False)
+
+    async def _on_interval_assigned(self, data=None):
+        try:
+            secs = int((data or {}).get('intervalSeconds') or 0)
+        except Exception:
+            secs = 0
+        if secs > 0:
+            self._set_capture_interval(secs)
+            self._emit('interval', seconds=secs, enabled=True)
+            # Auto-start tracking if not already running
+            if not self.tracking:
+                try:
+                    await self._start_tracking()
+                except Exception:
+                    pass
+
+    def _pick_upload_format(self, preferred):
+        # Local override wins; otherwise the backend's preference if this Pillow build can encode it
+        fmt = CAPTURE_FORMAT if CAPTURE_FORMAT != 'auto' else (preferred or 'jpeg')
+        if fmt not in IMAGE_FORMATS or (fmt != 'jpeg' and fmt not in supported_formats()):
+            fmt = 'jpeg'
+        return fmt
+
+    def _set_capture_interval(self, secs):
+        # Applies to a running schedule immediately instead of after the current wait
+        self.capture_interval_seconds = secs
+        scheduler = self.scheduler
+        if scheduler is not None and self.tracking:
+            scheduler.set_interval(secs)
+            self._emit('schedule', next_in=scheduler.next_in())
+
+    def _on_live_view_start(self, data=None):
+        # A viewer joined: it needs a keyframe before any tiles
+        self.live_differ.reset()
+        self.live_view_active = True
+        self._emit('live', active=True)
+        self._start_live_loop()
+
+    async def _on_live_view_stop(self, data=None):
+        self.live_view_active = False
+        self._emit('live', active=False)
+        await self._cancel('live')
+
+    # ----- tracking -----
+
+    async def _start_tracking(self):
+        if self.tracking:
+            return
+        self.tracking = True
+        self.session_start_ts = time.time()
+        self.total_idle_seconds = 0
+        self._last_upload_hash = None  # a session starts with a real screenshot
+        self._emit('tracking', active=True)
+        scheduler = self.scheduler = CaptureScheduler(self.capture_interval_seconds, slot_key=self.email)
+        self._emit('schedule', next_in=scheduler.next_in())
+        self._spawn('tracking', lambda: self._tracking_loop(scheduler))
+        # start heartbeat loop
+        self.activity.start()
+        self._spawn('heartbeat', self._heartbeat_loop)
+        # notify backend start
+        await self._record_work('start')
+        await self._send_status()
+
+    async def _stop_tracking(self):
+        if not self.tracking:
+            return
+        self.tracking = False
+        self.activity.stop()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        await self._cancel('tracking', 'heartbeat')
+        self._emit('tracking', active=False)
+        # If live view is active, notify backend and turn off
+        await self._disable_live_view()
+        # notify backend stop; flushed now (bounded) so it lands before logout/exit drops the token
+        await self._record_work('stop')
+        await self._send_status()
+        try:
+            await asyncio.wait_for(self._flush_journal(), STOP_FLUSH_TIMEOUT_SECONDS)
+        except Exception as e:
+            print('[work] stop flush deferred:', repr(e))
+
+    async def _tracking_loop(self, scheduler):
+        while await scheduler.wait():
+            try:
+                frame = await asyncio.to_thread(self.capture.latest)
+                await self._upload_capture(frame)
+                # Optional: also send one frame on full capture; the live loop handles frequent streaming
+                if self.live_view_active and self.live_rate.ready():
+                    await self._send_live_frame(frame)
+            except Exception as e:
+                print('[tracking] capture error:', e)
+                METRICS.error('capture', e)
+            # restart countdown
+            self._emit('schedule', next_in=scheduler.next_in())
+
+    async def _heartbeat_loop(self):
+        # Periodically send idle delta/duration and activity bitmaps to backend while tracking
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL_SECONDS)
+            try:
+                since_last_input = self.activity.idle_seconds()
+                current_idle_duration = int(max(0, since_last_input - IDLE_THRESHOLD_SECONDS))
+                delta, bitmaps = self.activity.take()
+                self.total_idle_seconds = max(0, (self.total_idle_seconds or 0) + delta)
+                self._emit('idle', total_seconds=self.total_idle_seconds)
+                await self._record_work('heartbeat', idleDeltaSeconds=delta, idleDurationSeconds=current_idle_duration,
+                                        activity=bitmaps)
+                await self._send_status(idle_seconds=int(since_last_input))
+            except Exception as e:
+                print('[work] heartbeat error:', e)
+                METRICS.error('heartbeat', e)
+
+    async def _capture_screenshot(self, renditions=('full', 'live'), max_age=0.0):
+        # Only the requested renditions are encoded; a frame grabbed within max_age seconds is reused
+        def grab():
+            frame = self.capture.latest(max_age=max_age)
+            return tuple(frame.jpeg(name) for name in renditions)
+        return await asyncio.to_thread(grab)
+
+    # ----- uploads -----
+
+    async def _upload_capture(self, frame: CapturedFrame):
+        # Near-identical to the last uploaded screenshot (idle, locked, in a meeting): spool only a reference
+        digest = await asyncio.to_thread(frame.dhash) if SCREENSHOT_DEDUP else None
+        last = self._last_upload_hash
+        if digest and last and hash_distance(digest, last) <= DEDUP_MAX_DISTANCE:
+            await self._upload_reference(last, frame.window)
+            return
+        fmt = self.upload_format
+        await self._upload_screenshot(await asyncio.to_thread(frame.encode, 'full', fmt), fmt, digest,
+                                      frame.window, frame.context)
+        self._last_upload_hash = digest
+
+    async def _upload_reference(self, digest: str, window=None):
+        meta = {'kind': 'ref', 'hash': digest}
+        if window:
+            meta['window'] = window
+        await self._spool_upload(b'', meta)
+
+    async def _upload_screenshot(self, image_bytes: bytes, fmt='jpeg', digest=None, window=None, context=None):
+        meta = {'format': fmt}
+        if digest:
+            meta['hash'] = digest
+        if window:
+            meta['window'] = window
+        await self._spool_upload(image_bytes, meta, context)
+
+    async def _spool_upload(self, data: bytes, meta: dict, context: bytes = None):
+        # Spool the capture and let the upload task send it, so capture cadence never waits on the network
+        try:
+            meta = dict(meta, employeeId=self.email, capturedAt=datetime.utcnow().isoformat() + 'Z')
+            await asyncio.to_thread(self.spool.append, data, meta, context)
+            self._upload_wake.set()
+        except Exception as e:
+            print('[spool] append error:', e)
+            METRICS.error('spool', e)
+            self._emit('upload', ok=False, text=f'Last upload failed: {e}')
+
+    def _start_upload_loop(self):
+        self._spawn('upload', self._upload_loop)
+        self._upload_wake.set()
+
+    async def _upload_loop(self):
+        # Drain the spool oldest-first with up to UPLOAD_CONCURRENCY batches in flight. "Same as"
+        # references only start once nothing else is in flight, so the screenshot they point at is
+        # stored first. After a failure the rest settle, then back off exponentially (with jitter)
+        # until the backend answers again or the socket reconnects, and replay the backlog in bulk.
+        inflight = {}  # task -> names of the spooled entries it carries
+        backoff = 0
+        try:
+            while True:
+                self._upload_wake.clear()
+                settled = [task for task in inflight if task.done()]
+                failed = False
+                for task in settled:
+                    del inflight[task]
+                    failed = failed or not self._upload_succeeded(task)
+                if failed:
+                    # a batch that raises (or is cancelled) counts as failed instead of ending the loop
+                    await asyncio.gather(*inflight, return_exceptions=True)
+                    inflight.clear()
+                    backoff = min(UPLOAD_RETRY_MAX_SECONDS, max(UPLOAD_RETRY_BASE_SECONDS, backoff * 2))
+                    await wait_event(self._upload_wake, backoff * random.uniform(0.5, 1.0))
+                    continue
+                if settled:
+                    backoff = 0
+                if self.token and len(inflight) < UPLOAD_CONCURRENCY:
+                    busy = {name for names in inflight.values() for name in names}
+                    batch = self.spool.pending(self.email, skip=busy)
+                    if batch:
+                        batch = self._next_request(batch)
+                        if not (inflight and batch[0][1].get('kind') == 'ref'):
+                            names = [name for name, _ in batch]
+                            self.spool.hold(names)
+                            task = asyncio.create_task(self._upload_spooled(batch))
+                            task.add_done_callback(lambda _, names=names: self.spool.release(names))
+                            task.add_done_callback(lambda _: self._upload_wake.set())
+                            inflight[task] = names
+                            continue
+                await self._upload_wake.wait()
+        finally:
+            for task in inflight:
+                task.cancel()
+
+    def _upload_succeeded(self, task) -> bool:
+        if task.cancelled():
+            return False
+        if task.exception() is not None:
+            print('[upload] batch error:', repr(task.exception()))
+            METRICS.error('upload', task.exception())
+            return False
+        return bool(task.result())
+
+    def _next_request(self, batch):
+        # Screenshots and "same as" references go to different routes, and large screenshots go through
+        # the chunked route one at a time; send the leading run that fits one request now and leave the
+        # rest, in order, for the next round
+        refs = batch[0][1].get('kind') == 'ref'
+        if not refs and self._chunked(batch[0][0]):
+            return batch[:1]
+        for i, (name, meta) in enumerate(batch):
+            if (meta.get('kind') == 'ref') != refs or (not refs and self._chunked(name)):
+                return batch[:i]
+        return batch
+
+    def _chunked(self, name) -> bool:
+        return self._chunked_upload and self.spool.size(name) >= CHUNKED_UPLOAD_MIN_BYTES
+
+    async def _upload_spooled(self, batch) -> bool:
+        refs = batch[0][1].get('kind') == 'ref'
+        try:
+            if refs:
+                resp = await self._post_references(batch)
+            elif len(batch) == 1 and self._chunked(batch[0][0]):
+                resp = await self._post_chunked(*batch[0])
+            else:
+                resp = await self._post_screenshots(batch)
+            if 400 <= resp.status_code < 500 and resp.status_code not in (401, 403, 408, 429):
+                # The backend will never accept these; drop them rather than block the queue
+                print('[upload] rejected, dropping', len(batch), 'spooled:', resp.status_code)
+                if refs:
+                    # the referenced screenshot is gone (dropped or cleaned up); upload the next one in full
+                    self._last_upload_hash = None
+                await asyncio.to_thread(self._remove_spooled, batch)
+                return True
+            resp.raise_for_status()
+            if refs and (resp.json() or {}).get('missing'):
+                self._last_upload_hash = None
+        except Exception as e:
+            print('[upload] error:', repr(e))
+            METRICS.error('upload', e)
+            self._emit('upload', ok=False, text=f'Last upload failed ({len(self.spool)} queued): {e}')
+            return False
+        await asyncio.to_thread(self._remove_spooled, batch)
+        self.last_upload_at = datetime.utcnow().isoformat() + 'Z'
+        self._emit('upload', ok=True, text=f"Last upload: {time.strftime('%H:%M:%S')} ✅")
+        return True
+
+    def _remove_spooled(self, batch):
+        for name, _ in batch:
+            self.spool.remove(name)
+
+    def _with_context(self, name, meta):
+        # Metadata with the spooled desktop thumbnail (window captures) folded in as base64
+        context = self.spool.read_context(name)
+        if context:
+            meta = dict(meta, context=base64.b64encode(context).decode('ascii'))
+        return meta
+
+    async def _post_screenshots(self, batch):
+        shots = await asyncio.to_thread(lambda: [(name, self._with_context(name, meta), self.spool.read(name))
+                                                 for name, meta in batch])
+        path, data, files = screenshot_upload_form(self.email, shots)
+        METRICS.size('upload', sum(len(content) for _, (_, content, _) in files))
+        return await self.http.post(path, endpoint='upload', data=data, files=files)
+
+    async def _post_chunked(self, name, meta, attempts=2):
+        # Resumable upload of one large screenshot, streamed from the spool file in raw parts: open or
+        # resume the session, send from the offset the backend acknowledged, then complete. The backend
+        # checks the sha256 before storing the file. Parts are capped at the partSize the backend
+        # accepts. An expired session, a rejected part (400/413) or a checksum mismatch starts over once;
+        # a second rejection is returned (and the entry dropped) since it would only repeat. A part that
+        # makes no progress for any other reason raises, so the entry stays spooled for the next round.
+        size = self.spool.size(name)
+        digest = meta.get('sha256') or await asyncio.to_thread(self.spool.checksum, name)
+        meta = await asyncio.to_thread(self._with_context, name, meta)
+        upload_id = hashlib.sha256(f'{self.email}/{name}/{digest}'.encode('utf-8')).hexdigest()[:32]
+        resp = await self.http.post('/api/uploads/chunked', endpoint='upload_chunk', json={
+            'uploadId': upload_id, 'employeeId': self.email, 'size': size, 'sha256': digest,
+            'format': meta.get('format'), 'capturedAt': meta.get('capturedAt'), 'hash': meta.get('hash') or '',
+            'window': meta.get('window'), 'context': meta.get('context') })
+        if resp.status_code == 404:
+            print('[upload] backend has no chunked upload route; using multipart')
+            self._chunked_upload = False
+            return await self._post_screenshots([(name, meta)])
+        if not resp.ok:
+            return resp
+        METRICS.size('upload', size)
+        session = resp.json()
+        offset = session['offset']
+        part_size = min(UPLOAD_CHUNK_BYTES, session.get('partSize') or UPLOAD_CHUNK_BYTES)
+        while True:
+            while offset < size:
+                part = await asyncio.to_thread(self.spool.read_part, name, offset, part_size)
+                METRICS.size('upload_part', len(part))
+                resp = await self.http.put(f'/api/uploads/chunked/{upload_id}?offset={offset}', endpoint='upload_chunk',
+                                           data=part, headers={ 'Content-Type': 'application/octet-stream' })
+                if resp.status_code in (400, 404, 413):
+                    break  # the session expired on the backend, or it will never take this part
+                # 409: the backend holds another offset (a part whose response was lost); go on from there
+                acked = resp.json().get('offset') if resp.status_code in (200, 409) else None
+                if acked is None or acked == offset:
+                    raise BackendError(f'chunked upload stalled at {offset}/{size}: HTTP {resp.status_code}')
+                offset = acked
+            else:
+                resp = await self.http.post(f'/api/uploads/chunked/{upload_id}/complete', endpoint='upload_chunk')
+                if resp.status_code == 409:
+                    # parts the backend does not have after all; resume from the offset it holds
+                    held = resp.json().get('offset')
+                    if not isinstance(held, int) or held >= size:
+                        raise BackendError(f'chunked upload incomplete at {held}/{size}')
+                    offset = held
+                    continue
+            break
+        if resp.status_code in (400, 404, 413, 422) and attempts > 1:
+            print('[upload] chunked upload restarting after', resp.status_code, name)
+            return await self._post_chunked(name, meta, attempts - 1)
+        if resp.status_code == 404:
+            raise BackendError('chunked upload session lost')  # retried from scratch next round
+        return resp
+
+    async def _post_references(self, batch):
+        refs = [{ 'hash': meta.get('hash'), 'capturedAt': meta.get('capturedAt'), 'window': meta.get('window') }
+                for _, meta in batch]
+        return await self.http.post('/api/uploads/screenshot/ref', endpoint='upload', json={ 'employeeId': self.email, 'refs': refs })
+
+    def _start_metrics(self):
+        METRICS.gauge('spool_queued', lambda: len(self.spool))
+        METRICS.gauge('journal_pending', lambda: len(self.journal) if self.journal else 0)
+        METRICS.gauge('capture_interval_seconds', lambda: self.capture_interval_seconds)
+        METRICS.gauge('live_interval_seconds', lambda: self.live_rate.interval)
+        METRICS.gauge('live_quality', lambda: self.live_rate.quality)
+        METRICS.gauge('live_rtt_seconds', lambda: self.live_rate.rtt)
+        METRICS.gauge('live_dropped_frames', lambda: self.live_rate.dropped)
+        if METRICS_LOG:
+            try:
+                METRICS.enable_log(METRICS_LOG_DIR, METRICS_LOG_INTERVAL_SECONDS)
+            except Exception as e:
+                print('[metrics] log unavailable:', e)
+        if not METRICS_PORT:
+            return None
+        try:
+            return serve_metrics(METRICS, METRICS_PORT)
+        except OSError as e:
+            print('[metrics] endpoint unavailable:', e)
+            return None
+
+    # ----- work journal -----
+
+    async def _open_journal(self, email):
+        try:
+            self.journal = await asyncio.to_thread(WorkJournal, email)
+        except Exception as e:
+            print('[journal] falling back to temp dir:', e)
+            self.journal = await asyncio.to_thread(WorkJournal, email, os.path.join(tempfile.gettempdir(), 'time_tracker_journal'))
+        self._spawn('journal', self._journal_loop)
+        self._journal_wake.set()
+
+    async def _record_work(self, kind, **fields):
+        journal = self.journal
+        if journal is None:
+            return
+        try:
+            await asyncio.to_thread(journal.record, kind, **fields)
+        except Exception as e:
+            print('[journal] append error:', e)
+            return
+        # Start/stop go out at once; heartbeats wait for the next batch on either transport (live
+        # presence comes from the per-heartbeat presence:status message)
+        if kind != 'heartbeat':
+            self._journal_wake.set()
+
+    async def _journal_loop(self):
+        # Start/stop wake the loop at once; heartbeats ride along every WORK_FLUSH_INTERVAL_SECONDS.
+        # On failure back off (with jitter) like the uploader.
+        backoff = 0
+        while True:
+            self._journal_wake.clear()
+            if await self._flush_journal():
+                backoff = 0
+                await wait_event(self._journal_wake, WORK_FLUSH_INTERVAL_SECONDS)
+                continue
+            backoff = min(UPLOAD_RETRY_MAX_SECONDS, max(UPLOAD_RETRY_BASE_SECONDS, backoff * 2))
+            await wait_event(self._journal_wake, backoff * random.uniform(0.5, 1.0))
+
+    async def _flush_journal(self) -> bool:
+        # Send pending events oldest-first in batches; True once the journal is drained
+        journal = self.journal
+        if journal is None or not self.token:
+            return journal is None
+        async with self._journal_lock:
+            while True:
+                events = journal.pending()
+                if not events:
+                    return True
+                if await self._send_work_events_socket(events):
+                    await asyncio.to_thread(journal.ack, len(events))
+                    continue
+                try:
+                    resp = await self.http.post('/api/work/events', endpoint='work', json={ 'events': events })
+                    if 400 <= resp.status_code < 500 and resp.status_code not in (401, 403, 408, 429):
+                        print('[work] events rejected, dropping', len(events), ':', resp.status_code)
+                    else:
+                        resp.raise_for_status()
+                except Exception as e:
+                    print('[work] journal flush error:', repr(e))
+                    METRICS.error('work_events', e)
+                    return False
+                await asyncio.to_thread(journal.ack, len(events))
+
+    async def _send_work_events_socket(self, events) -> bool:
+        # Same batch and idempotency ids as the HTTP route; False means use HTTP instead
+        if not self._socket_connected():
+            return False
+        try:
+            with METRICS.timer('work_events_socket'):
+                reply = await self.sio.call('work:events', { 'events': events }, timeout=SOCKET_ACK_TIMEOUT_SECONDS)
+        except Exception as e:
+            print('[socket] work events error:', repr(e))
+            METRICS.error('work_events_socket', e)
+            return False
+        return bool(isinstance(reply, dict) and reply.get('ok'))
+
+    # ----- live view -----
+
+    async def _send_live_frame(self, frame: CapturedFrame):
+        if not self.sio or not self.live_view_active:
+            return
+        async with self._live_lock:
+            try:
+                rendition = self.live_rate.rendition()
+                prepared = await asyncio.to_thread(self._prepare_live_frame, frame, rendition)
+                if prepared is None:
+                    return  # screen unchanged since the last frame
+                seq, nbytes, payload = prepared
+                self.live_rate.sent(seq, nbytes)
+                METRICS.size('live_emit', nbytes)
+                with METRICS.timer('live_emit'):
+                    await self.sio.emit('live_view:frame', payload, callback=lambda *_: self.live_rate.acked(seq))
+                self._emit('live_frame', text=f"Last live frame: {time.strftime('%H:%M:%S')}")
+            except Exception as e:
+                print('[live] emit error:', e)
+                METRICS.error('live_emit', e)
+                # viewers may have missed tiles; resync with a keyframe
+                self.live_rate.cancel()
+                self.live_differ.reset()
+
+    def _prepare_live_frame(self, frame: CapturedFrame, rendition):
+        # Worker-thread half of a live frame: tile diff, JPEG encode and payload; None if nothing changed
+        with METRICS.timer('live_diff'):
+            update = self.live_differ.diff(frame, rendition)
+        if update is None:
+            return None
+        kind, seq, data = update
+        with METRICS.timer('live_payload' if LIVE_VIEW_BINARY else 'base64'):
+            payload = build_live_frame_payload(self.email, kind, seq, data, frame.image(rendition).size, frame.ts)
+        nbytes = len(data) if kind == 'key' else sum(len(t[4]) for t in data)
+        return seq, nbytes, payload
+
+    def _start_live_loop(self):
+        self._spawn('live', self._live_view_loop)
+
+    async def _live_view_loop(self):
+        # Stream small frames more frequently while live view is active
+        while True:
+            # Skip the grab entirely while the previous frame is unacked (stale frames are dropped)
+            if self.live_view_active and self.live_rate.ready():
+                try:
+                    frame = await asyncio.to_thread(self.capture.latest, LIVE_FRAME_MAX_AGE_SECONDS)
+                    await self._send_live_frame(frame)
+                except Exception as e:
+                    print('[live] capture error:', e)
+                    METRICS.error('live_capture', e)
+            # sleep regardless to avoid tight loop; the rate controller sets the pace
+            await asyncio.sleep(self.live_rate.interval)
+
+    async def _disable_live_view(self):
+        # Employee-side manual termination for transparency
+        if not self.live_view_active:
+            return
+        self.live_view_active = False
+        self._emit('live', active=False)
+        await self._cancel('live')
+        try:
+            if self._socket_connected():
+                await self.sio.emit('live_view:terminate', {'employeeId': self.email})
+        except Exception:
+            pass
+
+    # ----- backend discovery -----
+
+    def _load_cached_backend(self):
+        try:
+            with open(os.path.join(STATE_DIR, 'backend.json'), 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('url') and time.time() - float(cached.get('ts') or 0) < BACKEND_CACHE_TTL_SECONDS:
+                return cached['url']
+        except Exception:
+            pass
+        return None
+
+    def _store_cached_backend(self, url):
+        try:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            path = os.path.join(STATE_DIR, 'backend.json')
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'url': url, 'ts': time.time()}, f)
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            print('[discovery] cache write error:', e)
 
-try:
-    import mss
-    from PIL import Image
-except Exception:
-    raise RuntimeError('Install dependencies from requirements.txt (mss, Pillow).')
+    async def _probe_backends(self, candidates, timeout):
+        # Probe all candidates in parallel; the first healthy responder wins and the rest are cancelled
+        candidates = list(dict.fromkeys(u for u in candidates if u))
+        if not candidates:
+            return None
+        probes = {asyncio.ensure_future(self.http.get('/health', endpoint='health', auth=False, base_url=url, timeout=timeout)): url
+                  for url in candidates}
+        try:
+            pending = set(probes)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for probe in done:
+                    if probe.exception() is None and probe.result().ok:
+                        return probes[probe]
+            return None
+        finally:
+            for probe in probes:
+                probe.cancel()
 
+    def _use_backend(self, url):
+        self.backend_url = url
+        self._store_cached_backend(url)
+        self._emit('server', url=url)
 
-BACKEND_URL = os.environ.get('BACKEND_URL', 'http://mail.vughy.com:10002')
-SCREENSHOT_INTERVAL_SECONDS = int(os.environ.get('SCREENSHOT_INTERVAL_SECONDS', '180'))  # default 3 minutes
-LIVE_VIEW_INTERVAL_SECONDS = int(os.environ.get('LIVE_VIEW_INTERVAL_SECONDS', '5'))  # faster live frames
-HEARTBEAT_INTERVAL_SECONDS = int(os.environ.get('HEARTBEAT_INTERVAL_SECONDS', '60'))  # send idle heartbeat every 60s
+    def _start_discovery(self):
+        # Use the cached backend URL if still fresh; otherwise probe candidates in the background.
+        # login() waits for discovery before talking to the server.
+        if self._discovery_started:
+            return
+        self._discovery_started = True
+        cached = self._load_cached_backend()
+        if cached:
+            self.backend_url = cached
+            self._emit('server', url=cached)
+            self._discovered.set()
+        else:
+            self._spawn('discovery', self._resolve_backend_url)
+
+    async def _resolve_backend_url(self) -> str:
+        # Try env-provided URL, then the public host and common local ports (4000, 4011)
+        try:
+            url = await self._probe_backends([BACKEND_URL, 'http://mail.vughy.com:10002'] + LOCAL_BACKEND_URLS, ENDPOINT_POLICIES['health'][0])
+            if url:
+                self._use_backend(url)
+            else:
+                self._emit('server', url=None)
+            return self.backend_url
+        finally:
+            self._discovered.set()
+
+    async def _ensure_server(self) -> bool:
+        # Wait for any in-flight discovery (bounded by its probe timeout) before checking reachability
+        self._start_discovery()
+        await wait_event(self._discovered, ENDPOINT_POLICIES['health'][0] + 1)
+        try:
+            r = await self.http.get('/health', endpoint='health', auth=False, timeout=3)
+            if r.ok:
+                self._store_cached_backend(self.backend_url)
+                return True
+        except Exception:
+            pass
+        # Retry on all known URLs at once
+        url = await self._probe_backends([BACKEND_URL, 'http://mail.vughy.com:10002'] + LOCAL_BACKEND_URLS, 3)
+        if url:
+            self._use_backend(url)
+            return True
+        return False
 
 
 class TimeTrackerApp:
-    def __init__(self, root):
+    # Tk front end for TrackerCore; widgets are only touched on the Tk thread, fed by the core's event queue
+    def __init__(self, root, core=None):
         self.root = root
         root.title('Time Tracker Client')
         root.geometry('720x460')
@@ -68,27 +2396,30 @@ class TimeTrackerApp:
         self.style.configure('Header.TLabel', font=self.font_title, foreground=self.color_text)
         self.style.configure('Muted.TLabel', foreground=self.color_muted)
 
-        self.token = None
+        # The core (event loop, spool, samplers) is started once the window is up; until then the UI
+        # only needs the queue it will publish to
+        self.core = core
+        self.events = core.events if core else queue.Queue(maxsize=1000)
         self.email = tk.StringVar()
         self.password = tk.StringVar()
-        self.tracking = False
-        self.live_view_active = False
-        self.sio = None
-        self.tracker_thread = None
-        self.heartbeat_thread = None
-        self._stop_event = threading.Event()
-        self._live_stop_event = threading.Event()
-        self.live_thread = None
-        self.capture_interval_seconds = SCREENSHOT_INTERVAL_SECONDS
 
-        # Resolve backend URL proactively with health-check and fallbacks
-        self.backend_url = self._resolve_backend_url()
+        self._next_capture_at = None  # monotonic deadline of the next capture, for the countdown
+        self._rendered = {}  # last value pushed to each Tk variable; unchanged values are not re-set
 
         self._build_ui()
         try:
             self.root.protocol('WM_DELETE_WINDOW', self._on_close)
         except Exception:
             pass
+        # Map the window now rather than when mainloop first goes idle
+        self.root.update_idletasks()
+        mark_startup('window')
+        if self.core is None:
+            self.core = TrackerCore(self.events)
+        self.root.after(0, self.core.start_discovery)
+        mark_startup('ready')
+        report_startup('window')
+        self._ui_tick()
 
     def _build_ui(self):
         # Header bar
@@ -129,8 +2460,8 @@ class TimeTrackerApp:
         self.last_upload_var = tk.StringVar(value='')
         self.progress_var = tk.IntVar(value=0)
         self.progress = ttk.Progressbar(login_tab, orient=tk.HORIZONTAL, length=420, mode='determinate')
-        self.progress.configure(maximum=self.capture_interval_seconds, variable=self.progress_var)
-        self.countdown_var = tk.StringVar(value=f'Next capture in {self.capture_interval_seconds}s')
+        self.progress.configure(maximum=SCREENSHOT_INTERVAL_SECONDS, variable=self.progress_var)
+        self.countdown_var = tk.StringVar(value=f'Next capture in {SCREENSHOT_INTERVAL_SECONDS}s')
 
         # Header controls: Start/Stop Tracking
         header_controls = tk.Frame(header, bg=self.color_bg)
@@ -138,39 +2469,111 @@ class TimeTrackerApp:
         self.start_btn = ttk.Button(header_controls, text='Start Tracking', style='Success.TButton', state=tk.DISABLED, command=self.start_tracking)
         self.stop_btn = ttk.Button(header_controls, text='Stop', style='Danger.TButton', state=tk.DISABLED, command=self.stop_tracking)
 
+    def _ui_tick(self):
+        # The one UI timer: fold queued core events (last event of each kind wins) into the widgets,
+        # then refresh the clock-driven labels. Nothing else schedules root.after callbacks.
+        pending = {}
+        try:
+            while True:
+                kind, data = self.events.get_nowait()
+                pending.pop(kind, None)
+                pending[kind] = data
+        except queue.Empty:
+            pass
+        for kind, data in pending.items():
+            try:
+                self._on_core_event(kind, data)
+            except Exception as e:
+                print('[ui] event error:', kind, e)
+        try:
+            self._render_clock()
+        except Exception as e:
+            print('[ui] render error:', e)
+        try:
+            self.root.after(UI_REFRESH_MS, self._ui_tick)
+        except Exception:
+            pass
+
+    def _set_var(self, var, value):
+        if self._rendered.get(id(var)) != value:
+            self._rendered[id(var)] = value
+            var.set(value)
+
+    def _render_clock(self):
+        core = self.core
+        if not core.tracking or self._next_capture_at is None:
+            return
+        interval = core.capture_interval_seconds
+        remaining = max(0, min(interval, int(self._next_capture_at - time.monotonic() + 0.999)))
+        self._set_var(self.progress_var, interval - remaining)
+        self._set_var(self.countdown_var, f'Next capture in {remaining}s')
+        if core.session_start_ts:
+            elapsed = max(0, int(time.time() - core.session_start_ts))
+            self._set_var(self.active_time_var, f"Active: {self._format_hms(elapsed)}")
+
+    def _on_core_event(self, kind, data):
+        if kind == 'status':
+            self._set_var(self.status_var, data['text'])
+            self.header_status.configure(text=data['text'])
+        elif kind == 'server':
+            self.header_status.configure(text=f"Server: {data['url']}" if data['url'] else 'Server unreachable')
+        elif kind == 'tracking':
+            if data['active']:
+                self._set_var(self.active_time_var, 'Active: 00:00:00')
+                self._set_var(self.idle_time_var, 'Idle: 00:00:00')
+                self._set_var(self.status_var, 'Tracking…')
+                self.header_status.configure(text='Tracking…')
+                self.start_btn.configure(state=tk.DISABLED)
+                self.stop_btn.configure(state=tk.NORMAL)
+            else:
+                self._next_capture_at = None
+                self._set_var(self.status_var, 'Tracking stopped')
+                self.header_status.configure(text='Tracking stopped')
+                self.start_btn.configure(state=tk.NORMAL)
+                self.stop_btn.configure(state=tk.DISABLED)
+                self._set_var(self.countdown_var, f'Next capture in {self.core.capture_interval_seconds}s')
+                self._set_var(self.progress_var, 0)
+        elif kind == 'interval':
+            try:
+                self.progress.configure(maximum=data['seconds'])
+            except Exception:
+                pass
+            self._set_var(self.countdown_var, f"Next capture in {data['seconds']}s")
+            self.start_btn.configure(state=tk.NORMAL if data['enabled'] else tk.DISABLED)
+        elif kind == 'schedule':
+            # restart countdown from the scheduler's deadline; _render_clock takes it from here
+            self._next_capture_at = time.monotonic() + data['next_in']
+        elif kind == 'idle':
+            self._set_var(self.idle_time_var, f"Idle: {self._format_hms(data['total_seconds'])}")
+        elif kind == 'upload':
+            self._set_var(self.last_upload_var, data['text'])
+        elif kind == 'live':
+            self._set_live_indicator(data['active'])
+        elif kind == 'live_frame':
+            try:
+                self._set_var(self.live_last_frame_var, data['text'])
+            except Exception:
+                pass
+        elif kind == 'session_expired':
+            self._set_var(self.status_var, data['text'])
+            self.header_status.configure(text=data['text'])
+            try:
+                self.login_btn.configure(text='Login', command=self.login)
+            except Exception:
+                pass
+            messagebox.showwarning('Session expired', data['text'])
+
     def login(self):
         email = self.email.get().strip()
         password = self.password.get().strip()
         if not email or not password:
             messagebox.showwarning('Missing', 'Email and password are required.')
             return
-        # Ensure backend is reachable before attempting login
-        if not self._ensure_server():
-            messagebox.showerror('Login failed', f'Server not reachable at {self.backend_url}. Ensure backend is running on port 4000.')
-            return
         try:
-            resp = requests.post(f'{self.backend_url}/api/auth/login', json={'email': email, 'password': password}, timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
-            self.token = data.get('token')
-            if not self.token:
-                raise ValueError('No token received')
-        except requests.exceptions.HTTPError as e:
-            messagebox.showerror('Login failed', f'HTTP error: {e}')
+            role = self.core.login(email, password)
+        except LoginError as e:
+            messagebox.showerror('Login failed', str(e))
             return
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror('Login failed', f'Connection error: {e}')
-            return
-
-        self.status_var.set(f'Logged in as {email}')
-        self.header_status.configure(text=f'Logged in as {email}')
-        # Determine role; desktop tracking is only for employees
-        role = 'employee'
-        try:
-            payload = self._parse_jwt(self.token)
-            role = payload.get('role') or 'employee'
-        except Exception:
-            role = 'employee'
         if role != 'employee':
             try:
                 self.start_btn.configure(state=tk.DISABLED)
@@ -179,97 +2582,16 @@ class TimeTrackerApp:
                 pass
             messagebox.showinfo('Login', f'Logged in as {role}. Desktop tracking is only available for employees.')
             return
-
-        # Connect Socket.IO for live view signaling (UI hidden for employees)
-        self._connect_socket(email)
-        # Fetch capture interval and auto-start tracking
-        self._fetch_capture_interval()
-        try:
-            if not self.tracking:
-                self.start_tracking()
-        except Exception:
-            pass
-        # Immediately start live view streaming on successful login
-        try:
-            self.live_view_active = True
-            self._set_live_indicator(True)
-            self._start_live_loop()
-        except Exception as e:
-            print('[live] auto-start error:', e)
         try:
             self.login_btn.configure(text='Logout', command=self.logout)
         except Exception:
             pass
 
-    def _connect_socket(self, email):
-        try:
-            self.sio = socketio.Client(reconnection=True, reconnection_attempts=10, reconnection_delay=1)
-            # Register event handlers
-            self.sio.on('live_view:initiate', self._on_live_view_start)
-            self.sio.on('live_view:terminate', self._on_live_view_stop)
-            self.sio.on('live_view:frame', lambda data: None)  # managers receive frames; employee ignores
-            # Interval assignment push from backend
-            self.sio.on('interval:assigned', self._on_interval_assigned)
-            # Connect with JWT via auth and include userId in query for context
-            qs = urlencode({'userId': email})
-            self.sio.connect(
-                f"{self.backend_url}?{qs}",
-                auth={'token': self.token},
-                socketio_path='socket.io',
-                wait=True,
-                wait_timeout=12,
-            )
-        except Exception as e:
-            print('[socket] connection error:', repr(e))
-
-    def _fetch_capture_interval(self):
-        try:
-            headers = { 'Authorization': f'Bearer {self.token}' } if self.token else {}
-            resp = requests.get(f'{self.backend_url}/api/capture-interval', headers=headers, timeout=10)
-            data = resp.json()
-            secs = int(data.get('intervalSeconds') or 0)
-            if data.get('assigned') and secs > 0:
-                self.capture_interval_seconds = secs
-            # Always enable tracking; fall back to default interval if not assigned
-            try:
-                self.progress.configure(maximum=self.capture_interval_seconds)
-            except Exception:
-                pass
-            self.countdown_var.set(f'Next capture in {self.capture_interval_seconds}s')
-            self.start_btn.configure(state=tk.NORMAL)
-        except Exception as e:
-            print('[interval] fetch error:', e)
-            self.start_btn.configure(state=tk.DISABLED)
-
-    def _on_interval_assigned(self, data=None):
-        try:
-            secs = int((data or {}).get('intervalSeconds') or 0)
-        except Exception:
-            secs = 0
-        if secs > 0:
-            self.capture_interval_seconds = secs
-            try:
-                self.progress.configure(maximum=self.capture_interval_seconds)
-            except Exception:
-                pass
-            self.countdown_var.set(f'Next capture in {self.capture_interval_seconds}s')
-            self.start_btn.configure(state=tk.NORMAL)
-            # Auto-start tracking if not already running
-            if not self.tracking:
-                try:
-                    self.start_tracking()
-                except Exception:
-                    pass
-
-    def _on_live_view_start(self, data=None):
-        self.live_view_active = True
-        self._set_live_indicator(True)
-        self._start_live_loop()
+    def start_tracking(self):
+        self.core.start_tracking()
 
-    def _on_live_view_stop(self, data=None):
-        self.live_view_active = False
-        self._set_live_indicator(False)
-        self._stop_live_loop()
+    def stop_tracking(self):
+        self.core.stop_tracking()
 
     def _set_live_indicator(self, active: bool):
         self.live_indicator.set(f'Live View: {"active" if active else "inactive"}')
@@ -279,367 +2601,110 @@ class TimeTrackerApp:
         except Exception:
             pass
 
-    def start_tracking(self):
-        if self.tracking:
-            return
-        self.tracking = True
-        self._stop_event.clear()
-        try:
-            self.session_start_ts = time.time()
-            self.total_idle_seconds = 0
-            self.active_time_var.set('Active: 00:00:00')
-            self.idle_time_var.set('Idle: 00:00:00')
-        except Exception:
-            pass
-        self.status_var.set('Tracking…')
-        self.header_status.configure(text='Tracking…')
-        self.start_btn.configure(state=tk.DISABLED)
-        self.stop_btn.configure(state=tk.NORMAL)
-        self.tracker_thread = threading.Thread(target=self._tracking_loop, daemon=True)
-        self.tracker_thread.start()
-        # start heartbeat loop
-        self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
-        self.heartbeat_thread.start()
-        # notify backend start
-        try:
-            headers = { 'Authorization': f'Bearer {self.token}' }
-            requests.post(f'{self.backend_url}/api/work/start', headers=headers, timeout=10)
-        except Exception as e:
-            print('[work] start error:', e)
-
-    def stop_tracking(self):
-        if not self.tracking:
-            return
-        self._stop_event.set()
-        self.tracking = False
-        self.status_var.set('Tracking stopped')
-        self.header_status.configure(text='Tracking stopped')
-        self.start_btn.configure(state=tk.NORMAL)
-        self.stop_btn.configure(state=tk.DISABLED)
-        self.countdown_var.set(f'Next capture in {self.capture_interval_seconds}s')
-        self.progress_var.set(0)
-        # If live view is active, notify backend and turn off
-        try:
-            if self.live_view_active and self.sio:
-                self.live_view_active = False
-                self._set_live_indicator(False)
-                self.sio.emit('live_view:terminate', {'employeeId': self.email.get()})
-        except Exception:
-            pass
-        # Ensure live loop stops
-        self._stop_live_loop()
-        # notify backend stop
-        try:
-            headers = { 'Authorization': f'Bearer {self.token}' }
-            requests.post(f'{self.backend_url}/api/work/stop', headers=headers, timeout=10)
-        except Exception as e:
-            print('[work] stop error:', e)
-
     def _on_close(self):
         try:
-            if self.tracking:
-                try:
-                    self.stop_tracking()
-                except Exception:
-                    pass
-            else:
-                try:
-                    if self.token:
-                        headers = { 'Authorization': f'Bearer {self.token}' }
-                        requests.post(f'{self.backend_url}/api/work/stop', headers=headers, timeout=10)
-                except Exception:
-                    pass
-            try:
-                self.disable_live_view()
-            except Exception:
-                pass
-            try:
-                if self.sio:
-                    self.sio.disconnect()
-            except Exception:
-                pass
+            self.core.shutdown()
         finally:
             try:
                 self.root.destroy()
             except Exception:
                 os._exit(0)
 
-    def _capture_screenshot(self):
-        with mss.mss() as sct:
-            monitor = sct.monitors[1]
-            img = sct.grab(monitor)
-            # Convert to PIL Image
-            pil_img = Image.frombytes('RGB', img.size, img.bgra, 'raw', 'BGRX')
-            # Resize down for live view to reduce bandwidth
-            pil_small = pil_img.copy()
-            pil_small.thumbnail((960, 540))
-
-            # Encode JPEG
-            buf = io.BytesIO()
-            pil_img.save(buf, format='JPEG', quality=70)
-            full_jpeg = buf.getvalue()
-
-            buf_small = io.BytesIO()
-            pil_small.save(buf_small, format='JPEG', quality=60)
-            small_jpeg = buf_small.getvalue()
-
-            return full_jpeg, small_jpeg
-
-    def _upload_screenshot(self, jpeg_bytes: bytes):
-        try:
-            files = { 'screenshot': ('screenshot.jpg', jpeg_bytes, 'image/jpeg') }
-            data = { 'employeeId': self.email.get() }
-            headers = { 'Authorization': f'Bearer {self.token}' } if self.token else {}
-            resp = requests.post(f'{self.backend_url}/api/uploads/screenshot', files=files, data=data, headers=headers, timeout=30)
-            resp.raise_for_status()
-            # update UI on successful upload
-            self.last_upload_var.set(f"Last upload: {time.strftime('%H:%M:%S')} ✅")
-        except Exception as e:
-            print('[upload] error:', e)
-            self.last_upload_var.set(f'Last upload failed: {e}')
+    def _format_hms(self, s: int) -> str:
+        return format_hms(s)
 
-    def _send_live_frame(self, small_jpeg: bytes):
-        if not self.sio or not self.live_view_active:
-            return
+    def logout(self):
         try:
-            b64 = base64.b64encode(small_jpeg).decode('ascii')
-            self.sio.emit('live_view:frame', {'employeeId': self.email.get(), 'frameBase64': b64, 'ts': datetime.utcnow().isoformat()})
-            # update UI
+            self.core.logout()
             try:
-                self.live_last_frame_var.set(f"Last live frame: {time.strftime('%H:%M:%S')}")
+                self.login_btn.configure(text='Login', command=self.login)
             except Exception:
                 pass
-        except Exception as e:
-            print('[live] emit error:', e)
-
-    def _start_live_loop(self):
-        if self.live_thread and self.live_thread.is_alive():
-            return
-        self._live_stop_event.clear()
-        self.live_thread = threading.Thread(target=self._live_view_loop, daemon=True)
-        self.live_thread.start()
-
-    def _stop_live_loop(self):
-        try:
-            self._live_stop_event.set()
         except Exception:
             pass
 
-    def _live_view_loop(self):
-        # Stream small frames more frequently while live view is active
-        while not self._live_stop_event.is_set():
-            if self.live_view_active:
-                try:
-                    _, small_jpeg = self._capture_screenshot()
-                    self._send_live_frame(small_jpeg)
-                except Exception as e:
-                    print('[live] capture error:', e)
-            # sleep regardless to avoid tight loop
-            for _ in range(LIVE_VIEW_INTERVAL_SECONDS * 2):
-                if self._live_stop_event.is_set():
-                    break
-                time.sleep(0.5)
-
-    def _tracking_loop(self):
-        next_capture = time.time()
-        while not self._stop_event.is_set():
-            now = time.time()
-            if now >= next_capture:
-                try:
-                    full_jpeg, small_jpeg = self._capture_screenshot()
-                    self._upload_screenshot(full_jpeg)
-                    # Optional: also send one frame on full capture; the live loop handles frequent streaming
-                    self._send_live_frame(small_jpeg)
-                except Exception as e:
-                    print('[tracking] capture error:', e)
-                next_capture = now + self.capture_interval_seconds
-                # restart countdown
-                self._schedule_countdown_update(self.capture_interval_seconds)
-            time.sleep(0.5)
 
-    def _get_idle_seconds(self) -> int:
-        # Windows idle time via GetLastInputInfo; fallback 0 on failure
-        try:
-            import ctypes
-            class LASTINPUTINFO(ctypes.Structure):
-                _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
-            lii = LASTINPUTINFO()
-            lii.cbSize = ctypes.sizeof(LASTINPUTINFO)
-            if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(lii)):
-                return 0
-            millis = ctypes.windll.kernel32.GetTickCount() - lii.dwTime
-            return int(millis // 1000)
-        except Exception:
-            return 0
-
-    def _parse_jwt(self, token: str) -> dict:
-        try:
-            parts = (token or '').split('.')
-            if len(parts) < 2:
-                return {}
-            import json, base64
-            b64 = parts[1].replace('-', '+').replace('_', '/')
-            # Add padding if necessary
-            pad = '=' * (-len(b64) % 4)
-            decoded = base64.b64decode(b64 + pad)
-            return json.loads(decoded.decode('utf-8'))
-        except Exception:
-            return {}
+def format_hms(s: int) -> str:
+    try:
+        s = max(0, int(s))
+        h = s // 3600
+        m = (s % 3600) // 60
+        r = s % 60
+        return f"{str(h).zfill(2)}:{str(m).zfill(2)}:{str(r).zfill(2)}"
+    except Exception:
+        return "00:00:00"
 
-    def _heartbeat_loop(self):
-        # Periodically send idle delta/duration to backend while tracking
-        prev_idle_duration = 0
-        while not self._stop_event.is_set():
-            time.sleep(HEARTBEAT_INTERVAL_SECONDS)
-            if self._stop_event.is_set():
-                break
-            try:
-                since_last_input = self._get_idle_seconds()
-                current_idle_duration = max(0, since_last_input - 180)
-                delta = 0
-                if current_idle_duration > 0:
-                    delta = max(0, current_idle_duration - prev_idle_duration)
-                else:
-                    prev_idle_duration = 0
-                prev_idle_duration = current_idle_duration
-                try:
-                    self.total_idle_seconds = max(0, (self.total_idle_seconds or 0) + delta)
-                    self.idle_time_var.set(f"Idle: {self._format_hms(self.total_idle_seconds)}")
-                except Exception:
-                    pass
-                headers = { 'Authorization': f'Bearer {self.token}' }
-                payload = { 'idleDeltaSeconds': delta, 'idleDurationSeconds': current_idle_duration }
-                requests.post(f'{self.backend_url}/api/work/heartbeat', json=payload, headers=headers, timeout=10)
-            except Exception as e:
-                print('[work] heartbeat error:', e)
 
-    def disable_live_view(self):
-        # Employee-side manual termination for transparency
-        if not self.live_view_active:
-            return
-        self.live_view_active = False
-        self._set_live_indicator(False)
-        self._stop_live_loop()
-        try:
-            if self.sio:
-                self.sio.emit('live_view:terminate', {'employeeId': self.email.get()})
-        except Exception:
-            pass
+def main():
+    mark_startup('imported')
+    if tk is None:
+        raise RuntimeError('Tkinter is required to run the desktop client. Use --headless to run without a window.')
+    root = tk.Tk()
+    app = TimeTrackerApp(root)
+    root.mainloop()
 
-    def _schedule_countdown_update(self, seconds: int):
-        # Update progress and countdown label every second
-        def tick(remaining):
-            if self._stop_event.is_set():
-                self.countdown_var.set(f'Next capture in {self.capture_interval_seconds}s')
-                self.progress_var.set(0)
-                return
-            try:
-                self.progress_var.set(self.capture_interval_seconds - remaining)
-            except Exception:
-                pass
-            self.countdown_var.set(f'Next capture in {remaining}s')
-            try:
-                if getattr(self, 'session_start_ts', None):
-                    elapsed = max(0, int(time.time() - self.session_start_ts))
-                    self.active_time_var.set(f"Active: {self._format_hms(elapsed)}")
-                if remaining > 0:
-                    self.root.after(1000, lambda: tick(remaining - 1))
-                else:
-                    self.root.after(1000, lambda: tick(self.capture_interval_seconds))
-                return
-            except Exception:
-                pass
-            if remaining > 0:
-                self.root.after(1000, lambda: tick(remaining - 1))
-        tick(seconds)
 
-    def _format_hms(self, s: int) -> str:
-        try:
-            s = max(0, int(s))
-            h = s // 3600
-            m = (s % 3600) // 60
-            r = s % 60
-            return f"{str(h).zfill(2)}:{str(m).zfill(2)}:{str(r).zfill(2)}"
-        except Exception:
-            return "00:00:00"
+def main_headless(argv=None):
+    # Window-less service mode for VDI hosts: same tracking core, events logged to stdout
+    mark_startup('imported')
+    parser = argparse.ArgumentParser(description='Run the time tracker without a window.')
+    parser.add_argument('--headless', action='store_true')
+    parser.add_argument('--email', default=os.environ.get('TRACKER_EMAIL', ''))
+    args = parser.parse_args(argv)
+    email = args.email.strip()
+    # Password comes from the environment (or a prompt) so it never shows up in the process list
+    password = os.environ.get('TRACKER_PASSWORD', '')
+    if not password and sys.stdin.isatty():
+        password = getpass.getpass(f'Password for {email}: ')
+    if not email or not password:
+        print('[headless] set TRACKER_EMAIL/--email and TRACKER_PASSWORD')
+        return 2
 
-    def logout(self):
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
         try:
-            if self.tracking:
-                try:
-                    self.stop_tracking()
-                except Exception:
-                    pass
-            self.disable_live_view()
-            try:
-                if self.sio:
-                    self.sio.disconnect()
-            except Exception:
-                pass
-            self.token = None
-            self.status_var.set('Not logged in')
-            self.header_status.configure(text='Not logged in')
-            try:
-                self.login_btn.configure(text='Login', command=self.login)
-            except Exception:
-                pass
+            signal.signal(sig, lambda *_: stop.set())
         except Exception:
             pass
 
-    def _resolve_backend_url(self) -> str:
-        # Try env-provided URL, then common local ports (4000, 4011)
-        candidates = []
-        env_url = BACKEND_URL
-        if env_url:
-            candidates.append(env_url)
-        candidates.extend([
-            'http://mail.vughy.com:10002',
-            'http://127.0.0.1:4000', 'http://localhost:4000',
-            'http://127.0.0.1:4011', 'http://localhost:4011',
-        ])
-        for url in candidates:
-            try:
-                r = requests.get(f'{url}/health', timeout=2)
-                if r.ok:
-                    try:
-                        self.header_status.configure(text=f'Server: {url}')
-                    except Exception:
-                        pass
-                    return url
-            except Exception:
-                continue
-        try:
-            self.header_status.configure(text=f'Server unreachable')
-        except Exception:
-            pass
-        return env_url or 'http://localhost:4000'
+    core = TrackerCore()
+    core.start_discovery()
+    mark_startup('ready')
+    report_startup(None)  # no window; the phases are reported for comparison only
 
-    def _ensure_server(self) -> bool:
-        try:
-            r = requests.get(f'{self.backend_url}/health', timeout=3)
-            return bool(r.ok)
-        except Exception:
-            # Retry on alternate local URLs
-            for url in ['http://127.0.0.1:4000', 'http://localhost:4000', 'http://127.0.0.1:4011', 'http://localhost:4011']:
-                try:
-                    r = requests.get(f'{url}/health', timeout=3)
-                    if r.ok:
-                        self.backend_url = url
-                        try:
-                            self.header_status.configure(text=f'Server: {url}')
-                        except Exception:
-                            pass
-                        return True
-                except Exception:
-                    continue
-        return False
+    def login():
+        # Role once logged in, retrying with backoff; None if stopped first
+        delay = UPLOAD_RETRY_BASE_SECONDS
+        while not stop.is_set():
+            try:
+                return core.login(email, password)
+            except LoginError as e:
+                print('[headless] login failed:', e)
+                stop.wait(delay)
+                delay = min(UPLOAD_RETRY_MAX_SECONDS, delay * 2)
+        return None
 
+    role = login()
+    if role is not None and role != 'employee':
+        print(f'[headless] logged in as {role}; desktop tracking is only available for employees')
+        core.shutdown()
+        return 1
 
-def main():
-    root = tk.Tk()
-    app = TimeTrackerApp(root)
-    root.mainloop()
+    while not stop.is_set():
+        try:
+            kind, data = core.events.get(timeout=1)
+        except queue.Empty:
+            continue
+        if kind == 'idle':
+            data = {'total': format_hms(data['total_seconds'])}
+        print(f'[{kind}]', ' '.join(f'{k}={v}' for k, v in data.items()))
+        if kind == 'session_expired':
+            login()
+    core.shutdown()
+    return 0
 
 
 if __name__ == '__main__':
+    if '--headless' in sys.argv[1:]:
+        sys.exit(main_headless(sys.argv[1:]))
     main()
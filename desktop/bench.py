@@ -0,0 +1,408 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import statistics
+import multiprocessing
+
+from PIL import Image, ImageDraw
+
+# Capture/encode/send benchmark for the desktop client. Drives TrackerCore's own capture, live-view and
+# upload paths with synthetic desktop frames against a local stub backend (HTTP + socket.io), so it
+# needs no display and no real server:
+#
+#   python desktop/bench.py --save bench-baseline.json      # record a baseline
+#   python desktop/bench.py --compare bench-baseline.json   # exit 1 on regressions beyond --tolerance
+#
+# Every resolution runs in a fresh process so peak RSS and CPU time belong to that scenario alone; the
+# stub backend runs in its own process and is not counted. The stub needs aiohttp.
+
+RESOLUTIONS = {
+    '1080p': (1920, 1080),
+    '1440p': (2560, 1440),
+    '4k': (3840, 2160),
+}
+OPERATIONS = ('capture', 'live', 'upload')
+# Result fields compared against a baseline: True when higher is better
+COMPARED = {'fps': True, 'cpu_ms': False, 'bytes': False}
+BENCH_EMAIL = 'bench@example.com'
+ACK_TIMEOUT_SECONDS = 10
+
+
+class SyntheticScreen:
+    # Deterministic desktop-like frames: windows full of "text", a taskbar clock and a photo-like
+    # patch. Each advance() types a word, and every tenth frame scrolls a window by a line, so live
+    # tiles and uploads see the small changes a real working screen produces.
+    def __init__(self, size, seed=1):
+        self.size = size
+        self.seq = 0
+        self._rng = random.Random(seed)
+        self._scale = max(1, size[1] // 1080)
+        self._img = self._desktop()
+        self._cursor = None
+
+    def _desktop(self):
+        rng, s = self._rng, self._scale
+        w, h = self.size
+        img = Image.new('RGB', self.size, (36, 52, 78))
+        draw = ImageDraw.Draw(img)
+        self._windows = []
+        for i in range(4):
+            ww, wh = rng.randrange(w // 3, w // 2), rng.randrange(h // 3, h // 2)
+            x0, y0 = rng.randrange(0, w - ww), rng.randrange(0, h - wh - 40 * s)
+            draw.rectangle((x0, y0, x0 + ww, y0 + wh), fill=(246, 246, 246), outline=(96, 96, 96))
+            draw.rectangle((x0, y0, x0 + ww, y0 + 28 * s), fill=(rng.randrange(40, 200), 90, 160))
+            body = (x0 + 10 * s, y0 + 40 * s, x0 + ww - 10 * s, y0 + wh - 10 * s)
+            for y in range(body[1], body[3] - 12 * s, 18 * s):
+                self._words(draw, body[0], y, body[2])
+            self._windows.append(body)
+        pw, ph = w // 5, h // 5
+        noise = Image.frombytes('L', (pw, ph), rng.randbytes(pw * ph))
+        ramp = Image.linear_gradient('L').resize((pw, ph))
+        img.paste(Image.merge('RGB', (noise, ramp, ramp.transpose(Image.Transpose.FLIP_LEFT_RIGHT))),
+                  (w - pw - 20 * s, 20 * s))
+        draw.rectangle((0, h - 40 * s, w, h), fill=(22, 22, 26))
+        return img
+
+    def _words(self, draw, x, y, right):
+        rng, s = self._rng, self._scale
+        while True:
+            word = rng.randrange(12, 60) * s
+            if x + word > right:
+                return
+            draw.rectangle((x, y, x + word, y + 9 * s), fill=(48, 48, 48))
+            x += word + 6 * s
+
+    def advance(self):
+        rng, s = self._rng, self._scale
+        draw = ImageDraw.Draw(self._img)
+        left, top, right, bottom = self._windows[0]
+        if self._cursor is None or self._cursor[1] > bottom - 20 * s:
+            self._cursor = [left, top]
+        x, y = self._cursor
+        word = rng.randrange(12, 60) * s
+        if x + word > right:
+            x, y = left, y + 18 * s
+        draw.rectangle((x, y, x + word, y + 9 * s), fill=(48, 48, 48))
+        self._cursor = [x + word + 6 * s, y]
+        if self.seq % 10 == 9:
+            left, top, right, bottom = self._windows[1 + self.seq // 10 % 3]
+            line = 18 * s
+            self._img.paste(self._img.crop((left, top + line, right, bottom)), (left, top))
+            draw.rectangle((left, bottom - line, right, bottom), fill=(246, 246, 246))
+            self._words(draw, left, bottom - line, right)
+        w, h = self.size
+        draw.rectangle((w - 120 * s, h - 30 * s, w - 10 * s, h - 10 * s), fill=(22, 22, 26))
+        draw.rectangle((w - 120 * s, h - 30 * s, w - 120 * s + (self.seq % 11) * 10 * s, h - 10 * s),
+                       fill=(200, 200, 200))
+        self.seq += 1
+        return self._img.tobytes('raw', 'BGRX')
+
+
+class SyntheticCapture:
+    # Stands in for CaptureEngine: latest() hands out the frame the benchmark loop last produced
+    def __init__(self, frame_class, pool):
+        self._frame_class = frame_class
+        self._pool = pool
+        self.frame = None
+
+    def push(self, seq, size, bgra):
+        self.frame = self._frame_class(seq, size, bgra, time.monotonic(), self._pool)
+        return self.frame
+
+    def latest(self, max_age=0.0, timeout=None):
+        return self.frame
+
+    def stop(self):
+        pass
+
+
+def serve_stub(ready):
+    # Local stand-in for the Node backend: the routes and socket events the measured paths hit, with
+    # bodies read and dropped. Runs until the parent terminates it.
+    try:
+        import asyncio
+        import socketio
+        from aiohttp import web
+    except Exception as e:
+        ready.put(('error', f'stub backend needs aiohttp and python-socketio: {e}'))
+        return
+
+    limit = 256 * 1024 * 1024
+    sio = socketio.AsyncServer(async_mode='aiohttp', max_http_buffer_size=limit)
+    app = web.Application(client_max_size=limit)
+    sio.attach(app)
+
+    @sio.on('live_view:frame')
+    async def live_frame(sid, data):
+        return {'ok': True}
+
+    @sio.on('work:events')
+    async def work_events(sid, data):
+        return {'ok': True}
+
+    @sio.on('session:resume')
+    async def session_resume(sid, data):
+        return {'ok': True, 'viewers': 0, 'intervalSeconds': None}
+
+    async def ok(request):
+        await request.read()
+        return web.json_response({'ok': True})
+
+    async def uploaded(request):
+        await request.read()
+        return web.json_response({'ok': True, 'missing': []}, status=201)
+
+    app.router.add_get('/health', ok)
+    app.router.add_get('/api/capture-interval', ok)
+    app.router.add_post('/api/work/events', ok)
+    app.router.add_post('/api/uploads/screenshot', uploaded)
+    app.router.add_post('/api/uploads/screenshots/batch', uploaded)
+    app.router.add_post('/api/uploads/screenshot/ref', uploaded)
+
+    async def main():
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        ready.put(('ok', f'http://{host}:{port}'))
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+def summarize(walls, cpu, sizes):
+    n = len(walls)
+    total = sum(walls)
+    ordered = sorted(walls)
+    return {
+        'frames': n,
+        'fps': n / total if total else 0.0,
+        'cpu_ms': cpu / n * 1000 if n else 0.0,
+        'bytes': statistics.mean(sizes) if sizes else 0,
+        'p50_ms': ordered[n // 2] * 1000 if n else 0.0,
+        'p95_ms': ordered[min(n - 1, int(n * 0.95))] * 1000 if n else 0.0,
+    }
+
+
+def run_scenario(name, size, backend_url, frames, warmup, results):
+    # Child process entry point. The client's settings are read from the environment at import, so
+    # everything is pointed at a scratch state dir and the stub backend before app is imported.
+    state_dir = tempfile.mkdtemp(prefix='tt-bench-')
+    os.environ.update({
+        'TRACKER_STATE_DIR': state_dir,
+        'BACKEND_URL': backend_url,
+        'METRICS_LOG': '0',
+        'METRICS_PORT': '0',
+        'CAPTURE_FORMAT': 'jpeg',
+    })
+    with open(os.path.join(state_dir, 'backend.json'), 'w', encoding='utf-8') as f:
+        json.dump({'url': backend_url, 'ts': time.time()}, f)  # skip discovery probes
+    try:
+        import app
+        from metrics import METRICS
+
+        class PinnedRate(app.LiveRateController):
+            # Fixed live rendition so runs stay comparable; the adaptive controller would drift with RTT
+            def _congested(self):
+                pass
+
+            def _improve(self, nbytes):
+                pass
+
+        core = app.TrackerCore()
+        core.token = 'bench'
+        core.email = BENCH_EMAIL
+        core.capture = screen_capture = SyntheticCapture(app.CapturedFrame, app.ImagePool())
+        core.live_rate = PinnedRate()
+        core._call(core._connect_socket())
+        if not core._socket_connected():
+            raise RuntimeError('could not connect to the stub socket.io server')
+        core.live_view_active = True
+        screen = SyntheticScreen(size)
+
+        walls = {op: [] for op in OPERATIONS}
+        cpus = {op: 0.0 for op in OPERATIONS}
+        sizes = {op: [] for op in OPERATIONS}
+
+        def timed(op, measured, fn):
+            wall, cpu = time.perf_counter(), time.process_time()
+            out = fn()
+            if measured:
+                walls[op].append(time.perf_counter() - wall)
+                cpus[op] += time.process_time() - cpu
+            return out
+
+        for i in range(warmup + frames):
+            frame = screen_capture.push(screen.seq + 1, size, screen.advance())
+            measured = i >= warmup
+            full, live = timed('capture', measured, lambda: core._call(core._capture_screenshot(('full', 'live'))))
+            before = emitted_bytes(METRICS)
+            timed('live', measured, lambda: send_and_wait(core, frame))
+            sent = emitted_bytes(METRICS) - before
+            timed('upload', measured, lambda: upload(core, full))
+            if measured:
+                sizes['capture'].append(len(full) + len(live))
+                sizes['live'].append(sent)
+                sizes['upload'].append(len(full))
+
+        core.shutdown()
+        stages = METRICS.snapshot()['seconds']
+        results.put((name, {
+            'size': list(size),
+            'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'ops': {op: summarize(walls[op], cpus[op], sizes[op]) for op in OPERATIONS},
+            'stages_ms': {stage: {k: round(s[k] * 1000, 3) for k in ('p50', 'p95', 'avg')}
+                          for stage, s in sorted(stages.items())},
+        }))
+    except Exception as e:
+        results.put((name, {'error': repr(e)}))
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+def emitted_bytes(metrics):
+    # Live payloads are tiles or keyframes chosen inside _send_live_frame; its size metric says which
+    emitted = metrics.snapshot()['bytes'].get('live_emit', {})
+    return emitted.get('avg', 0) * emitted.get('count', 0)
+
+
+def send_and_wait(core, frame):
+    # One live frame through diff, payload and emit, then the stub's ack (as the live loop would wait)
+    core._call(core._send_live_frame(frame))
+    deadline = time.monotonic() + ACK_TIMEOUT_SECONDS
+    while not core.live_rate.ready():
+        if time.monotonic() > deadline:
+            raise TimeoutError('live frame was not acknowledged')
+        time.sleep(0.0005)
+
+
+def upload(core, image_bytes):
+    # Spool the screenshot and drain it synchronously, which is what the uploader thread does
+    core._call(core._upload_screenshot(image_bytes, 'jpeg'))
+    batch = core.spool.pending(core.email)
+    if batch and not core._call(core._upload_spooled(batch)):
+        raise RuntimeError('upload to the stub backend failed')
+
+
+def run(resolutions, frames, warmup):
+    ctx = multiprocessing.get_context('spawn')
+    ready = ctx.Queue()
+    stub = ctx.Process(target=serve_stub, args=(ready,), daemon=True)
+    stub.start()
+    try:
+        status, backend_url = ready.get(timeout=30)
+        if status != 'ok':
+            raise RuntimeError(backend_url)
+        report = {}
+        for name in resolutions:
+            results = ctx.Queue()
+            child = ctx.Process(target=run_scenario,
+                                args=(name, RESOLUTIONS[name], backend_url, frames, warmup, results))
+            child.start()
+            _, report[name] = results.get()
+            child.join()
+        return report
+    finally:
+        stub.terminate()
+        stub.join()
+
+
+def environment():
+    from PIL import __version__ as pillow_version
+    return {
+        'python': platform.python_version(),
+        'pillow': pillow_version,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def print_report(report):
+    print(f"{'scenario':<8} {'op':<8} {'fps':>8} {'cpu ms/f':>9} {'KB/f':>9} {'p50 ms':>8} {'p95 ms':>8} {'rss MB':>8}")
+    for name, result in report.items():
+        if 'error' in result:
+            print(f'{name:<8} error: {result["error"]}')
+            continue
+        for op, r in result['ops'].items():
+            print(f"{name:<8} {op:<8} {r['fps']:>8.1f} {r['cpu_ms']:>9.1f} {r['bytes'] / 1024:>9.1f} "
+                  f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {result['rss_mb']:>8.1f}")
+
+
+def compare(report, baseline, tolerance):
+    # Regressions beyond tolerance (a fraction) per scenario/op metric, plus peak RSS per scenario
+    failures = []
+    for name, base in baseline.get('results', {}).items():
+        current = report.get(name)
+        if current is None or 'error' in base:
+            continue
+        if 'error' in current:
+            failures.append(f'{name}: {current["error"]}')
+            continue
+        for op, base_op in base['ops'].items():
+            now = current['ops'].get(op, {})
+            for metric, higher_is_better in COMPARED.items():
+                old, new = base_op.get(metric), now.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                if (-change if higher_is_better else change) > tolerance:
+                    failures.append(f'{name} {op} {metric}: {old:.1f} -> {new:.1f} ({change:+.0%})')
+        old, new = base.get('rss_mb'), current.get('rss_mb')
+        if old and new and (new - old) / old > tolerance:
+            failures.append(f'{name} rss_mb: {old:.1f} -> {new:.1f} ({(new - old) / old:+.0%})')
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the desktop capture/encode/send pipeline.')
+    parser.add_argument('--resolutions', default=','.join(RESOLUTIONS),
+                        help=f'comma-separated subset of {", ".join(RESOLUTIONS)}')
+    parser.add_argument('--frames', type=int, default=30, help='measured frames per resolution')
+    parser.add_argument('--warmup', type=int, default=3, help='unmeasured frames first')
+    parser.add_argument('--save', metavar='PATH', help='write results as a baseline JSON file')
+    parser.add_argument('--compare', metavar='PATH', help='compare with a baseline; exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='allowed relative regression per metric (default 0.15)')
+    args = parser.parse_args(argv)
+
+    resolutions = [r.strip().lower() for r in args.resolutions.split(',') if r.strip()]
+    unknown = [r for r in resolutions if r not in RESOLUTIONS]
+    if unknown:
+        parser.error(f'unknown resolution(s): {", ".join(unknown)}')
+
+    report = run(resolutions, args.frames, args.warmup)
+    print_report(report)
+    document = {
+        'environment': environment(),
+        'config': {'frames': args.frames, 'warmup': args.warmup},
+        'results': report,
+    }
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=2)
+        print('[bench] baseline written to', args.save)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('environment') != document['environment']:
+            print('[bench] warning: baseline was recorded on a different environment')
+        failures = compare(report, baseline, args.tolerance)
+        for failure in failures:
+            print('[bench] regression:', failure)
+        if failures:
+            return 1
+        print('[bench] no regressions beyond', f'{args.tolerance:.0%}')
+    return 1 if any('error' in r for r in report.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,484 @@
+import os
+import sys
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import aiohttp
+import socketio
+
+from app import (
+    ENDPOINT_POLICIES,
+    HEARTBEAT_INTERVAL_SECONDS,
+    LIVE_VIEW_INTERVAL_SECONDS,
+    SCREENSHOT_INTERVAL_SECONDS,
+    SOCKET_ACK_TIMEOUT_SECONDS,
+    SOCKET_CONNECT_TIMEOUT_SECONDS,
+    SOCKET_RECONNECT_BASE_SECONDS,
+    SOCKET_RECONNECT_MAX_SECONDS,
+    TOKEN_REFRESH_MARGIN_SECONDS,
+    WORK_FLUSH_INTERVAL_SECONDS,
+    build_live_frame_payload,
+    capture_slot,
+    decorrelated_jitter,
+    new_work_event,
+    parse_jwt,
+    presence_status,
+    screenshot_upload_form,
+    socket_connect_args,
+    token_expires_in,
+)
+
+# Load generator: N virtual employees in one asyncio process, speaking the desktop client's protocol
+# (login, socket.io with JWT, capture interval, work start/heartbeat/stop, screenshot uploads, live
+# frames) through the same payload helpers app.py uses. Screen capture and encoding are skipped:
+# payloads are pre-built blobs of the configured sizes.
+#
+#   python desktop/fleet.py --backend http://127.0.0.1:4000 --clients 2000 --ramp 60 --duration 600 \
+#       --password secret --provision --admin-email admin@example.com --admin-password ...
+#
+# Employees are <prefix><n>@<domain>; --provision creates them first through POST /api/employees.
+# Screenshots are stored by the backend like real ones, so point this at a disposable instance.
+
+PROGRESS_INTERVAL_SECONDS = 10
+PROVISION_CONCURRENCY = 50
+
+
+def jpeg_blob(nbytes):
+    # JPEG markers around random bytes: the backend relays and stores images without decoding them
+    nbytes = max(nbytes, 8)
+    return b'\xff\xd8\xff\xe0' + os.urandom(nbytes - 6) + b'\xff\xd9'
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class FleetStats:
+    # Latency samples and failures per endpoint. HTTP endpoints use ENDPOINT_POLICIES names; socket
+    # round trips are prefixed with 'ws_'.
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)  # endpoint -> reason -> count
+        self.active = 0
+        self.disconnects = 0
+
+    def ok(self, endpoint, seconds):
+        self.latencies[endpoint].append(seconds)
+
+    def fail(self, endpoint, seconds, reason):
+        self.latencies[endpoint].append(seconds)
+        self.errors[endpoint][reason] += 1
+
+    def summary(self) -> dict:
+        elapsed = max(1e-9, time.monotonic() - self.started)
+        endpoints = {}
+        for endpoint in sorted(self.latencies):
+            ordered = sorted(self.latencies[endpoint])
+            errors = sum(self.errors[endpoint].values())
+            endpoints[endpoint] = {
+                'count': len(ordered),
+                'rps': len(ordered) / elapsed,
+                'errors': errors,
+                'error_rate': errors / len(ordered) if ordered else 0.0,
+                'p50_ms': percentile(ordered, 0.50) * 1000,
+                'p90_ms': percentile(ordered, 0.90) * 1000,
+                'p99_ms': percentile(ordered, 0.99) * 1000,
+                'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+                'reasons': dict(self.errors[endpoint].most_common(5)),
+            }
+        return {'elapsed_seconds': elapsed, 'disconnects': self.disconnects, 'endpoints': endpoints}
+
+    def progress(self) -> str:
+        count = sum(len(v) for v in self.latencies.values())
+        errors = sum(sum(c.values()) for c in self.errors.values())
+        return f'[fleet] {self.active} active, {count} requests, {errors} errors, {self.disconnects} disconnects'
+
+
+class VirtualEmployee:
+    # One simulated desktop client. Timers follow the real client: screenshots on the same per-email
+    # slot within the capture interval, heartbeats every heartbeat interval, live frames (for the share
+    # of clients being watched) every live interval; each wait is stretched by +/- jitter.
+    def __init__(self, fleet, email):
+        self.fleet = fleet
+        self.stats = fleet.stats
+        self.email = email
+        self.token = None
+        self.http = None
+        self.sio = None
+        self.socket_down = asyncio.Event()
+        self.capture_interval = fleet.args.screenshot_interval
+        self.live = random.random() < fleet.args.live_share
+        self.seq = 0
+        self.last_upload_at = None
+        self.work_pending = []  # heartbeats waiting for the next batch, as in the client's journal
+        self.work_flushed_at = time.monotonic()
+
+    async def request(self, method, path, endpoint, auth=True, **kwargs):
+        # (status, parsed JSON or None); failures and 4xx/5xx are recorded against the endpoint
+        timeout, _ = ENDPOINT_POLICIES.get(endpoint, ENDPOINT_POLICIES['default'])
+        headers = {'Authorization': f'Bearer {self.token}'} if auth and self.token else {}
+        start = time.perf_counter()
+        try:
+            async with self.http.request(method, self.fleet.args.backend + path, headers=headers,
+                                         timeout=aiohttp.ClientTimeout(total=timeout), **kwargs) as resp:
+                body = await resp.read()
+                status = resp.status
+        except Exception as e:
+            self.stats.fail(endpoint, time.perf_counter() - start, type(e).__name__)
+            return None, None
+        elapsed = time.perf_counter() - start
+        if status >= 400:
+            self.stats.fail(endpoint, elapsed, f'HTTP {status}')
+        else:
+            self.stats.ok(endpoint, elapsed)
+        try:
+            return status, json.loads(body) if body else None
+        except ValueError:
+            return status, None
+
+    async def call(self, event, data, endpoint):
+        # socket.io emit with ack; a reply without ok: true counts as an error
+        start = time.perf_counter()
+        try:
+            reply = await self.sio.call(event, data, timeout=SOCKET_ACK_TIMEOUT_SECONDS)
+        except Exception as e:
+            self.stats.fail(endpoint, time.perf_counter() - start, type(e).__name__)
+            return False
+        ok = isinstance(reply, dict) and reply.get('ok')
+        if ok:
+            self.stats.ok(endpoint, time.perf_counter() - start)
+        else:
+            self.stats.fail(endpoint, time.perf_counter() - start, str((reply or {}).get('error') or 'nack'))
+        return ok
+
+    async def sleep(self, seconds, jitter=True):
+        # Think time, stretched by +/- jitter; True once the fleet is stopping
+        if jitter:
+            seconds *= random.uniform(1 - self.fleet.args.jitter, 1 + self.fleet.args.jitter)
+        try:
+            await asyncio.wait_for(self.fleet.stopping.wait(), seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def run(self, delay):
+        if await self.sleep(delay, jitter=False):
+            return
+        connector = aiohttp.TCPConnector(limit=self.fleet.args.pool_size)
+        async with aiohttp.ClientSession(connector=connector) as http:
+            self.http = http
+            if not await self.login():
+                return
+            self.stats.active += 1
+            try:
+                await self.session()
+            finally:
+                self.stats.active -= 1
+                if self.sio is not None:
+                    await self.sio.disconnect()
+
+    async def login(self) -> bool:
+        status, data = await self.request('POST', '/api/auth/login', 'login', auth=False,
+                                          json={'email': self.email, 'password': self.fleet.args.password})
+        self.token = (data or {}).get('token') if status == 200 else None
+        if not self.token:
+            return False
+        if parse_jwt(self.token).get('role', 'employee') != 'employee':
+            print('[fleet] not an employee account, skipping:', self.email)
+            return False
+        return True
+
+    async def refresh_token(self) -> bool:
+        status, data = await self.request('POST', '/api/auth/refresh', 'token_refresh')
+        token = (data or {}).get('token') if status == 200 else None
+        if token:
+            self.token = token
+        return bool(token)
+
+    async def connect_socket(self):
+        # One attempt with the current token; socket_loop reconnects, as the client's _socket_loop does
+        self.socket_down.clear()
+        self.sio = socketio.AsyncClient(reconnection=False)
+
+        @self.sio.on('connect')
+        async def connected():
+            # Not awaited here: the ack cannot arrive while this handler holds up the receive loop
+            asyncio.ensure_future(self.call('session:resume', {
+                'tracking': True, 'liveView': self.live, 'intervalSeconds': self.capture_interval,
+            }, 'ws_session_resume'))
+
+        @self.sio.on('disconnect')
+        async def disconnected(*_):
+            self.socket_down.set()
+            if not self.fleet.stopping.is_set():
+                self.stats.disconnects += 1
+
+        url, auth = socket_connect_args(self.fleet.args.backend, self.email, self.token)
+        start = time.perf_counter()
+        try:
+            await self.sio.connect(url, auth=auth, socketio_path='socket.io', wait=True,
+                                   wait_timeout=SOCKET_CONNECT_TIMEOUT_SECONDS)
+            self.stats.ok('ws_connect', time.perf_counter() - start)
+        except Exception as e:
+            self.stats.fail('ws_connect', time.perf_counter() - start, type(e).__name__)
+
+    async def socket_loop(self):
+        # The client's reconnect policy: never give up, decorrelated jitter between attempts, and a fresh
+        # token first if the current one is about to expire
+        base, cap = self.fleet.args.reconnect_base, self.fleet.args.reconnect_max
+        delay = base
+        while True:
+            if self.sio is not None and self.sio.connected:
+                delay = base
+                await self.socket_down.wait()
+            delay = decorrelated_jitter(delay, base, cap)
+            if await self.sleep(delay, jitter=False):
+                return
+            remaining = token_expires_in(self.token)
+            if remaining is not None and remaining <= TOKEN_REFRESH_MARGIN_SECONDS:
+                await self.refresh_token()
+            await self.connect_socket()
+
+    async def token_loop(self):
+        # Refresh TOKEN_REFRESH_MARGIN_SECONDS before expiry, as the client's _token_loop does
+        while True:
+            remaining = token_expires_in(self.token)
+            if remaining is None:
+                return
+            if remaining > TOKEN_REFRESH_MARGIN_SECONDS:
+                if await self.sleep(remaining - TOKEN_REFRESH_MARGIN_SECONDS, jitter=False):
+                    return
+                continue
+            ok = await self.refresh_token()
+            remaining = token_expires_in(self.token)
+            if (not ok or remaining is None or remaining <= TOKEN_REFRESH_MARGIN_SECONDS) and \
+                    await self.sleep(self.fleet.args.reconnect_max):
+                return
+
+    async def session(self):
+        await self.connect_socket()
+        status, data = await self.request('GET', '/api/capture-interval', 'capture_interval')
+        secs = int((data or {}).get('intervalSeconds') or 0)
+        if (data or {}).get('assigned') and secs > 0 and not self.fleet.args.ignore_assigned_interval:
+            self.capture_interval = secs
+        await self.send_work('start')
+        tasks = [asyncio.create_task(self.heartbeat_loop()), asyncio.create_task(self.screenshot_loop()),
+                 asyncio.create_task(self.socket_loop()), asyncio.create_task(self.token_loop())]
+        if self.live:
+            tasks.append(asyncio.create_task(self.live_loop()))
+        await self.fleet.stopping.wait()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.send_work('stop')
+
+    async def send_work(self, kind, **fields):
+        # Start/stop go out at once, heartbeats ride along every work flush interval. Socket first, HTTP
+        # when the socket is down or the ack fails, as the journal flush does.
+        self.work_pending.append(new_work_event(kind, **fields))
+        if kind == 'heartbeat' and time.monotonic() - self.work_flushed_at < self.fleet.args.work_flush_interval:
+            return
+        events, self.work_pending = self.work_pending, []
+        self.work_flushed_at = time.monotonic()
+        if self.sio is not None and self.sio.connected and await self.call('work:events', {'events': events},
+                                                                           'ws_work_events'):
+            return
+        await self.request('POST', '/api/work/events', 'work', json={'events': events})
+
+    async def heartbeat_loop(self):
+        while not await self.sleep(self.fleet.args.heartbeat_interval):
+            minute = int(time.time() // 60) - 1
+            await self.send_work('heartbeat', idleDeltaSeconds=0, idleDurationSeconds=0,
+                                 activity=[{'minute': minute, 'bits': 'fffffffffffffff'}])
+            if self.sio is not None and self.sio.connected:
+                status = presence_status(True, self.live, 0, 0, 0, self.last_upload_at)
+                try:
+                    await self.sio.emit('presence:status', status)
+                except Exception as e:
+                    self.stats.fail('ws_presence', 0.0, type(e).__name__)
+
+    async def screenshot_loop(self):
+        # First capture lands on this employee's stable slot, like CaptureScheduler
+        if await self.sleep(capture_slot(self.email) * self.capture_interval, jitter=False):
+            return
+        while True:
+            self.seq += 1
+            meta = {'format': 'jpeg', 'capturedAt': datetime.utcnow().isoformat() + 'Z'}
+            path, data, files = screenshot_upload_form(self.email, [(str(self.seq), meta, self.fleet.screenshot)])
+            form = aiohttp.FormData()
+            for key, value in data.items():
+                form.add_field(key, value or '')
+            for field, (filename, content, mime) in files:
+                form.add_field(field, content, filename=filename, content_type=mime)
+            status, _ = await self.request('POST', path, 'upload', data=form)
+            if status is not None and status < 400:
+                self.last_upload_at = datetime.utcnow().isoformat() + 'Z'
+            if await self.sleep(self.capture_interval):
+                return
+
+    async def live_loop(self):
+        width, height = self.fleet.args.live_size
+        seq = 0
+        while not await self.sleep(self.fleet.args.live_interval):
+            if self.sio is None or not self.sio.connected:
+                continue
+            seq += 1
+            payload = build_live_frame_payload(self.email, 'key', seq, self.fleet.live_frame, (width, height),
+                                               time.monotonic(), binary=True)
+            await self.call('live_view:frame', payload, 'ws_live_frame')
+
+
+class Fleet:
+    def __init__(self, args):
+        self.args = args
+        self.stats = FleetStats()
+        self.stopping = asyncio.Event()
+        self.screenshot = jpeg_blob(int(args.screenshot_kb * 1024))
+        self.live_frame = jpeg_blob(int(args.live_kb * 1024))
+
+    def emails(self):
+        return [f'{self.args.prefix}{i}@{self.args.domain}'
+                for i in range(self.args.start_index, self.args.start_index + self.args.clients)]
+
+    async def provision(self):
+        # Create the employee accounts with the fleet password; existing ones (409) are fine
+        args = self.args
+        async with aiohttp.ClientSession() as http:
+            async with http.post(args.backend + '/api/auth/login',
+                                 json={'email': args.admin_email, 'password': args.admin_password}) as resp:
+                token = (await resp.json()).get('token') if resp.status == 200 else None
+            if not token:
+                raise RuntimeError(f'admin login failed ({resp.status})')
+            headers = {'Authorization': f'Bearer {token}'}
+            gate = asyncio.Semaphore(PROVISION_CONCURRENCY)
+            created = Counter()
+
+            async def create(email):
+                async with gate:
+                    async with http.post(args.backend + '/api/employees', headers=headers,
+                                         json={'email': email, 'name': email.split('@')[0],
+                                               'password': args.password}) as resp:
+                        created[resp.status] += 1
+
+            await asyncio.gather(*(create(email) for email in self.emails()))
+        print('[fleet] provisioned:', dict(created))
+
+    async def report_progress(self):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL_SECONDS)
+            print(self.stats.progress(), flush=True)
+
+    async def run(self):
+        if self.args.provision:
+            await self.provision()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stopping.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        emails = self.emails()
+        spacing = self.args.ramp / len(emails) if emails else 0
+        self.stats = FleetStats()
+        progress = asyncio.create_task(self.report_progress())
+        clients = [asyncio.create_task(VirtualEmployee(self, email).run(i * spacing))
+                   for i, email in enumerate(emails)]
+        try:
+            await asyncio.wait_for(self.stopping.wait(), self.args.duration)
+        except asyncio.TimeoutError:
+            self.stopping.set()
+        await asyncio.gather(*clients, return_exceptions=True)
+        progress.cancel()
+        return self.stats.summary()
+
+
+def print_summary(summary):
+    print(f"\n{'endpoint':<18} {'count':>8} {'rps':>8} {'err%':>7} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}")
+    for endpoint, r in summary['endpoints'].items():
+        print(f"{endpoint:<18} {r['count']:>8} {r['rps']:>8.1f} {r['error_rate'] * 100:>6.2f}% "
+              f"{r['p50_ms']:>8.1f} {r['p90_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_ms']:>8.1f}")
+        for reason, n in r['reasons'].items():
+            print(f"{'':<18}   {n} x {reason}")
+    print(f"\n{summary['elapsed_seconds']:.0f}s, {summary['disconnects']} socket disconnects")
+
+
+def raise_fd_limit():
+    # Every virtual employee holds a socket.io connection plus pooled HTTP connections. Unix only; on
+    # Windows the socket limit is not an rlimit.
+    try:
+        import resource
+    except ImportError:
+        return
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def parse_size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate a fleet of desktop clients against a backend.')
+    parser.add_argument('--backend', default=os.environ.get('BACKEND_URL', 'http://127.0.0.1:4000'))
+    parser.add_argument('--clients', type=int, default=100, help='virtual employees')
+    parser.add_argument('--ramp', type=float, default=60, help='seconds over which clients log in')
+    parser.add_argument('--duration', type=float, default=300, help='seconds until all clients stop')
+    parser.add_argument('--prefix', default='loadtest+', help='email local-part prefix')
+    parser.add_argument('--domain', default='example.com')
+    parser.add_argument('--start-index', type=int, default=1)
+    parser.add_argument('--password', default=os.environ.get('FLEET_PASSWORD', ''), help='employee password')
+    parser.add_argument('--provision', action='store_true', help='create the employee accounts first')
+    parser.add_argument('--admin-email', default=os.environ.get('FLEET_ADMIN_EMAIL', ''))
+    parser.add_argument('--admin-password', default=os.environ.get('FLEET_ADMIN_PASSWORD', ''))
+    parser.add_argument('--screenshot-interval', type=float, default=SCREENSHOT_INTERVAL_SECONDS)
+    parser.add_argument('--ignore-assigned-interval', action='store_true',
+                        help='keep --screenshot-interval even when the backend assigns one')
+    parser.add_argument('--heartbeat-interval', type=float, default=HEARTBEAT_INTERVAL_SECONDS)
+    parser.add_argument('--work-flush-interval', type=float, default=WORK_FLUSH_INTERVAL_SECONDS,
+                        help='seconds heartbeats are batched before sending')
+    parser.add_argument('--live-interval', type=float, default=LIVE_VIEW_INTERVAL_SECONDS)
+    parser.add_argument('--live-share', type=float, default=0.05, help='fraction of clients streaming live')
+    parser.add_argument('--screenshot-kb', type=float, default=250, help='screenshot upload size')
+    parser.add_argument('--live-kb', type=float, default=40, help='live frame size')
+    parser.add_argument('--live-size', type=parse_size, default=(960, 540), help='live frame WxH header')
+    parser.add_argument('--reconnect-base', type=float, default=SOCKET_RECONNECT_BASE_SECONDS,
+                        help='socket reconnect delay floor (decorrelated jitter)')
+    parser.add_argument('--reconnect-max', type=float, default=SOCKET_RECONNECT_MAX_SECONDS,
+                        help='socket reconnect delay cap')
+    parser.add_argument('--jitter', type=float, default=0.2, help='+/- fraction applied to every wait')
+    parser.add_argument('--pool-size', type=int, default=4, help='HTTP connections per client')
+    parser.add_argument('--json', metavar='PATH', help='also write the summary as JSON')
+    args = parser.parse_args(argv)
+    if not args.password:
+        parser.error('--password (or FLEET_PASSWORD) is required')
+    if args.provision and not (args.admin_email and args.admin_password):
+        parser.error('--provision needs --admin-email and --admin-password')
+    args.backend = args.backend.rstrip('/')
+    args.jitter = min(max(args.jitter, 0.0), 0.9)
+
+    raise_fd_limit()
+    summary = asyncio.run(Fleet(args).run())
+    print_summary(summary)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
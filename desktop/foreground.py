@@ -0,0 +1,241 @@
+import os
+import sys
+import ctypes
+import ctypes.util
+
+
+class WindowsForegroundSource:
+    # GetForegroundWindow, with the visible frame from DWM (GetWindowRect adds the invisible resize
+    # borders on Windows 10+). The app name is the executable of the owning process. Coordinates are
+    # physical pixels as long as the thread is per-monitor DPI aware, which mss sets up on Windows.
+    name = 'windows'
+
+    def __init__(self):
+        from ctypes import wintypes
+        self._wintypes = wintypes
+        self._user32 = ctypes.windll.user32
+        self._kernel32 = ctypes.windll.kernel32
+        self._user32.GetForegroundWindow.restype = wintypes.HWND
+        self._user32.IsIconic.argtypes = [wintypes.HWND]
+        self._user32.GetWindowRect.argtypes = [wintypes.HWND, ctypes.POINTER(wintypes.RECT)]
+        self._user32.GetWindowTextLengthW.argtypes = [wintypes.HWND]
+        self._user32.GetWindowTextW.argtypes = [wintypes.HWND, wintypes.LPWSTR, ctypes.c_int]
+        self._user32.GetWindowThreadProcessId.argtypes = [wintypes.HWND, ctypes.POINTER(wintypes.DWORD)]
+        self._kernel32.OpenProcess.restype = wintypes.HANDLE
+        self._kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+        self._kernel32.QueryFullProcessImageNameW.argtypes = [wintypes.HANDLE, wintypes.DWORD, wintypes.LPWSTR,
+                                                              ctypes.POINTER(wintypes.DWORD)]
+        self._kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        try:
+            self._dwmapi = ctypes.windll.dwmapi
+            self._dwmapi.DwmGetWindowAttribute.argtypes = [wintypes.HWND, wintypes.DWORD, ctypes.c_void_p, wintypes.DWORD]
+        except (OSError, AttributeError):
+            self._dwmapi = None
+
+    def foreground(self):
+        # {'left', 'top', 'width', 'height', 'title', 'app'} in screen pixels, or None (no window, minimized)
+        hwnd = self._user32.GetForegroundWindow()
+        if not hwnd or self._user32.IsIconic(hwnd):
+            return None
+        rect = self._wintypes.RECT()
+        DWMWA_EXTENDED_FRAME_BOUNDS = 9
+        if self._dwmapi is None or self._dwmapi.DwmGetWindowAttribute(
+                hwnd, DWMWA_EXTENDED_FRAME_BOUNDS, ctypes.byref(rect), ctypes.sizeof(rect)) != 0:
+            if not self._user32.GetWindowRect(hwnd, ctypes.byref(rect)):
+                return None
+        length = self._user32.GetWindowTextLengthW(hwnd)
+        title = ctypes.create_unicode_buffer(length + 1)
+        self._user32.GetWindowTextW(hwnd, title, length + 1)
+        return {'left': rect.left, 'top': rect.top, 'width': rect.right - rect.left, 'height': rect.bottom - rect.top,
+                'title': title.value, 'app': self._app(hwnd)}
+
+    def _app(self, hwnd):
+        pid = self._wintypes.DWORD()
+        self._user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        handle = self._kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid.value)
+        if not handle:
+            return ''
+        try:
+            size = self._wintypes.DWORD(1024)
+            path = ctypes.create_unicode_buffer(size.value)
+            if self._kernel32.QueryFullProcessImageNameW(handle, 0, path, ctypes.byref(size)):
+                return os.path.basename(path.value)
+            return ''
+        finally:
+            self._kernel32.CloseHandle(handle)
+
+    def close(self):
+        pass
+
+
+class XWindowAttributes(ctypes.Structure):
+    _fields_ = [
+        ("x", ctypes.c_int),
+        ("y", ctypes.c_int),
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("border_width", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("visual", ctypes.c_void_p),
+        ("root", ctypes.c_ulong),
+        ("c_class", ctypes.c_int),
+        ("bit_gravity", ctypes.c_int),
+        ("win_gravity", ctypes.c_int),
+        ("backing_store", ctypes.c_int),
+        ("backing_planes", ctypes.c_ulong),
+        ("backing_pixel", ctypes.c_ulong),
+        ("save_under", ctypes.c_int),
+        ("colormap", ctypes.c_ulong),
+        ("map_installed", ctypes.c_int),
+        ("map_state", ctypes.c_int),
+        ("all_event_masks", ctypes.c_long),
+        ("your_event_mask", ctypes.c_long),
+        ("do_not_propagate_mask", ctypes.c_long),
+        ("override_redirect", ctypes.c_int),
+        ("screen", ctypes.c_void_p),
+    ]
+
+
+class XClassHint(ctypes.Structure):
+    # char pointers kept as void* so they can be handed back to XFree
+    _fields_ = [("res_name", ctypes.c_void_p), ("res_class", ctypes.c_void_p)]
+
+
+# Xlib's default error handler exits the process; a window that closes between the lookup and the
+# query (BadWindow) must only fail that query. The handler is process-wide (mss and Tk rely on their
+# own), so it is only swapped in around a query and the previous one restored afterwards.
+XErrorHandler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+_ignore_x_error = XErrorHandler(lambda display, event: 0)
+_ignore_x_error_ptr = ctypes.cast(_ignore_x_error, ctypes.c_void_p)
+
+
+class X11ForegroundSource:
+    # EWMH: _NET_ACTIVE_WINDOW on the root window names the focused client. Its position comes from
+    # XTranslateCoordinates (window managers reparent clients into frames), the title from _NET_WM_NAME
+    # (UTF-8) or WM_NAME, and the app from the WM_CLASS class name.
+    name = 'x11'
+
+    XA_WINDOW = 33
+    ANY_PROPERTY_TYPE = 0
+    IS_VIEWABLE = 2
+
+    def __init__(self):
+        if not os.environ.get('DISPLAY'):
+            raise OSError('DISPLAY not set')
+        x11_path = ctypes.util.find_library('X11')
+        if not x11_path:
+            raise OSError('libX11 not found')
+        x11 = self._x11 = ctypes.CDLL(x11_path)
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        x11.XInternAtom.restype = ctypes.c_ulong
+        x11.XGetWindowProperty.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_long, ctypes.c_long, ctypes.c_int, ctypes.c_ulong,
+            ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_void_p)]
+        x11.XGetWindowAttributes.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XWindowAttributes)]
+        x11.XTranslateCoordinates.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_int, ctypes.c_int,
+            ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_ulong)]
+        x11.XGetClassHint.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XClassHint)]
+        x11.XSetErrorHandler.argtypes = [ctypes.c_void_p]
+        x11.XSetErrorHandler.restype = ctypes.c_void_p
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XFree.argtypes = [ctypes.c_void_p]
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        self._display = x11.XOpenDisplay(None)
+        if not self._display:
+            raise OSError('cannot open X display')
+        self._root = x11.XDefaultRootWindow(self._display)
+        self._atoms = {name: x11.XInternAtom(self._display, name.encode('ascii'), False)
+                       for name in ('_NET_ACTIVE_WINDOW', '_NET_WM_NAME', 'UTF8_STRING', 'WM_NAME')}
+
+    def _property(self, window, atom, req_type, length=1024):
+        # (format, raw bytes) of a window property, or None; 32-bit items come back as C longs
+        actual_type = ctypes.c_ulong()
+        fmt = ctypes.c_int()
+        nitems = ctypes.c_ulong()
+        after = ctypes.c_ulong()
+        data = ctypes.c_void_p()
+        status = self._x11.XGetWindowProperty(
+            self._display, window, atom, 0, length, False, req_type, ctypes.byref(actual_type),
+            ctypes.byref(fmt), ctypes.byref(nitems), ctypes.byref(after), ctypes.byref(data))
+        if status != 0 or not data.value:
+            return None
+        try:
+            if not actual_type.value or not nitems.value:
+                return None
+            item = ctypes.sizeof(ctypes.c_long) if fmt.value == 32 else fmt.value // 8
+            return fmt.value, ctypes.string_at(data.value, nitems.value * item)
+        finally:
+            self._x11.XFree(data)
+
+    def _active_window(self):
+        prop = self._property(self._root, self._atoms['_NET_ACTIVE_WINDOW'], self.XA_WINDOW, 1)
+        if prop is None or prop[0] != 32:
+            return 0
+        return ctypes.c_ulong.from_buffer_copy(prop[1][:ctypes.sizeof(ctypes.c_ulong)]).value
+
+    def _title(self, window):
+        prop = self._property(window, self._atoms['_NET_WM_NAME'], self._atoms['UTF8_STRING'])
+        if prop is None:
+            prop = self._property(window, self._atoms['WM_NAME'], self.ANY_PROPERTY_TYPE)
+        return prop[1].decode('utf-8', 'replace') if prop else ''
+
+    def _app(self, window):
+        hint = XClassHint()
+        if not self._x11.XGetClassHint(self._display, window, ctypes.byref(hint)):
+            return ''
+        try:
+            return ctypes.string_at(hint.res_class).decode('utf-8', 'replace') if hint.res_class else ''
+        finally:
+            for ptr in (hint.res_name, hint.res_class):
+                if ptr:
+                    self._x11.XFree(ptr)
+
+    def foreground(self):
+        # {'left', 'top', 'width', 'height', 'title', 'app'} in root-window pixels, or None (no window, unmapped)
+        previous = self._x11.XSetErrorHandler(_ignore_x_error_ptr)
+        try:
+            return self._query()
+        finally:
+            # Flush so errors from these requests reach our handler, not the one restored below
+            self._x11.XSync(self._display, False)
+            self._x11.XSetErrorHandler(previous)
+
+    def _query(self):
+        window = self._active_window()
+        if not window:
+            return None
+        attrs = XWindowAttributes()
+        if not self._x11.XGetWindowAttributes(self._display, window, ctypes.byref(attrs)):
+            return None
+        if attrs.map_state != self.IS_VIEWABLE:
+            return None
+        x, y, child = ctypes.c_int(), ctypes.c_int(), ctypes.c_ulong()
+        if not self._x11.XTranslateCoordinates(self._display, window, self._root, 0, 0,
+                                               ctypes.byref(x), ctypes.byref(y), ctypes.byref(child)):
+            return None
+        return {'left': x.value, 'top': y.value, 'width': attrs.width, 'height': attrs.height,
+                'title': self._title(window), 'app': self._app(window)}
+
+    def close(self):
+        try:
+            self._x11.XCloseDisplay(self._display)
+        except Exception:
+            pass
+
+
+def open_foreground_source():
+    # Foreground window resolver for this platform, or None (Wayland, macOS, no display)
+    candidates = [WindowsForegroundSource] if sys.platform == 'win32' else [X11ForegroundSource]
+    for cls in candidates:
+        try:
+            return cls()
+        except Exception as e:
+            print(f'[capture] {cls.name} foreground window source unavailable:', e)
+    return None
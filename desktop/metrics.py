@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import bisect
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (1e3, 4e3, 16e3, 64e3, 256e3, 1e6, 4e6, 16e6)
+
+
+class Histogram:
+    # Cumulative-bucket histogram in the Prometheus sense: counts[i] holds values <= buckets[i]
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-quantile (max for the overflow bucket)
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'max': self.max,
+        }
+
+
+class Metrics:
+    # Per-stage timings, payload sizes and error counts for the capture/upload pipeline, plus gauges
+    # read on demand. Cheap enough to leave on: one lock and a bisect per observation.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds = {}  # stage -> Histogram of durations
+        self._bytes = {}  # stage -> Histogram of payload sizes
+        self._errors = {}  # stage -> count
+        self._gauges = {}  # name -> callable returning a number
+        self._log = None
+        self._log_stop = threading.Event()
+        self.host = socket.gethostname()
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            hist = self._seconds.get(stage)
+            if hist is None:
+                hist = self._seconds[stage] = Histogram(SECONDS_BUCKETS)
+            hist.observe(seconds)
+
+    def size(self, stage, nbytes):
+        with self._lock:
+            hist = self._bytes.get(stage)
+            if hist is None:
+                hist = self._bytes[stage] = Histogram(BYTES_BUCKETS)
+            hist.observe(nbytes)
+
+    def error(self, stage, exc):
+        with self._lock:
+            self._errors[stage] = self._errors.get(stage, 0) + 1
+        self.log('error', stage=stage, error=repr(exc))
+
+    def gauge(self, name, fn):
+        self._gauges[name] = fn
+
+    def _gauge_values(self):
+        values = {}
+        for name, fn in list(self._gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            if value is not None:
+                values[name] = float(value)
+        return values
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            data = {
+                'seconds': {stage: h.summary() for stage, h in self._seconds.items()},
+                'bytes': {stage: h.summary() for stage, h in self._bytes.items()},
+                'errors': dict(self._errors),
+            }
+        data['gauges'] = self._gauge_values()
+        return data
+
+    def render_prometheus(self) -> str:
+        lines = []
+
+        def histogram(name, help_text, hists):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for stage, h in sorted(hists.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+
+        with self._lock:
+            histogram('tracker_stage_seconds', 'Time spent per client pipeline stage.', self._seconds)
+            histogram('tracker_stage_bytes', 'Payload size per client pipeline stage.', self._bytes)
+            lines.append('# HELP tracker_errors_total Failures per client pipeline stage.')
+            lines.append('# TYPE tracker_errors_total counter')
+            for stage, n in sorted(self._errors.items()):
+                lines.append(f'tracker_errors_total{{stage="{stage}"}} {n}')
+        for name, value in sorted(self._gauge_values().items()):
+            lines.append(f'# TYPE tracker_{name} gauge')
+            lines.append(f'tracker_{name} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def enable_log(self, directory, interval=60, max_bytes=5 * 1024 * 1024, backups=3):
+        # Rotating JSON-lines log: errors as they happen, a snapshot of everything every interval seconds
+        if self._log is not None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(os.path.join(directory, 'client.jsonl'), maxBytes=max_bytes,
+                                      backupCount=backups, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger = logging.getLogger('time_tracker.metrics')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.handlers = [handler]
+        self._log = logger
+        self._log_stop.clear()
+        threading.Thread(target=self._log_loop, args=(interval,), daemon=True).start()
+
+    def disable_log(self):
+        self._log_stop.set()
+        log, self._log = self._log, None
+        if log is not None:
+            for handler in log.handlers:
+                handler.close()
+
+    def log(self, kind, **fields):
+        log = self._log
+        if log is None:
+            return
+        record = dict(fields, kind=kind, ts=time.time(), host=self.host, pid=os.getpid())
+        try:
+            log.info(json.dumps(record, default=str))
+        except Exception:
+            pass
+
+    def _log_loop(self, interval):
+        while not self._log_stop.wait(interval):
+            self.log('snapshot', **self.snapshot())
+
+
+def serve_metrics(metrics, port, host='127.0.0.1'):
+    # Local-only scrape endpoint: /metrics (Prometheus text) and /metrics.json (snapshot).
+    # http.server is imported here since the endpoint is off by default and the import slows startup.
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body = metrics.render_prometheus().encode('utf-8')
+                ctype = 'text/plain; version=0.0.4; charset=utf-8'
+            elif self.path == '/metrics.json':
+                body = json.dumps(metrics.snapshot()).encode('utf-8')
+                ctype = 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', ctype)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+METRICS = Metrics()
@@ -8,6 +8,18 @@ import { getSocket } from '../socket.js'
 
 let API = import.meta.env.VITE_API_URL || 'http://localhost:4000'
 
+// Frame parts carry either binary image bytes (`frame`) or legacy base64 (`frameBase64`); `mime` defaults to JPEG
+const imageSrc = (part) => part.frame
+  ? URL.createObjectURL(new Blob([part.frame], { type: part.mime || 'image/jpeg' }))
+  : `data:${part.mime || 'image/jpeg'};base64,${part.frameBase64}`
+const releaseSrc = (src) => { if (src?.startsWith('blob:')) URL.revokeObjectURL(src) }
+const loadImage = (src) => new Promise((resolve, reject) => {
+  const img = new Image()
+  img.onload = () => resolve(img)
+  img.onerror = reject
+  img.src = src
+})
+
 export default function LiveView() {
   const [employeeId, setEmployeeId] = useState('')
   const [onlineEmployees, setOnlineEmployees] = useState([])
@@ -17,9 +29,26 @@ export default function LiveView() {
   const [selectedManager, setSelectedManager] = useState('')
   const [role, setRole] = useState('')
   const [status, setStatus] = useState('idle') // idle | active | offline
-  const [frames, setFrames] = useState([]) // [{b64, ts}]
+  const [frames, setFrames] = useState([]) // [{src, ts}]
   
   const socketRef = useRef(null)
+  // Live frames arrive as keyframes plus changed tiles; compose them on an offscreen canvas
+  const canvasRef = useRef(null)
+  const hasKeyRef = useRef(false)
+  const drawChainRef = useRef(Promise.resolve())
+  // Frames currently held, blob URLs included; revoked here so the state updaters stay pure
+  const framesRef = useRef([])
+  const resetFrames = () => {
+    framesRef.current.forEach(f => releaseSrc(f.src))
+    framesRef.current = []
+    setFrames([])
+  }
+
+  // Release every blob URL still held when the page unmounts
+  useEffect(() => () => {
+    framesRef.current.forEach(f => releaseSrc(f.src))
+    framesRef.current = []
+  }, [])
 
   // Rehydrate previously selected employee so streaming persists across tabs
   useEffect(() => {
@@ -32,11 +61,44 @@ export default function LiveView() {
     // Use shared socket instance so connection persists across route changes
     const s = getSocket()
     socketRef.current = s
+    const pushFrame = (src, ts) => {
+      const next = [{ src, ts }, ...framesRef.current]
+      next.slice(50).forEach(f => releaseSrc(f.src))
+      framesRef.current = next.slice(0, 50)
+      setFrames(framesRef.current)
+      setStatus('active')
+    }
+    const applyFrame = async (payload) => {
+      const ts = payload.ts || new Date().toISOString()
+      if (payload.kind === 'delta') {
+        const canvas = canvasRef.current
+        // Tiles are only meaningful on top of the keyframe they were diffed against
+        if (!hasKeyRef.current || !canvas || canvas.width !== payload.width || canvas.height !== payload.height) return
+        const tiles = await Promise.all((payload.tiles || []).map(t => {
+          const src = imageSrc(t)
+          return loadImage(src).then(img => ({ t, img })).finally(() => releaseSrc(src))
+        }))
+        const ctx = canvas.getContext('2d')
+        for (const { t, img } of tiles) ctx.drawImage(img, t.x, t.y, t.w, t.h)
+        pushFrame(canvas.toDataURL('image/jpeg', 0.85), ts)
+        return
+      }
+      const src = imageSrc(payload)
+      if (payload.kind === 'key') {
+        const img = await loadImage(src)
+        if (!canvasRef.current) canvasRef.current = document.createElement('canvas')
+        const canvas = canvasRef.current
+        canvas.width = img.naturalWidth
+        canvas.height = img.naturalHeight
+        canvas.getContext('2d').drawImage(img, 0, 0)
+        hasKeyRef.current = true
+      }
+      pushFrame(src, ts)
+    }
     s.on('live_view:frame', (payload) => {
       if (payload?.employeeId === employeeId) {
-        const item = { b64: payload.frameBase64, ts: payload.ts || new Date().toISOString() }
-        setFrames(prev => [item, ...prev].slice(0, 50))
-        setStatus('active')
+        // Serialize so tiles never land before the keyframe they depend on
+        drawChainRef.current = drawChainRef.current.then(() => applyFrame(payload)).catch(() => {})
       }
     })
     s.on('live_view:terminate', (payload) => {
@@ -117,7 +179,8 @@ export default function LiveView() {
   useEffect(() => {
     if (employeeId) {
       localStorage.setItem('liveview_employee', employeeId)
-      setFrames([])
+      hasKeyRef.current = false
+      resetFrames()
       setStatus('idle')
       const s = getSocket()
       if (s && s.connected) {
@@ -130,7 +193,8 @@ export default function LiveView() {
 
   const start = () => {
     setStatus('idle')
-    setFrames([])
+    hasKeyRef.current = false
+    resetFrames()
     socketRef.current?.emit('live_view:start', { employeeId })
   }
   const stop = () => {
@@ -194,7 +258,7 @@ export default function LiveView() {
               <div className="aspect-video bg-gray-100 grid place-items-center">
                 {latest ? (
                   <div className="relative w-full h-full">
-                    <img className="w-full h-full object-contain" src={`data:image/jpeg;base64,${latest.b64}`} alt="Live frame" />
+                    <img className="w-full h-full object-contain" src={latest.src} alt="Live frame" />
                     <div className="absolute bottom-2 right-2 text-xs bg-black/60 text-white px-2 py-1 rounded">{new Date(latest.ts).toLocaleString()}</div>
                   </div>
                 ) : (
@@ -209,7 +273,7 @@ export default function LiveView() {
               <div className="mt-3 grid grid-cols-3 gap-2">
                 {frames.slice(0, 12).map((f, i) => (
                   <div key={i} className="text-center">
-                    <img className="w-full h-auto border rounded" src={`data:image/jpeg;base64,${f.b64}`} />
+                    <img className="w-full h-auto border rounded" src={f.src} />
                     <div className="text-[10px] text-gray-600 mt-1">{new Date(f.ts).toLocaleString()}</div>
                   </div>
                 ))}